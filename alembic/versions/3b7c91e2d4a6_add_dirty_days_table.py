@@ -0,0 +1,40 @@
+"""add_dirty_days_table
+
+Revision ID: 3b7c91e2d4a6
+Revises: f42f2d676a54
+Create Date: 2026-10-19 09:12:41.218734
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "3b7c91e2d4a6"
+down_revision: Union[str, None] = "f42f2d676a54"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create dirty_days table."""
+    op.create_table(
+        "dirty_days",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("date", sa.Date(), nullable=False),
+        sa.Column("change_count", sa.Integer(), nullable=True),
+        sa.Column("last_source", sa.String(), nullable=True),
+        sa.Column("first_marked_at", sa.DateTime(), nullable=True),
+        sa.Column("last_marked_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_dirty_days_date"), "dirty_days", ["date"], unique=True)
+
+
+def downgrade() -> None:
+    """Drop dirty_days table."""
+    op.drop_index(op.f("ix_dirty_days_date"), table_name="dirty_days")
+    op.drop_table("dirty_days")
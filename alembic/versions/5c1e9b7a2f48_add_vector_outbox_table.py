@@ -0,0 +1,46 @@
+"""add_vector_outbox_table
+
+Revision ID: 5c1e9b7a2f48
+Revises: 8d2f6a4c1e93
+Create Date: 2026-10-19 16:40:52.318406
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5c1e9b7a2f48"
+down_revision: Union[str, None] = "8d2f6a4c1e93"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create vector_outbox table."""
+    op.create_table(
+        "vector_outbox",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("granularity", sa.String(), nullable=False),
+        sa.Column("period", sa.String(), nullable=False),
+        sa.Column("summary", sa.String(), nullable=False),
+        sa.Column("summary_metadata", sa.String(), nullable=True),
+        sa.Column("revision", sa.Integer(), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("last_error", sa.String(), nullable=True),
+        sa.Column("next_attempt_at", sa.DateTime(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("granularity", "period", name="uq_vector_outbox_granularity_period"),
+    )
+    op.create_index("ix_vector_outbox_next_attempt_at", "vector_outbox", ["next_attempt_at"])
+
+
+def downgrade() -> None:
+    """Drop vector_outbox table."""
+    op.drop_index("ix_vector_outbox_next_attempt_at", table_name="vector_outbox")
+    op.drop_table("vector_outbox")
@@ -0,0 +1,43 @@
+"""add_daily_summaries_table
+
+Revision ID: 8d2f6a4c1e93
+Revises: 3b7c91e2d4a6
+Create Date: 2026-10-19 11:02:17.604123
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "8d2f6a4c1e93"
+down_revision: Union[str, None] = "3b7c91e2d4a6"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create daily_summaries table."""
+    op.create_table(
+        "daily_summaries",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("granularity", sa.String(), nullable=False),
+        sa.Column("period", sa.String(), nullable=False),
+        sa.Column("date", sa.Date(), nullable=False),
+        sa.Column("summary", sa.String(), nullable=False),
+        sa.Column("summary_metadata", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("granularity", "period", name="uq_summary_granularity_period"),
+    )
+    op.create_index("ix_daily_summaries_granularity_date", "daily_summaries", ["granularity", "date"])
+
+
+def downgrade() -> None:
+    """Drop daily_summaries table."""
+    op.drop_index("ix_daily_summaries_granularity_date", table_name="daily_summaries")
+    op.drop_table("daily_summaries")
@@ -0,0 +1,50 @@
+"""add_food_analysis_jobs_table
+
+Revision ID: b7d3e5f1a9c2
+Revises: 5c1e9b7a2f48
+Create Date: 2026-10-19 18:05:33.907215
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b7d3e5f1a9c2"
+down_revision: Union[str, None] = "5c1e9b7a2f48"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create food_analysis_jobs table."""
+    op.create_table(
+        "food_analysis_jobs",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("filename", sa.String(), nullable=False),
+        sa.Column("image_path", sa.String(), nullable=True),
+        sa.Column("meal_type", sa.String(), nullable=True),
+        sa.Column("uploaded_at", sa.DateTime(), nullable=False),
+        sa.Column("s3_location", sa.String(), nullable=True),
+        sa.Column("image_id", sa.Integer(), nullable=True),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("error", sa.String(), nullable=True),
+        sa.Column("webhook_url", sa.String(), nullable=True),
+        sa.Column("webhook_status", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("started_at", sa.DateTime(), nullable=True),
+        sa.Column("completed_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["image_id"], ["food_images.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_food_analysis_jobs_status"), "food_analysis_jobs", ["status"])
+
+
+def downgrade() -> None:
+    """Drop food_analysis_jobs table."""
+    op.drop_index(op.f("ix_food_analysis_jobs_status"), table_name="food_analysis_jobs")
+    op.drop_table("food_analysis_jobs")
@@ -0,0 +1,33 @@
+"""add_food_image_renditions
+
+Revision ID: c4a8f2d6e1b3
+Revises: b7d3e5f1a9c2
+Create Date: 2026-10-19 19:12:48.530117
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c4a8f2d6e1b3"
+down_revision: Union[str, None] = "b7d3e5f1a9c2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add content type and rendition keys to food_images."""
+    op.add_column("food_images", sa.Column("content_type", sa.String(), nullable=True))
+    op.add_column("food_images", sa.Column("web_s3_key", sa.String(), nullable=True))
+    op.add_column("food_images", sa.Column("thumbnail_s3_key", sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    """Remove content type and rendition keys from food_images."""
+    op.drop_column("food_images", "thumbnail_s3_key")
+    op.drop_column("food_images", "web_s3_key")
+    op.drop_column("food_images", "content_type")
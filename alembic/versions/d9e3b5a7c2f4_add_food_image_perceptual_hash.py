@@ -0,0 +1,41 @@
+"""add_food_image_perceptual_hash
+
+Revision ID: d9e3b5a7c2f4
+Revises: c4a8f2d6e1b3
+Create Date: 2026-10-19 20:03:17.264905
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d9e3b5a7c2f4"
+down_revision: Union[str, None] = "c4a8f2d6e1b3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add the perceptual hash to food_images and its band index table."""
+    op.add_column("food_images", sa.Column("phash", sa.String(), nullable=True))
+    op.create_table(
+        "food_image_hash_bands",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("image_id", sa.Integer(), nullable=False),
+        sa.Column("band", sa.Integer(), nullable=False),
+        sa.Column("value", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["image_id"], ["food_images.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_food_image_hash_bands_band_value", "food_image_hash_bands", ["band", "value"])
+
+
+def downgrade() -> None:
+    """Drop the band index table and the perceptual hash column."""
+    op.drop_index("ix_food_image_hash_bands_band_value", table_name="food_image_hash_bands")
+    op.drop_table("food_image_hash_bands")
+    op.drop_column("food_images", "phash")
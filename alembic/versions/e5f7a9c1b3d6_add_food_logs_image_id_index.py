@@ -0,0 +1,28 @@
+"""add_food_logs_image_id_index
+
+Revision ID: e5f7a9c1b3d6
+Revises: d9e3b5a7c2f4
+Create Date: 2026-10-19 21:26:40.118352
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e5f7a9c1b3d6"
+down_revision: Union[str, None] = "d9e3b5a7c2f4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Index food_logs.image_id for loading an image's items, summing its calories and meal type filters."""
+    op.create_index(op.f("ix_food_logs_image_id"), "food_logs", ["image_id"])
+
+
+def downgrade() -> None:
+    """Drop the food_logs.image_id index."""
+    op.drop_index(op.f("ix_food_logs_image_id"), table_name="food_logs")
@@ -0,0 +1,40 @@
+"""add_dirty_rollups_table
+
+Revision ID: f1b3d5e7a9c2
+Revises: e5f7a9c1b3d6
+Create Date: 2026-10-19 23:41:07.318265
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "f1b3d5e7a9c2"
+down_revision: Union[str, None] = "e5f7a9c1b3d6"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create dirty_rollups table."""
+    op.create_table(
+        "dirty_rollups",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("granularity", sa.String(), nullable=False),
+        sa.Column("period", sa.String(), nullable=False),
+        sa.Column("period_start", sa.Date(), nullable=False),
+        sa.Column("change_count", sa.Integer(), nullable=True),
+        sa.Column("first_marked_at", sa.DateTime(), nullable=True),
+        sa.Column("last_marked_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("granularity", "period", name="uq_dirty_rollup_granularity_period"),
+    )
+
+
+def downgrade() -> None:
+    """Drop dirty_rollups table."""
+    op.drop_table("dirty_rollups")
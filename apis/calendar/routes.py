@@ -7,6 +7,7 @@ from typing import List, Dict
 from .google_calendar import GoogleCalendarAPI
 from .schemas import CalendarEventResponse
 from core.config import settings
+from core.change_feed import mark_dates_dirty
 import os
 
 router = APIRouter()
@@ -78,6 +79,7 @@ async def sync_today_events(db: Session = Depends(get_db)):
 
     sync_results = {}
     errors = []
+    synced_start_times = []
 
     for account_config in calendar_configs:
         try:
@@ -108,6 +110,8 @@ async def sync_today_events(db: Session = Depends(get_db)):
                         new_event = CalendarEvent(**event_data)
                         db.add(new_event)
 
+                    synced_start_times.append(event_data["start_time"])
+
                 except Exception as e:
                     errors.append(f"Error saving event {event_data['event_id']}: {str(e)}")
                     continue
@@ -122,6 +126,7 @@ async def sync_today_events(db: Session = Depends(get_db)):
             continue
 
     try:
+        mark_dates_dirty(db, synced_start_times, source="calendar")
         db.commit()
     except Exception as e:
         db.rollback()
@@ -0,0 +1,258 @@
+import asyncio
+import json
+import logging
+import os
+import shutil
+import uuid
+from datetime import datetime
+from typing import Any, BinaryIO, Dict, List, Optional, Set
+import httpx
+from sqlalchemy.orm import Session
+from core.config import settings
+from core.db import FoodAnalysisJob, FoodImage, SessionLocal
+from core.image_store import ImageStore
+from .ollama import OllamaAPI
+from .pipeline import analyze_upload, entries_query, entry_responses
+
+logger = logging.getLogger(__name__)
+
+# Delays between webhook delivery attempts
+WEBHOOK_RETRY_DELAYS = (1, 5, 30)
+
+
+async def job_response(db: Session, job: FoodAnalysisJob, image_store: ImageStore) -> Dict[str, Any]:
+    """Job status as returned by /food/jobs/{id} and posted to the webhook"""
+    response = {
+        "job_id": job.id,
+        "status": job.status,
+        "attempts": job.attempts,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "completed_at": job.completed_at,
+        "webhook_status": job.webhook_status,
+        "result": None,
+    }
+    if job.status == "completed" and job.image_id:
+        rows = entries_query(db).filter(FoodImage.id == job.image_id).all()
+        if rows:
+            entry = (await entry_responses(image_store, rows))[0]
+            response["result"] = {"image_id": entry.pop("id"), **entry}
+    return response
+
+
+class FoodJobWorker:
+    """
+    Processes food analysis jobs in the background: the upload is spooled to FOOD_JOB_DIR and recorded
+    as a job, then a worker stores the image and runs the vision model concurrently, commits the FoodImage
+    and FoodLog rows together with the job's completion, and hands the job's webhook to a separate task so
+    slow or dead webhooks don't hold up the workers.
+
+    Failed jobs are retried up to FOOD_JOB_MAX_ATTEMPTS times with exponential backoff. Jobs that were
+    queued or running when the process stopped, and webhooks that were not delivered yet, are picked up
+    again on start.
+    """
+
+    def __init__(self, ollama_api: OllamaAPI, image_store: ImageStore):
+        self.ollama_api = ollama_api
+        self.image_store = image_store
+        self.job_dir = settings.FOOD_JOB_DIR
+        self.concurrency = max(settings.FOOD_JOB_CONCURRENCY, 1)
+        self.queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._webhooks: Set[asyncio.Task] = set()
+
+    async def start(self):
+        if self.queue is not None:
+            return
+        self.queue = asyncio.Queue()
+        db = SessionLocal()
+        try:
+            unfinished = (
+                db.query(FoodAnalysisJob.id)
+                .filter(FoodAnalysisJob.status.in_(["queued", "processing"]))
+                .order_by(FoodAnalysisJob.created_at)
+                .all()
+            )
+            undelivered = (
+                db.query(FoodAnalysisJob)
+                .filter(
+                    FoodAnalysisJob.status.in_(["completed", "failed"]),
+                    FoodAnalysisJob.webhook_url.isnot(None),
+                    FoodAnalysisJob.webhook_status.is_(None),
+                )
+                .all()
+            )
+            for job in undelivered:
+                self._send_webhook(job, await job_response(db, job, self.image_store))
+        finally:
+            db.close()
+        for (job_id,) in unfinished:
+            self.queue.put_nowait(job_id)
+        if unfinished:
+            logger.info(f"Resuming {len(unfinished)} unfinished food analysis job(s)")
+        if undelivered:
+            logger.info(f"Resuming {len(undelivered)} undelivered food analysis webhook(s)")
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        tasks = [*self._tasks, *self._webhooks]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+        self._webhooks.clear()
+        self.queue = None
+
+    async def submit(
+        self,
+        db: Session,
+        image_file: BinaryIO,
+        filename: str,
+        meal_type: str,
+        webhook_url: Optional[str] = None,
+    ) -> FoodAnalysisJob:
+        """Spool the upload to disk, record the job and queue it. Returns as soon as the job is committed."""
+        await self.start()
+        job_id = uuid.uuid4().hex
+        os.makedirs(self.job_dir, exist_ok=True)
+        image_path = os.path.join(self.job_dir, f"{job_id}{os.path.splitext(filename)[1]}")
+        await asyncio.to_thread(_copy_file, image_file, image_path)
+
+        job = FoodAnalysisJob(
+            id=job_id,
+            status="queued",
+            filename=filename,
+            image_path=image_path,
+            meal_type=meal_type,
+            uploaded_at=datetime.utcnow(),
+            attempts=0,
+            webhook_url=webhook_url or settings.FOOD_JOB_WEBHOOK_URL,
+        )
+        db.add(job)
+        db.commit()
+        self.queue.put_nowait(job_id)
+        return job
+
+    async def _work(self):
+        while True:
+            job_id = await self.queue.get()
+            try:
+                await self.process(job_id)
+            except Exception as e:
+                logger.error(f"Unexpected error processing food analysis job {job_id}: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def process(self, job_id: str):
+        db = SessionLocal()
+        try:
+            job = db.query(FoodAnalysisJob).filter(FoodAnalysisJob.id == job_id).first()
+            if job is None or job.status in ("completed", "failed"):
+                return
+
+            job.status = "processing"
+            job.started_at = datetime.utcnow()
+            job.attempts += 1
+            db.commit()
+
+            uploaded = {}
+            try:
+                with open(job.image_path, "rb") as image_file:
+                    food_image, _, _ = await analyze_upload(
+                        db,
+                        self.ollama_api,
+                        self.image_store,
+                        image_file,
+                        job.filename,
+                        job.meal_type,
+                        job.uploaded_at,
+                        s3_location=json.loads(job.s3_location) if job.s3_location else None,
+                        on_uploaded=uploaded.update,
+                    )
+                # The analysis rows and the job's completion are committed together
+                if uploaded:
+                    job.s3_location = json.dumps(uploaded)
+                job.image_id = food_image.id
+                job.status = "completed"
+                job.error = None
+                job.completed_at = datetime.utcnow()
+                db.commit()
+                logger.info(f"Food analysis job {job_id} completed (image {food_image.id})")
+            except Exception as e:
+                db.rollback()
+                self._record_failure(db, job, e, uploaded)
+
+            if job.status in ("completed", "failed") and job.s3_location:
+                # The image is safely stored; a failed job without an upload keeps its spooled copy
+                await asyncio.to_thread(_remove_file, job.image_path)
+                job.image_path = None
+                db.commit()
+
+            if job.status in ("completed", "failed") and job.webhook_url:
+                self._send_webhook(job, await job_response(db, job, self.image_store))
+        finally:
+            db.close()
+
+    def _record_failure(self, db: Session, job: FoodAnalysisJob, error: Exception, uploaded: Dict[str, Any]):
+        if uploaded and not job.s3_location:
+            job.s3_location = json.dumps(uploaded)
+        job.error = str(error)
+        if job.attempts < settings.FOOD_JOB_MAX_ATTEMPTS:
+            job.status = "queued"
+            delay = 2**job.attempts
+            logger.warning(f"Food analysis job {job.id} failed (attempt {job.attempts}), retrying in {delay}s: {error}")
+            asyncio.get_running_loop().call_later(delay, self._requeue, job.id)
+        else:
+            job.status = "failed"
+            job.completed_at = datetime.utcnow()
+            logger.error(f"Food analysis job {job.id} failed after {job.attempts} attempts: {error}")
+        db.commit()
+
+    def _requeue(self, job_id: str):
+        if self.queue is not None:
+            self.queue.put_nowait(job_id)
+
+    def _send_webhook(self, job: FoodAnalysisJob, payload: Dict[str, Any]):
+        """Deliver the webhook in its own task, tracked so stop() can cancel it"""
+        task = asyncio.create_task(self._notify(job.id, job.webhook_url, payload))
+        self._webhooks.add(task)
+        task.add_done_callback(self._webhooks.discard)
+
+    async def _notify(self, job_id: str, url: str, payload: Dict[str, Any]):
+        status = await self._deliver_webhook(url, payload)
+        db = SessionLocal()
+        try:
+            db.query(FoodAnalysisJob).filter(FoodAnalysisJob.id == job_id).update({"webhook_status": status})
+            db.commit()
+        except Exception as e:
+            logger.error(f"Could not record webhook status for food analysis job {job_id}: {e}")
+            db.rollback()
+        finally:
+            db.close()
+
+    async def _deliver_webhook(self, url: str, payload: Dict[str, Any]) -> str:
+        body = json.loads(json.dumps(payload, default=str))
+        async with httpx.AsyncClient(timeout=10.0) as client:
+            for attempt, delay in enumerate((0, *WEBHOOK_RETRY_DELAYS)):
+                await asyncio.sleep(delay)
+                try:
+                    response = await client.post(url, json=body)
+                    response.raise_for_status()
+                    return "delivered"
+                except Exception as e:
+                    logger.warning(f"Webhook for food analysis job {payload['job_id']} failed (try {attempt + 1}): {e}")
+        return "failed"
+
+
+def _copy_file(source: BinaryIO, path: str):
+    source.seek(0)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        shutil.copyfileobj(source, f)
+    os.replace(tmp_path, path)
+
+
+def _remove_file(path: Optional[str]):
+    if path and os.path.exists(path):
+        os.remove(path)
@@ -1,9 +1,10 @@
-import httpx
 import base64
 from typing import Dict, List, Optional
 import logging
-import json
+from pydantic import ValidationError
 from core.config import settings
+from core.llm_gateway import PRIORITY_INTERACTIVE, llm_gateway
+from .schemas import FoodAnalysis
 
 logger = logging.getLogger(__name__)
 
@@ -11,15 +12,15 @@ logger = logging.getLogger(__name__)
 class OllamaAPI:
     def __init__(self):
         self.base_url = settings.OLLAMA_URL
-        self.client = httpx.Client(timeout=120.0)  # Increased timeout to 120 seconds for image processing
         self.model = settings.OLLAMA_MODEL
 
-    def analyze_food_image(self, image_data: bytes) -> Dict:
+    def analyze_food_image(self, image_data: bytes, priority: int = PRIORITY_INTERACTIVE) -> Dict:
         """
         Analyze a food image using Ollama and return detected foods with portions and calories.
 
         Args:
-            image_data: Raw image bytes
+            image_data: Image bytes, ideally the downscaled rendition from preprocess_image
+            priority: LLM gateway priority; single uploads are interactive, batch imports wait behind them
 
         Returns:
             Dict containing analyzed foods, portions, and estimated calories
@@ -27,66 +28,62 @@ class OllamaAPI:
         # Convert image to base64
         base64_image = base64.b64encode(image_data).decode("utf-8")
 
-        # Construct the prompt
+        # The answer's shape is enforced by the structured output format, so the prompt only describes content
         prompt = """
-        Analyze this food image and provide a detailed breakdown in JSON format. Include:
-        1. Each distinct food item visible
-        2. Estimated portion size for each item
-        3. Estimated calories for each item (total for the portion size)
-        4. Your confidence level for each detection (0-1)
-
-        Format your response as valid JSON like this:
-        {
-            "foods": [
-                {
-                    "name": "food name",
-                    "portion": "portion size",
-                    "calories": estimated_calories,
-                    "confidence": confidence_level
-                },
-                ...
-            ],
-            "total_calories": sum_of_all_calories
-        }
-
-        Be specific about portion sizes (e.g., "1 cup", "200g", "1 medium piece").
+        Analyze this food image. List each distinct food item visible with its estimated portion size
+        (e.g., "1 cup", "200g", "1 medium piece"), its estimated calories for that portion, and your
+        confidence in the detection (0-1). Include the sum of all calories as total_calories.
         If you're unsure about a food item, include it with lower confidence.
         """
 
         try:
-            # Make request to Ollama
-            response = self.client.post(
-                f"{self.base_url}/api/generate",
-                json={"model": self.model, "prompt": prompt, "images": [base64_image], "stream": False},
-            )
-            response.raise_for_status()
-
-            # Extract the response
-            result = response.json()
-            response_text = result.get("response", "")
-
-            # Try to find and parse the JSON part of the response
+            response_text = self._generate(prompt, [base64_image], priority)
             try:
-                # Look for JSON-like structure in the response
-                start_idx = response_text.find("{")
-                end_idx = response_text.rfind("}") + 1
-                if start_idx >= 0 and end_idx > start_idx:
-                    json_str = response_text[start_idx:end_idx]
-                    analysis = json.loads(json_str)
-                else:
-                    raise ValueError("No JSON structure found in response")
-
-                # Validate the structure
-                if not isinstance(analysis, dict) or "foods" not in analysis:
-                    raise ValueError("Invalid response structure")
-
-                return analysis
-
-            except json.JSONDecodeError as e:
-                logger.error(f"Failed to parse JSON from response: {e}")
-                logger.debug(f"Raw response: {response_text}")
-                raise ValueError("Failed to parse AI response")
+                return self._parse(response_text)
+            except ValueError as e:
+                # One cheap retry: ask for the answer to be repaired as text, without the image
+                logger.warning(f"Invalid food analysis from {self.model}, retrying once: {e}")
+                repair_prompt = (
+                    "Rewrite this food analysis as valid JSON matching the required schema, keeping every food "
+                    f"item and estimate:\n{response_text}"
+                )
+                return self._parse(self._generate(repair_prompt, None, priority, temperature=0.0))
 
         except Exception as e:
             logger.error(f"Error calling Ollama API: {e}")
             raise
+
+    def _generate(
+        self, prompt: str, images: Optional[List[str]], priority: int, temperature: Optional[float] = None
+    ) -> str:
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": False,
+            "format": FoodAnalysis.model_json_schema(),
+            "options": {
+                "temperature": settings.FOOD_ANALYSIS_TEMPERATURE if temperature is None else temperature,
+                "num_predict": settings.FOOD_ANALYSIS_NUM_PREDICT,
+            },
+        }
+        if images:
+            payload["images"] = images
+        # Make request to Ollama through the shared gateway
+        result = llm_gateway.post(
+            self.base_url,
+            "/api/generate",
+            payload,
+            priority=priority,
+            timeout=120.0,  # Increased timeout to 120 seconds for image processing
+        )
+        if result.get("done_reason") == "length":
+            logger.warning(f"Food analysis hit the {settings.FOOD_ANALYSIS_NUM_PREDICT} token limit")
+        return result.get("response", "")
+
+    def _parse(self, response_text: str) -> Dict:
+        """Validate the model's answer against the FoodAnalysis schema"""
+        try:
+            return FoodAnalysis.model_validate_json(response_text).model_dump()
+        except ValidationError as e:
+            logger.debug(f"Raw response: {response_text}")
+            raise ValueError(f"Failed to parse AI response: {e.error_count()} validation error(s)")
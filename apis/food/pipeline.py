@@ -0,0 +1,277 @@
+import asyncio
+import json
+import logging
+from datetime import datetime
+from typing import Any, AsyncIterator, BinaryIO, Callable, Dict, List, Optional, Tuple
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, selectinload
+from core.change_feed import mark_dates_dirty
+from core.db import FoodImage, FoodLog
+from core.llm_gateway import PRIORITY_INTERACTIVE, PRIORITY_NORMAL
+from core.image_store import ImageStore
+from .ollama import OllamaAPI
+from .preprocess import preprocess_image
+from .similarity import add_hash_bands, reusable_analysis
+
+logger = logging.getLogger(__name__)
+
+
+async def upload_and_analyze(
+    ollama_api: OllamaAPI,
+    image_store: ImageStore,
+    renditions: Dict[str, Any],
+    filename: str,
+    s3_location: Optional[Dict[str, Any]] = None,
+    on_uploaded: Optional[Callable[[Dict[str, Any]], None]] = None,
+    analysis: Optional[Dict[str, Any]] = None,
+    priority: int = PRIORITY_INTERACTIVE,
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Store the renditions from preprocess_image in the image store and run the vision model on the
+    downscaled copy concurrently. Pass `s3_location` to skip an upload that already succeeded, or `analysis` to skip the
+    model call. `on_uploaded` is called as soon as the upload finishes, even if the analysis fails, so
+    retries don't upload the image again.
+    """
+
+    async def upload() -> Dict[str, Any]:
+        if s3_location is not None:
+            return s3_location
+        location = await image_store.upload_renditions(renditions, filename)
+        if on_uploaded:
+            on_uploaded(location)
+        return location
+
+    async def analyze() -> Dict[str, Any]:
+        if analysis is not None:
+            return analysis
+        return await run_in_threadpool(ollama_api.analyze_food_image, renditions["model"], priority)
+
+    # Both steps always run to completion, so a failed analysis never leaves an upload half-recorded
+    outcomes = await asyncio.gather(upload(), analyze(), return_exceptions=True)
+    for outcome in outcomes:
+        if isinstance(outcome, BaseException):
+            raise outcome
+    return outcomes[0], outcomes[1]
+
+
+async def analyze_file(
+    db: Session,
+    ollama_api: OllamaAPI,
+    image_store: ImageStore,
+    image_file: BinaryIO,
+    filename: str,
+    s3_location: Optional[Dict[str, Any]] = None,
+    on_uploaded: Optional[Callable[[Dict[str, Any]], None]] = None,
+    priority: int = PRIORITY_INTERACTIVE,
+) -> Dict[str, Any]:
+    """
+    Preprocess an upload, reuse the analysis of a recent near-duplicate or run the vision model, and store the
+    image. Nothing is written to the database. Returns the stored image's location, the analysis and the phash.
+    `image_file` is read in chunks (decoding, then the upload), so it is never loaded into memory whole.
+    """
+    renditions = await asyncio.to_thread(preprocess_image, image_file, filename)
+    previous = reusable_analysis(db, renditions["phash"])
+    location, analysis = await upload_and_analyze(
+        ollama_api, image_store, renditions, filename, s3_location, on_uploaded, previous, priority
+    )
+    return {"location": location, "analysis": analysis, "phash": renditions["phash"]}
+
+
+async def analyze_upload(
+    db: Session,
+    ollama_api: OllamaAPI,
+    image_store: ImageStore,
+    image_file: BinaryIO,
+    filename: str,
+    meal_type: str,
+    timestamp: datetime,
+    s3_location: Optional[Dict[str, Any]] = None,
+    on_uploaded: Optional[Callable[[Dict[str, Any]], None]] = None,
+    priority: int = PRIORITY_INTERACTIVE,
+) -> Tuple[FoodImage, float, List[Dict[str, Any]]]:
+    """Analyze an upload (see analyze_file) and add its rows (see store_analysis). The caller commits."""
+    analyzed = await analyze_file(db, ollama_api, image_store, image_file, filename, s3_location, on_uploaded, priority)
+    return store_analysis(db, analyzed["location"], analyzed["analysis"], meal_type, timestamp, phash=analyzed["phash"])
+
+
+async def analyze_batch(
+    db: Session,
+    ollama_api: OllamaAPI,
+    image_store: ImageStore,
+    uploads: List[Tuple[BinaryIO, str]],
+    meal_type: str,
+    concurrency: int,
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Analyze several (file, filename) uploads with at most `concurrency` in flight. Yields a `result` event
+    per image as it completes (in completion order, with its index in `uploads`). Analyses are kept in memory
+    until every image is done, so no write transaction stays open while the vision model runs. Then all
+    rows are written in one short transaction, and a `done` event lists the stored image ids. Images that
+    fail are reported and skipped; if the commit fails or the stream is abandoned, nothing is stored.
+    """
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+    analyzed: Dict[int, Dict[str, Any]] = {}
+
+    async def analyze(index: int, image_file: BinaryIO, filename: str) -> Dict[str, Any]:
+        async with semaphore:
+            try:
+                # Bulk imports queue behind single uploads for the vision model
+                result = await analyze_file(db, ollama_api, image_store, image_file, filename, priority=PRIORITY_NORMAL)
+            except Exception as e:
+                logger.warning(f"Batch analysis of {filename} failed: {e}")
+                return {"index": index, "filename": filename, "status": "failed", "error": str(e)}
+            analyzed[index] = {**result, "filename": filename, "timestamp": datetime.utcnow()}
+            foods = result["analysis"].get("foods", [])
+            return {
+                "index": index,
+                "filename": filename,
+                "status": "analyzed",
+                "foods": foods,
+                "total_calories": sum(food["calories"] for food in foods),
+            }
+
+    tasks = [asyncio.create_task(analyze(index, *upload)) for index, upload in enumerate(uploads)]
+    failed = 0
+    entries = []
+    total_calories = 0
+    try:
+        for completed in asyncio.as_completed(tasks):
+            result = await completed
+            failed += result["status"] == "failed"
+            yield "result", result
+
+        for index in sorted(analyzed):
+            item = analyzed[index]
+            # A savepoint per image, so one that can't be stored leaves no half-written rows behind
+            savepoint = db.begin_nested()
+            try:
+                food_image, calories, _ = store_analysis(
+                    db, item["location"], item["analysis"], meal_type, item["timestamp"], phash=item["phash"]
+                )
+                savepoint.commit()
+            except Exception as e:
+                savepoint.rollback()
+                logger.warning(f"Storing the batch analysis of {item['filename']} failed: {e}")
+                failed += 1
+                continue
+            entries.append({"index": index, "image_id": food_image.id})
+            total_calories += calories
+        db.commit()
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        db.rollback()
+        raise
+
+    logger.info(f"Stored {len(entries)} of {len(uploads)} food images from a batch")
+    yield "done", {
+        "analyzed": len(entries),
+        "failed": failed,
+        "total_calories": total_calories,
+        "entries": entries,
+    }
+
+
+def store_analysis(
+    db: Session,
+    s3_location: Dict[str, Any],
+    analysis: Dict[str, Any],
+    meal_type: str,
+    timestamp: datetime,
+    phash: Optional[str] = None,
+) -> Tuple[FoodImage, float, List[Dict[str, Any]]]:
+    """
+    Add the FoodImage, its FoodLog rows and its hash bands, and mark the day dirty. The caller commits.
+    Returns the image, its total calories and the detected foods.
+    """
+    food_image = FoodImage(
+        timestamp=timestamp,
+        s3_bucket=s3_location["bucket"],
+        s3_region=s3_location["region"],
+        s3_key=s3_location["key"],
+        content_type=s3_location.get("content_type"),
+        web_s3_key=s3_location.get("web_key"),
+        thumbnail_s3_key=s3_location.get("thumbnail_key"),
+        phash=phash,
+        raw_analysis=json.dumps(analysis),
+    )
+    db.add(food_image)
+    db.flush()  # Get the ID without committing
+    if phash:
+        add_hash_bands(db, food_image)
+
+    total_calories = 0
+    food_items = []
+    for food in analysis.get("foods", []):
+        db.add(
+            FoodLog(
+                image_id=food_image.id,
+                food_name=food["name"],
+                portion_size=food["portion"],
+                calories=food["calories"],
+                confidence=food["confidence"],
+                meal_type=meal_type,
+            )
+        )
+        total_calories += food["calories"]
+        food_items.append(food)
+
+    mark_dates_dirty(db, [food_image.timestamp], source="food")
+    return food_image, total_calories, food_items
+
+
+def entries_query(db: Session):
+    """
+    (FoodImage, total_calories) rows for the read endpoints. The total is a correlated SUM evaluated only
+    for the returned rows, and food_items are loaded by one extra SELECT ... IN for the whole result, so a
+    page costs two queries whatever its size.
+    """
+    total_calories = (
+        select(func.coalesce(func.sum(FoodLog.calories), 0))
+        .where(FoodLog.image_id == FoodImage.id)
+        .correlate(FoodImage)
+        .scalar_subquery()
+    )
+    return db.query(FoodImage, total_calories).options(selectinload(FoodImage.food_items))
+
+
+async def entry_responses(image_store: ImageStore, rows: List[Tuple[FoodImage, float]]) -> List[Dict[str, Any]]:
+    """API representation of entries_query rows"""
+    urls = await image_urls(image_store, [image for image, _ in rows])
+    return [
+        {
+            "id": image.id,
+            "timestamp": image.timestamp,
+            **urls[image.id],
+            "foods": [
+                {
+                    "name": item.food_name,
+                    "portion": item.portion_size,
+                    "calories": item.calories,
+                    "confidence": item.confidence,
+                    "meal_type": item.meal_type,
+                }
+                for item in image.food_items
+            ],
+            "total_calories": total_calories,
+        }
+        for image, total_calories in rows
+    ]
+
+
+async def image_urls(image_store: ImageStore, images: List[FoodImage]) -> Dict[int, Dict[str, str]]:
+    """
+    Presigned URLs for each image's renditions, keyed by image id and signed off the event loop.
+    Images stored before preprocessing only have the original.
+    """
+    keys = [key for image in images for key in (image.s3_key, image.web_s3_key, image.thumbnail_s3_key) if key]
+    urls = await image_store.get_image_urls(keys)
+    return {
+        image.id: {
+            "image_url": urls[image.s3_key],
+            "web_url": urls[image.web_s3_key or image.s3_key],
+            "thumbnail_url": urls[image.thumbnail_s3_key or image.s3_key],
+        }
+        for image in images
+    }
@@ -0,0 +1,69 @@
+import io
+import logging
+import math
+from typing import Any, BinaryIO, Dict
+from PIL import Image, ImageOps
+from pillow_heif import register_heif_opener
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Phone cameras upload HEIC by default
+register_heif_opener()
+
+
+def _jpeg(image: Image.Image, max_edge: int) -> bytes:
+    rendition = image.copy()
+    rendition.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    # No exif is passed to save, so location and camera metadata are dropped
+    rendition.save(buffer, format="JPEG", quality=settings.FOOD_IMAGE_JPEG_QUALITY, optimize=True)
+    return buffer.getvalue()
+
+
+def dhash(image: Image.Image) -> str:
+    """64-bit difference hash (one bit per horizontally adjacent pixel pair of a 9x8 grayscale) as hex"""
+    pixels = list(image.convert("L").resize((9, 8), Image.Resampling.LANCZOS).getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return f"{value:016x}"
+
+
+def preprocess_image(image_file: BinaryIO, filename: str) -> Dict[str, Any]:
+    """
+    Decode an upload and build its renditions: a downscaled JPEG for the vision model plus web-size and
+    thumbnail JPEGs for storage, all upright and without EXIF. The original stays in `image_file` (a
+    seekable file, usually spooled to disk) and is uploaded from there.
+
+    Returns:
+        dict with original, content_type, model, web, thumbnail and phash
+    """
+    try:
+        image_file.seek(0)
+        image = Image.open(image_file)
+        content_type = Image.MIME.get(image.format, "application/octet-stream")
+        # JPEGs can be decoded at a reduced scale, so a large photo never has to be held at full resolution
+        max_edge = max(settings.FOOD_IMAGE_MODEL_MAX_EDGE, settings.FOOD_IMAGE_WEB_MAX_EDGE)
+        scale = max_edge / max(image.size)
+        if scale < 1:
+            image.draft("RGB", (math.ceil(image.width * scale), math.ceil(image.height * scale)))
+        # Apply the EXIF orientation before the metadata is dropped
+        image = ImageOps.exif_transpose(image).convert("RGB")
+    except (OSError, Image.DecompressionBombError) as e:
+        raise ValueError(f"Could not decode image {filename}: {e}")
+
+    renditions = {
+        "original": image_file,
+        "content_type": content_type,
+        "model": _jpeg(image, settings.FOOD_IMAGE_MODEL_MAX_EDGE),
+        "web": _jpeg(image, settings.FOOD_IMAGE_WEB_MAX_EDGE),
+        "thumbnail": _jpeg(image, settings.FOOD_IMAGE_THUMBNAIL_MAX_EDGE),
+        "phash": dhash(image),
+    }
+    logger.info(
+        f"Preprocessed {filename} ({content_type}, decoded at {image.width}x{image.height}): "
+        f"{image_file.seek(0, io.SEEK_END)} bytes -> {len(renditions['model'])} bytes for the model"
+    )
+    return renditions
@@ -1,17 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query, Request
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from sqlalchemy.orm import Session
-from core.db import get_db, FoodImage, FoodLog
-from core.s3 import S3Handler
+from core.db import get_db, FoodAnalysisJob, FoodImage, FoodLog
+from core.image_store import create_image_store
+from core.local_image_store import sniff_content_type
+from .jobs import FoodJobWorker, job_response
 from .ollama import OllamaAPI
+from .pipeline import analyze_batch, analyze_upload, entries_query, entry_responses
 from datetime import datetime, time
 from typing import List, Optional
 import json
+import logging
 import pytz
 from core.config import settings
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 ollama_api = OllamaAPI()
-s3_handler = S3Handler()
+image_store = create_image_store()
+food_jobs = FoodJobWorker(ollama_api, image_store)
 
 
 def determine_meal_type(current_datetime: datetime, timezone_str: str = None) -> str:
@@ -53,60 +61,37 @@ def determine_meal_type(current_datetime: datetime, timezone_str: str = None) ->
 async def analyze_food(
     image: UploadFile = File(...),
     meal_type: Optional[str] = Query(None, description="Type of meal (breakfast, lunch, dinner, snack)"),
+    async_job: bool = Query(False, description="Queue the analysis and return a job id right away"),
+    webhook_url: Optional[str] = Query(None, description="With async_job, POST the job result to this URL"),
     db: Session = Depends(get_db),
 ):
     """
     Analyze a food image and return calorie estimates.
-    Uploads the image to S3 and stores analysis results in the database.
+    Stores the image (S3 or the local image store) and analysis results in the database.
+    With async_job=true the image is stored and a job id is returned immediately; poll /food/jobs/{job_id}
+    (or pass webhook_url) for the result.
     """
     try:
         # If meal_type is not provided, determine it based on current time
         if not meal_type:
-            current_time = datetime.now().time()
             meal_type = determine_meal_type(datetime.now())
 
-        # Read image data
-        image_data = await image.read()
-
-        # Upload to S3
-        s3_location = await s3_handler.upload_image(image_data, image.filename)
-
-        # Analyze image with Ollama
-        analysis = ollama_api.analyze_food_image(image_data)
-
-        # Create database entry for the image
-        food_image = FoodImage(
-            timestamp=datetime.utcnow(),
-            s3_bucket=s3_location["bucket"],
-            s3_region=s3_location["region"],
-            s3_key=s3_location["key"],
-            raw_analysis=json.dumps(analysis),
-        )
-        db.add(food_image)
-        db.flush()  # Get the ID without committing
-
-        # Add individual food items
-        total_calories = 0
-        food_items = []
-        food_items_string = ""
-        for food in analysis.get("foods", []):
-            food_log = FoodLog(
-                image_id=food_image.id,
-                food_name=food["name"],
-                portion_size=food["portion"],
-                calories=food["calories"],
-                confidence=food["confidence"],
-                meal_type=meal_type,
+        # The multipart parser has already spooled the upload to a temporary file (on disk once it is large);
+        # it is read from there in chunks rather than loaded into memory
+        if async_job:
+            job = await food_jobs.submit(db, image.file, image.filename, meal_type, webhook_url)
+            return JSONResponse(
+                status_code=202,
+                content={"job_id": job.id, "status": job.status, "status_url": f"/food/jobs/{job.id}"},
             )
-            food_items_string += f"{food['name']} - {food['portion']}\n"
-            db.add(food_log)
-            total_calories += food["calories"]
-            food_items.append(food)
 
+        # Store the image and analyze the image with Ollama concurrently, then create the database entries
+        food_image, total_calories, food_items = await analyze_upload(
+            db, ollama_api, image_store, image.file, image.filename, meal_type, datetime.utcnow()
+        )
         db.commit()
 
-        # Generate a presigned URL for the image
-        image_url = s3_handler.get_image_url(s3_location["key"])
+        food_items_string = "".join(f"{food['name']} - {food['portion']}\n" for food in food_items)
 
         # Prepare response
         # return the total calories and the food items as a string
@@ -116,6 +101,81 @@ async def analyze_food(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/analyze-batch")
+async def analyze_food_batch(
+    images: List[UploadFile] = File(...),
+    meal_type: Optional[str] = Query(None, description="Type of meal for every image (breakfast, lunch, ...)"),
+    db: Session = Depends(get_db),
+):
+    """
+    Analyze many food images in one request, FOOD_BATCH_CONCURRENCY at a time.
+    Streams Server-Sent Events: a `result` event per image as soon as it is analyzed (with its index in the
+    upload, its foods or its error), then a `done` event with the stored image ids once all entries are
+    committed in a single transaction (or an `error` event, in which case nothing was stored).
+    """
+    if not meal_type:
+        meal_type = determine_meal_type(datetime.now())
+    events = analyze_batch(
+        db,
+        ollama_api,
+        image_store,
+        [(image.file, image.filename) for image in images],
+        meal_type,
+        settings.FOOD_BATCH_CONCURRENCY,
+    )
+
+    async def encode():
+        try:
+            async for event, data in events:
+                yield f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+        except Exception as e:
+            logger.error(f"Error while streaming batch food analysis: {e}")
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+
+    return StreamingResponse(
+        encode(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str, db: Session = Depends(get_db)):
+    """
+    Status of an asynchronous food analysis job (queued, processing, completed or failed).
+    Completed jobs include the stored entry with its foods and calories.
+    """
+    job = db.query(FoodAnalysisJob).filter(FoodAnalysisJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Food analysis job not found")
+    return await job_response(db, job, image_store)
+
+
+@router.get("/stats")
+async def get_food_stats():
+    """Image store statistics (for S3, the presigned URL cache's hit ratio)"""
+    return {"image_store": image_store.stats()}
+
+
+@router.get("/images/{image_hash}")
+async def get_image(image_hash: str, request: Request):
+    """
+    Serve an image from the local content-addressed store (IMAGE_STORE_BACKEND=local).
+    Objects never change, so the hash is a strong ETag; Range requests are supported.
+    """
+    path = image_store.local_path(image_hash)
+    if not path:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    headers = {"ETag": f'"{image_hash}"', "Cache-Control": "private, max-age=31536000, immutable"}
+    if_none_match = {tag.strip().removeprefix("W/") for tag in request.headers.get("if-none-match", "").split(",")}
+    if headers["ETag"] in if_none_match or "*" in if_none_match:
+        return Response(status_code=304, headers=headers)
+
+    with open(path, "rb") as f:
+        content_type = sniff_content_type(f.read(16))
+    # FileResponse answers Range requests and hands the file to the server (pathsend) when it can
+    return FileResponse(path, media_type=content_type, headers=headers)
+
+
 @router.get("/entries")
 async def list_entries(
     db: Session = Depends(get_db),
@@ -125,37 +185,18 @@ async def list_entries(
 ):
     """
     List recent food entries with their analysis results.
+    Each entry links the original image, a web-size rendition and a thumbnail (thumbnail_url) for list views.
     Optionally filter by meal type.
     """
-    # Base query
-    query = db.query(FoodImage).order_by(FoodImage.timestamp.desc())
+    # Newest first; food items and calorie totals come with the page (see entries_query)
+    query = entries_query(db).order_by(FoodImage.timestamp.desc())
 
-    # Apply meal type filter if provided
+    # Apply meal type filter if provided; EXISTS keeps images with several matching items from repeating
     if meal_type:
-        query = query.join(FoodLog).filter(FoodLog.meal_type == meal_type)
+        query = query.filter(FoodImage.food_items.any(FoodLog.meal_type == meal_type))
 
     # Apply pagination
-    images = query.offset(offset).limit(limit).all()
-
-    return [
-        {
-            "id": image.id,
-            "timestamp": image.timestamp,
-            "image_url": s3_handler.get_image_url(image.s3_key),
-            "foods": [
-                {
-                    "name": item.food_name,
-                    "portion": item.portion_size,
-                    "calories": item.calories,
-                    "confidence": item.confidence,
-                    "meal_type": item.meal_type,
-                }
-                for item in image.food_items
-            ],
-            "total_calories": sum(item.calories for item in image.food_items if item.calories),
-        }
-        for image in images
-    ]
+    return await entry_responses(image_store, query.offset(offset).limit(limit).all())
 
 
 @router.get("/entries/{image_id}")
@@ -163,24 +204,10 @@ async def get_entry(image_id: int, db: Session = Depends(get_db)):
     """
     Get details for a specific food entry.
     """
-    image = db.query(FoodImage).filter(FoodImage.id == image_id).first()
-    if not image:
+    row = entries_query(db).filter(FoodImage.id == image_id).first()
+    if not row:
         raise HTTPException(status_code=404, detail="Food entry not found")
 
-    return {
-        "id": image.id,
-        "timestamp": image.timestamp,
-        "image_url": s3_handler.get_image_url(image.s3_key),
-        "foods": [
-            {
-                "name": item.food_name,
-                "portion": item.portion_size,
-                "calories": item.calories,
-                "confidence": item.confidence,
-                "meal_type": item.meal_type,
-            }
-            for item in image.food_items
-        ],
-        "total_calories": sum(item.calories for item in image.food_items if item.calories),
-        "raw_analysis": json.loads(image.raw_analysis) if image.raw_analysis else None,
-    }
+    image = row[0]
+    entry = (await entry_responses(image_store, [row]))[0]
+    return {**entry, "raw_analysis": json.loads(image.raw_analysis) if image.raw_analysis else None}
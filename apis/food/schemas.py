@@ -0,0 +1,22 @@
+from pydantic import BaseModel, Field, field_validator
+from typing import List, Optional
+
+
+class FoodItem(BaseModel):
+    """One food detected in a photo"""
+
+    name: str
+    portion: str  # e.g. "1 cup", "200g", "1 medium piece"
+    calories: float = Field(ge=0)  # Total for the portion
+    confidence: float
+
+    @field_validator("confidence")
+    def clamp_confidence(cls, value):
+        return min(max(value, 0.0), 1.0)
+
+
+class FoodAnalysis(BaseModel):
+    """Schema of the vision model's answer; also sent to Ollama as the structured output `format`"""
+
+    foods: List[FoodItem]
+    total_calories: Optional[float] = None
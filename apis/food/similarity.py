@@ -0,0 +1,72 @@
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+from core.config import settings
+from core.db import FoodImage, FoodImageHashBand
+
+logger = logging.getLogger(__name__)
+
+# A 64-bit hash split into 8 one-byte bands: two hashes within distance 7 share at least one band exactly
+HASH_BANDS = 8
+
+
+def hash_bands(phash: str) -> List[int]:
+    value = int(phash, 16)
+    return [(value >> (8 * (HASH_BANDS - 1 - band))) & 0xFF for band in range(HASH_BANDS)]
+
+
+def hamming_distance(a: str, b: str) -> int:
+    return (int(a, 16) ^ int(b, 16)).bit_count()
+
+
+def add_hash_bands(db: Session, image: FoodImage):
+    """Index a flushed image's phash so later near-duplicates can find it. The caller commits."""
+    for band, value in enumerate(hash_bands(image.phash)):
+        db.add(FoodImageHashBand(image_id=image.id, band=band, value=value))
+
+
+def find_recent_duplicate(db: Session, phash: str) -> Optional[Tuple[FoodImage, int]]:
+    """
+    The closest image analyzed within FOOD_IMAGE_REUSE_HOURS whose hash differs by at most
+    FOOD_IMAGE_REUSE_MAX_DISTANCE bits, with its distance. Candidates come from the band index, so only
+    images sharing a band are compared.
+    """
+    if settings.FOOD_IMAGE_REUSE_HOURS <= 0:
+        return None
+    max_distance = min(settings.FOOD_IMAGE_REUSE_MAX_DISTANCE, HASH_BANDS - 1)
+    cutoff = datetime.utcnow() - timedelta(hours=settings.FOOD_IMAGE_REUSE_HOURS)
+    candidates = (
+        db.query(FoodImage)
+        .join(FoodImageHashBand, FoodImageHashBand.image_id == FoodImage.id)
+        .filter(
+            or_(
+                *[
+                    and_(FoodImageHashBand.band == band, FoodImageHashBand.value == value)
+                    for band, value in enumerate(hash_bands(phash))
+                ]
+            ),
+            FoodImage.created_at >= cutoff,
+            FoodImage.raw_analysis.isnot(None),
+        )
+        .distinct()
+        .all()
+    )
+    matches = [(hamming_distance(phash, image.phash), image) for image in candidates]
+    matches = [(distance, image) for distance, image in matches if distance <= max_distance]
+    if not matches:
+        return None
+    distance, image = min(matches, key=lambda match: (match[0], -match[1].id))
+    return image, distance
+
+
+def reusable_analysis(db: Session, phash: str) -> Optional[Dict[str, Any]]:
+    """A recent near-duplicate's analysis, marked with the image it came from, or None"""
+    duplicate = find_recent_duplicate(db, phash)
+    if duplicate is None:
+        return None
+    image, distance = duplicate
+    logger.info(f"Reusing the analysis of food image {image.id} (hash distance {distance})")
+    return {**json.loads(image.raw_analysis), "reused_from": {"image_id": image.id, "distance": distance}}
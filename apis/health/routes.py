@@ -33,6 +33,7 @@ from core.db import (
     WalkingSpeed,
     PhysicalEffort,
 )
+from core.change_feed import mark_dates_dirty
 import logging
 
 logger = logging.getLogger(__name__)
@@ -127,6 +128,7 @@ async def post_health_data(data: Payload, db: Session = Depends(get_db)):
         user = User(id=user_id, username="asabi")
         db.add(user)
         db.commit()
+    ingested_timestamps = []
     for metric in data.data.metrics:
         logger.info(f"Processing metric: {metric.name}")
         model_class = METRIC_MODEL_MAP.get(metric.name)
@@ -145,6 +147,10 @@ async def post_health_data(data: Payload, db: Session = Depends(get_db)):
 
             parsed_item["date"] = data_item.date  # Required for HealthData upsert
             save_metric(db, user_id, metric.name, metric.units, parsed_item, model_class)
+            ingested_timestamps.append(data_item.date)
+
+    mark_dates_dirty(db, ingested_timestamps, source="health")
+    db.commit()
 
     return {"status": "success"}
 
@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 from core.db import get_db, LocationTrack
 from apis.locations.schemas import OwnTracksPayload, LocationTrackResponse
 from apis.weather.routes import post_all_weather_data
+from core.change_feed import mark_dates_dirty
 from datetime import datetime, timedelta
 import httpx
 from geopy.geocoders import Nominatim
@@ -98,6 +99,7 @@ async def track_location(
         )
 
         db.add(location_track)
+        mark_dates_dirty(db, [location_track.timestamp], source="location")
         db.commit()
         db.refresh(location_track)
 
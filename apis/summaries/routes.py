@@ -1,15 +1,98 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from core.db import get_db
 from core.daily_summary import DailySummaryService
+from core.llm_gateway import PRIORITY_BACKGROUND, llm_gateway
+from core.summary_rollups import GRANULARITIES, month_key, week_bounds, week_key
+from core.summary_store import get_recent_summaries, get_summaries_in_range, get_summary
 from datetime import date, datetime, timedelta
-from typing import Optional
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+import json
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 summary_service = DailySummaryService()
 
+# Stored granularities (from core.summary_rollups); searches may also span all of them
+STORED_GRANULARITY_PATTERN = f"^({'|'.join(GRANULARITIES)})$"
+GRANULARITY_PATTERN = f"^({'|'.join(GRANULARITIES)}|all)$"
+GRANULARITY_DESCRIPTION = (
+    "Which summaries to search: daily (default), weekly, monthly or all. "
+    "Use weekly/monthly for long-horizon questions such as 'how was March?'"
+)
+
+
+def format_stored_summaries(payloads):
+    """Shape stored summaries like search results (score is None since no search was run)"""
+    return summary_service.format_search_results([{"payload": payload} for payload in payloads])
+
+
+def search_granularity(granularity: str) -> Optional[str]:
+    return None if granularity == "all" else granularity
+
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+def parse_date_param(value: str) -> date:
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD.")
+
+
+def search_filters(
+    start_date: Optional[str] = Query(None, description="Only summaries on or after this date (YYYY-MM-DD)"),
+    end_date: Optional[str] = Query(None, description="Only summaries on or before this date (YYYY-MM-DD)"),
+    weekday: Optional[List[str]] = Query(None, description="Only these weekdays, e.g. weekday=Monday&weekday=Friday"),
+    min_steps: Optional[float] = Query(None, ge=0),
+    max_steps: Optional[float] = Query(None, ge=0),
+    min_sleep_hours: Optional[float] = Query(None, ge=0),
+    max_sleep_hours: Optional[float] = Query(None, ge=0),
+    min_event_count: Optional[int] = Query(None, ge=0),
+    max_event_count: Optional[int] = Query(None, ge=0),
+) -> Dict[str, Any]:
+    """Structured search filters, pushed down to the vector store as payload filter clauses"""
+    filters = {
+        "start_date": parse_date_param(start_date).isoformat() if start_date else None,
+        "end_date": parse_date_param(end_date).isoformat() if end_date else None,
+        "min_steps": min_steps,
+        "max_steps": max_steps,
+        "min_sleep_hours": min_sleep_hours,
+        "max_sleep_hours": max_sleep_hours,
+        "min_event_count": min_event_count,
+        "max_event_count": max_event_count,
+    }
+
+    if weekday:
+        weekdays = [day.strip().capitalize() for day in weekday]
+        invalid = [day for day in weekdays if day not in WEEKDAYS]
+        if invalid:
+            raise HTTPException(status_code=400, detail=f"Invalid weekday(s): {', '.join(invalid)}")
+        filters["weekdays"] = weekdays
+
+    return {key: value for key, value in filters.items() if value is not None}
+
+
+def event_stream_response(events: AsyncIterator[Tuple[str, Any]]) -> StreamingResponse:
+    """Forward (event, data) pairs to the client as Server-Sent Events"""
+
+    async def encode():
+        try:
+            async for event, data in events:
+                yield f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+        except Exception as e:
+            logger.error(f"Error while streaming summary response: {e}")
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+
+    # Disable proxy buffering so tokens reach the client as soon as they are generated
+    return StreamingResponse(
+        encode(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 
 @router.post("/create")
 async def create_daily_summary(
@@ -19,7 +102,7 @@ async def create_daily_summary(
     """
     Create a daily summary for the specified date (or yesterday if not specified).
     Collects all data from calendar events, food intake, health metrics, and sleep data.
-    Generates an AI summary and stores it in the vector database.
+    Generates an AI summary, stores it and queues it for the vector database.
     """
     try:
         # Parse target date
@@ -39,6 +122,8 @@ async def create_daily_summary(
             "date": result["date"],
             "summary": result["summary"],
             "metadata": result["metadata"],
+            "prompt_stats": result["prompt_stats"],
+            "rollups": result.get("rollups", []),
         }
 
     except Exception as e:
@@ -46,10 +131,42 @@ async def create_daily_summary(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/stats")
+async def get_summary_stats(db: Session = Depends(get_db)):
+    """
+    Statistics for the summary pipeline (cache hit/miss counts, vector store size and search latency,
+    and the vector outbox backlog: pending writes, retries and lag_seconds since the oldest queued change).
+    """
+    return {
+        "embedding_cache": summary_service.qdrant_client.embedding_cache.stats(),
+        "answer_cache": summary_service.answer_cache.stats(),
+        "vector_store": summary_service.qdrant_client.store.stats(),
+        "vector_outbox": summary_service.vector_outbox.stats(db),
+        "rollups": summary_service.rollups.stats(db),
+        "llm_gateway": llm_gateway.stats(),
+    }
+
+
+@router.post("/create/stream")
+async def stream_daily_summary(
+    target_date: Optional[str] = Query(None, description="Date in YYYY-MM-DD format. Defaults to yesterday."),
+    db: Session = Depends(get_db),
+):
+    """
+    Same as /create, but streams the summary as Server-Sent Events while it is generated.
+    Emits a `start` event, one `token` event per generated chunk and a final `done` event
+    carrying the stored summary and metadata (or an `error` event).
+    """
+    parsed_date = parse_date_param(target_date) if target_date else None
+    return event_stream_response(summary_service.stream_daily_summary(db, parsed_date))
+
+
 @router.get("/query")
 async def query_summaries(
     q: str = Query(..., description="Natural language query about your daily patterns"),
     limit: int = Query(5, description="Maximum number of relevant summaries to consider", ge=1, le=20),
+    granularity: str = Query("daily", description=GRANULARITY_DESCRIPTION, pattern=GRANULARITY_PATTERN),
+    filters: Dict[str, Any] = Depends(search_filters),
 ):
     """
     Query your daily summaries using natural language.
@@ -60,15 +177,21 @@ async def query_summaries(
     - "When do I sleep the best?"
     - "What are my most productive days like?"
     - "How does my exercise affect my sleep?"
+
+    Structured filters (date range, weekday, steps/sleep/event ranges) narrow the search before ranking,
+    e.g. Mondays in 2025 with under 6 hours of sleep:
+    `?q=...&start_date=2025-01-01&end_date=2025-12-31&weekday=Monday&max_sleep_hours=6`
     """
     try:
-        result = await summary_service.query_summaries(q, limit)
+        result = await summary_service.query_summaries(q, limit, search_granularity(granularity), filters)
 
         return {
             "query": result["query"],
             "answer": result["ai_response"],
             "relevant_summaries": result["relevant_summaries"],
             "total_found": result["total_found"],
+            "filters": filters,
+            "cached": result["cached"],
         }
 
     except Exception as e:
@@ -76,25 +199,119 @@ async def query_summaries(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/query/stream")
+async def stream_query_summaries(
+    q: str = Query(..., description="Natural language query about your daily patterns"),
+    limit: int = Query(5, description="Maximum number of relevant summaries to consider", ge=1, le=20),
+    granularity: str = Query("daily", description=GRANULARITY_DESCRIPTION, pattern=GRANULARITY_PATTERN),
+    filters: Dict[str, Any] = Depends(search_filters),
+):
+    """
+    Same as /query, but streams the answer as Server-Sent Events.
+    Emits a `results` event with the matching summaries, one `token` event per generated chunk
+    and a final `done` event with the complete answer (or an `error` event).
+    """
+    return event_stream_response(
+        summary_service.stream_query_summaries(q, limit, search_granularity(granularity), filters)
+    )
+
+
 @router.get("/recent")
-async def get_recent_summaries(
+async def get_recent_summaries_endpoint(
     limit: int = Query(7, description="Number of recent summaries to retrieve", ge=1, le=30),
+    granularity: str = Query("daily", description="daily, weekly or monthly", pattern=STORED_GRANULARITY_PATTERN),
+    db: Session = Depends(get_db),
 ):
     """
-    Get recent daily summaries without querying.
-    Useful for reviewing recent days or getting an overview.
+    Get the most recent summaries, newest first.
+    Served from the relational summary table by date, without any model call or vector search.
     """
     try:
-        # Use a broad query to get recent summaries
-        result = await summary_service.query_summaries("recent daily activities", limit)
+        summaries = format_stored_summaries(get_recent_summaries(db, limit, granularity))
+        return {"summaries": summaries, "total_found": len(summaries)}
+
+    except Exception as e:
+        logger.error(f"Error getting recent summaries: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/range")
+async def get_summaries_for_range(
+    start_date: str = Query(..., description="Start date in YYYY-MM-DD format"),
+    end_date: str = Query(..., description="End date in YYYY-MM-DD format"),
+    granularity: str = Query("daily", description="daily, weekly or monthly", pattern=STORED_GRANULARITY_PATTERN),
+    db: Session = Depends(get_db),
+):
+    """Get all stored summaries whose date (or period start) falls within a date range, oldest first."""
+    start = parse_date_param(start_date)
+    end = parse_date_param(end_date)
+
+    if start > end:
+        raise HTTPException(status_code=400, detail="Start date must be before or equal to end date.")
+
+    summaries = format_stored_summaries(get_summaries_in_range(db, start, end, granularity))
+    return {"summaries": summaries, "total_found": len(summaries)}
+
+
+@router.get("/date/{target_date}")
+async def get_summary_for_date(
+    target_date: str,
+    granularity: str = Query(
+        "daily",
+        description="daily, or weekly/monthly for the rollup containing the date",
+        pattern=STORED_GRANULARITY_PATTERN,
+    ),
+    db: Session = Depends(get_db),
+):
+    """Get the stored summary for a date (format: YYYY-MM-DD), or the weekly/monthly rollup containing it."""
+    day = parse_date_param(target_date)
 
-        # Sort by date (most recent first)
-        summaries = sorted(result["relevant_summaries"], key=lambda x: x["date"], reverse=True)
+    if granularity == "weekly":
+        period = week_key(week_bounds(day)[0])
+    elif granularity == "monthly":
+        period = month_key(day.year, day.month)
+    else:
+        period = day.isoformat()
 
-        return {"summaries": summaries[:limit], "total_found": len(summaries)}
+    summary = get_summary(db, granularity, period)
+    if not summary:
+        raise HTTPException(status_code=404, detail=f"No {granularity} summary found for {target_date}")
+
+    return format_stored_summaries([summary])[0]
+
+
+@router.post("/sync-from-qdrant")
+async def sync_summaries_from_qdrant(db: Session = Depends(get_db)):
+    """
+    One-time backfill: copy summaries that were stored only in the vector database
+    (before the relational summary table existed) into the daily_summaries table.
+    """
+    try:
+        counts = summary_service.sync_from_vector_store(db)
+        return {"message": "Summary table synced from vector database", "synced": counts}
 
     except Exception as e:
-        logger.error(f"Error getting recent summaries: {e}")
+        logger.error(f"Error syncing summaries from vector database: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/reindex")
+async def reindex_summaries(
+    granularity: Optional[str] = Query(
+        None, description="daily, weekly or monthly (default: all)", pattern=STORED_GRANULARITY_PATTERN
+    ),
+    db: Session = Depends(get_db),
+):
+    """
+    Re-embed all stored summaries (optionally one granularity) and rewrite their vector points,
+    sending EMBEDDING_BATCH_SIZE summaries per embedding request and upsert.
+    """
+    try:
+        counts = await run_in_threadpool(summary_service.reindex_vector_store, db, granularity)
+        return {"message": "Summaries re-indexed", "reindexed": counts}
+
+    except Exception as e:
+        logger.error(f"Error re-indexing summaries: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -128,7 +345,9 @@ async def create_bulk_summaries(
 
         while current_date <= end:
             try:
-                result = await summary_service.create_daily_summary(db, current_date)
+                result = await summary_service.create_daily_summary(
+                    db, current_date, update_rollups=False, priority=PRIORITY_BACKGROUND
+                )
                 results.append({"date": result["date"], "status": "success", "summary_length": len(result["summary"])})
             except Exception as e:
                 logger.error(f"Error creating summary for {current_date}: {e}")
@@ -139,12 +358,86 @@ async def create_bulk_summaries(
         successful = len([r for r in results if r["status"] == "success"])
         failed = len([r for r in results if r["status"] == "error"])
 
+        # Rebuild each affected weekly/monthly rollup once rather than once per day
+        rollups = await summary_service.rollups.rebuild_for_dates(
+            db, [date.fromisoformat(r["date"]) for r in results if r["status"] == "success"]
+        )
+
         return {
             "message": f"Bulk summary creation completed. {successful} successful, {failed} failed.",
             "results": results,
+            "rollups": rollups,
             "summary": {"total_processed": len(results), "successful": successful, "failed": failed},
         }
 
     except Exception as e:
         logger.error(f"Error in bulk summary creation: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/refresh-dirty")
+async def refresh_dirty_summaries(
+    include_today: bool = Query(False, description="Also regenerate today's summary if it has new data"),
+    limit: Optional[int] = Query(None, description="Maximum number of days to regenerate", ge=1, le=90),
+    db: Session = Depends(get_db),
+):
+    """
+    Regenerate summaries only for days that received new data (health, location, food, calendar or weather)
+    since their summary was last created. Repeated changes to the same day are coalesced into a single run.
+    """
+    try:
+        refreshed = await summary_service.refresh_dirty_days(db, include_today=include_today, limit=limit)
+        results = refreshed["results"]
+
+        successful = len([r for r in results if r["status"] == "success"])
+        failed = len([r for r in results if r["status"] == "error"])
+
+        return {
+            "message": f"Dirty summary refresh completed. {successful} successful, {failed} failed.",
+            "results": results,
+            "rollups": refreshed["rollups"],
+            "summary": {"total_processed": len(results), "successful": successful, "failed": failed},
+        }
+
+    except Exception as e:
+        logger.error(f"Error refreshing dirty summaries: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/rollups/rebuild")
+async def rebuild_rollups(
+    start_date: str = Query(..., description="Start date in YYYY-MM-DD format"),
+    end_date: str = Query(..., description="End date in YYYY-MM-DD format"),
+    db: Session = Depends(get_db),
+):
+    """
+    Rebuild the weekly and monthly rollups covering a date range from the stored daily summaries.
+    Useful after backfilling daily summaries or changing the summary model.
+    """
+    start = parse_date_param(start_date)
+    end = parse_date_param(end_date)
+
+    if start > end:
+        raise HTTPException(status_code=400, detail="Start date must be before or equal to end date.")
+
+    if (end - start).days > 366:
+        raise HTTPException(status_code=400, detail="Date range cannot exceed one year.")
+
+    try:
+        days = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+        rollups = await summary_service.rollups.rebuild_for_dates(db, days)
+
+        return {
+            "message": "Rollup rebuild completed",
+            "rollups": rollups,
+            "summary": {
+                "total_processed": len(rollups),
+                "successful": len([r for r in rollups if r["status"] == "success"]),
+                "skipped": len([r for r in rollups if r["status"] == "skipped"]),
+                "failed": len([r for r in rollups if r["status"] == "error"]),
+            },
+        }
+
+    except Exception as e:
+        logger.error(f"Error rebuilding rollups: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
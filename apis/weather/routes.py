@@ -3,6 +3,7 @@ import httpx
 from core.config import settings
 from sqlalchemy.orm import Session
 from core.db import get_db, WeatherData, WeatherAlerts, AirQuality, MarineWeather, AstronomyData
+from core.change_feed import mark_dates_dirty
 from typing import Dict, Any, List, Union
 from apis.weather.schemas import (
     WeatherDataSchema,
@@ -90,6 +91,7 @@ async def post_current_weather(
         )
 
         db.add(weather_entry)
+        mark_dates_dirty(db, [weather_entry.last_updated_epoch], source="weather")
         db.commit()
         db.refresh(weather_entry)
 
@@ -0,0 +1,79 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from core.config import settings
+from core.embedding_cache import normalize_text
+
+
+class AnswerCache:
+    """
+    TTL cache for /summaries/query answers keyed by (normalized query, limit, granularity, filters).
+
+    Entries are tied to the vector collection version they were computed against: the first lookup
+    after the version changes (i.e. after new points were written) drops every cached answer.
+    """
+
+    def __init__(self, ttl: Optional[int] = None, max_entries: Optional[int] = None):
+        self.ttl = ttl if ttl is not None else settings.SUMMARY_ANSWER_CACHE_TTL
+        self.max_entries = max_entries if max_entries is not None else settings.SUMMARY_ANSWER_CACHE_SIZE
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0
+
+    def key(self, query: str, limit: int, granularity: Optional[str], filters: Optional[Dict[str, Any]]) -> str:
+        parts = [normalize_text(query).lower(), limit, granularity, filters or {}]
+        return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _check_version(self, version: int):
+        if version != self._version:
+            if self._entries:
+                self._counters["invalidations"] += 1
+            self._entries.clear()
+            self._version = version
+
+    def get(self, key: str, version: int) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                self._entries.pop(key, None)
+                self._counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters["hits"] += 1
+            return entry[1]
+
+    def put(self, key: str, version: int, answer: Dict[str, Any]):
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._version is not None and version < self._version:
+                # Computed against points that have since been overwritten
+                return
+            self._check_version(version)
+            self._entries[key] = (time.monotonic() + self.ttl, answer)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+            entries = len(self._entries)
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            **counters,
+            "hit_ratio": round(counters["hits"] / lookups, 3) if lookups else None,
+            "entries": entries,
+            "ttl_seconds": self.ttl,
+        }
@@ -0,0 +1,150 @@
+import logging
+import pytz
+from datetime import datetime, date
+from typing import Iterable, List, Optional, Set, Tuple, Union
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects import postgresql, sqlite
+from core.config import settings
+from core.db import DirtyDay, DirtyRollup, engine
+
+logger = logging.getLogger(__name__)
+
+Timestamp = Union[datetime, date, int, float]
+
+
+def local_date_for(timestamp: Timestamp) -> date:
+    """
+    Convert an ingestion timestamp to the local date its summary belongs to.
+
+    Naive datetimes are assumed to be in GMT (the way they are stored in the database),
+    integers/floats are treated as epoch seconds and plain dates are returned as is.
+    """
+    timezone = pytz.timezone(settings.TIMEZONE)
+
+    if isinstance(timestamp, (int, float)):
+        timestamp = datetime.fromtimestamp(timestamp, tz=pytz.UTC)
+    elif not isinstance(timestamp, datetime):
+        return timestamp
+
+    if timestamp.tzinfo is None:
+        timestamp = pytz.UTC.localize(timestamp)
+
+    return timestamp.astimezone(timezone).date()
+
+
+def _insert(model):
+    dialect = engine.dialect.name
+
+    if dialect == "sqlite":
+        return sqlite.insert(model)
+    elif dialect == "postgresql":
+        return postgresql.insert(model)
+    raise NotImplementedError(f"Upsert not implemented for dialect {dialect}")
+
+
+def _dirty_day_upsert(target_date: date, source: str, now: datetime):
+    insert_stmt = _insert(DirtyDay).values(
+        date=target_date, change_count=1, last_source=source, first_marked_at=now, last_marked_at=now
+    )
+    # Repeated changes to the same day coalesce into a single row
+    return insert_stmt.on_conflict_do_update(
+        index_elements=["date"],
+        set_={
+            "change_count": DirtyDay.change_count + 1,
+            "last_source": insert_stmt.excluded.last_source,
+            "last_marked_at": insert_stmt.excluded.last_marked_at,
+        },
+    )
+
+
+def mark_dates_dirty(db: Session, timestamps: Iterable[Optional[Timestamp]], source: str) -> Set[date]:
+    """
+    Mark the local dates touched by newly ingested data as needing a fresh summary.
+    The caller is responsible for committing the session.
+    """
+    dirty_dates = {local_date_for(ts) for ts in timestamps if ts is not None}
+    now = datetime.utcnow()
+
+    for dirty_date in sorted(dirty_dates):
+        db.execute(_dirty_day_upsert(dirty_date, source, now))
+
+    if dirty_dates:
+        marked = ", ".join(d.isoformat() for d in sorted(dirty_dates))
+        logger.info(f"Marked {len(dirty_dates)} day(s) dirty from {source}: {marked}")
+
+    return dirty_dates
+
+
+def clear_dirty_date(db: Session, target_date: date, marked_before: datetime) -> bool:
+    """
+    Clear a dirty day once its summary has been regenerated.
+    Only clears the entry if nothing marked it again after `marked_before`, so data that
+    arrives while the summary is being generated keeps the day dirty.
+    """
+    deleted = (
+        db.query(DirtyDay)
+        .filter(DirtyDay.date == target_date, DirtyDay.last_marked_at <= marked_before)
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return bool(deleted)
+
+
+def get_dirty_dates(db: Session, before: Optional[date] = None, limit: Optional[int] = None) -> list:
+    """Return dirty days ordered by date, optionally only those strictly before `before`"""
+    query = db.query(DirtyDay)
+    if before is not None:
+        query = query.filter(DirtyDay.date < before)
+    query = query.order_by(DirtyDay.date)
+    if limit:
+        query = query.limit(limit)
+    return query.all()
+
+
+def _dirty_rollup_upsert(granularity: str, period: str, period_start: date, now: datetime):
+    insert_stmt = _insert(DirtyRollup).values(
+        granularity=granularity,
+        period=period,
+        period_start=period_start,
+        change_count=1,
+        first_marked_at=now,
+        last_marked_at=now,
+    )
+    return insert_stmt.on_conflict_do_update(
+        index_elements=["granularity", "period"],
+        set_={
+            "change_count": DirtyRollup.change_count + 1,
+            "last_marked_at": insert_stmt.excluded.last_marked_at,
+        },
+    )
+
+
+def mark_rollups_dirty(db: Session, periods: Iterable[Tuple[str, str, date]]):
+    """
+    Mark (granularity, period, period_start) rollups as needing a rebuild.
+    The caller is responsible for committing the session.
+    """
+    now = datetime.utcnow()
+    for granularity, period, period_start in periods:
+        db.execute(_dirty_rollup_upsert(granularity, period, period_start, now))
+
+
+def clear_dirty_rollup(db: Session, granularity: str, period: str, marked_before: datetime) -> bool:
+    """Clear a dirty rollup once rebuilt, unless a day in it changed again after `marked_before`"""
+    deleted = (
+        db.query(DirtyRollup)
+        .filter(
+            DirtyRollup.granularity == granularity,
+            DirtyRollup.period == period,
+            DirtyRollup.last_marked_at <= marked_before,
+        )
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return bool(deleted)
+
+
+def get_dirty_rollups(db: Session) -> List[DirtyRollup]:
+    """Dirty rollups with every weekly one first, so monthly rollups are rebuilt from fresh weeklies"""
+    rollups = db.query(DirtyRollup).order_by(DirtyRollup.period_start).all()
+    return sorted(rollups, key=lambda rollup: rollup.granularity != "weekly")
@@ -32,26 +32,83 @@ class Settings(BaseSettings):
         "WEEKLY_REFLECTIONS_SPREADSHEET_ID", ""
     )  # Google Sheet ID for weekly reflections
 
+    # Food Image Storage Settings
+    IMAGE_STORE_BACKEND: str = Field("s3", env="IMAGE_STORE_BACKEND")  # "s3" or "local" (content-addressed files)
+    IMAGE_STORE_DIR: str = Field("data/images", env="IMAGE_STORE_DIR")  # Root of the local image store
+
     # AWS Settings
     AWS_ACCESS_KEY_ID: Optional[str] = Field(None, env="AWS_ACCESS_KEY_ID")
     AWS_SECRET_ACCESS_KEY: Optional[str] = Field(None, env="AWS_SECRET_ACCESS_KEY")
     AWS_REGION: str = Field("us-east-1", env="AWS_REGION")
     AWS_BUCKET_NAME: str = Field("daily_food_images", env="AWS_BUCKET_NAME")
+    S3_ENDPOINT_URL: Optional[str] = Field(None, env="S3_ENDPOINT_URL")  # S3-compatible server (MinIO, LocalStack)
+    S3_MULTIPART_CHUNK_SIZE: int = Field(8 * 1024 * 1024, env="S3_MULTIPART_CHUNK_SIZE")  # Bytes per upload part
+    S3_MULTIPART_CONCURRENCY: int = Field(4, env="S3_MULTIPART_CONCURRENCY")  # Parts of one upload sent at once
+    S3_PRESIGNED_URL_EXPIRY: int = Field(3600, env="S3_PRESIGNED_URL_EXPIRY")  # Lifetime of image URLs (seconds)
+    S3_PRESIGNED_URL_MARGIN: int = Field(300, env="S3_PRESIGNED_URL_MARGIN")  # Min remaining validity to reuse one
+    S3_PRESIGNED_URL_CACHE_SIZE: int = Field(10000, env="S3_PRESIGNED_URL_CACHE_SIZE")  # Cached URLs (0 disables)
+
+    # Food Image Settings
+    FOOD_IMAGE_MODEL_MAX_EDGE: int = Field(1024, env="FOOD_IMAGE_MODEL_MAX_EDGE")  # Longest edge sent to the model
+    FOOD_IMAGE_WEB_MAX_EDGE: int = Field(1600, env="FOOD_IMAGE_WEB_MAX_EDGE")  # Longest edge of the web rendition
+    FOOD_IMAGE_THUMBNAIL_MAX_EDGE: int = Field(320, env="FOOD_IMAGE_THUMBNAIL_MAX_EDGE")  # Longest thumbnail edge
+    FOOD_IMAGE_JPEG_QUALITY: int = Field(85, env="FOOD_IMAGE_JPEG_QUALITY")  # Quality of the resized renditions
+    FOOD_IMAGE_REUSE_HOURS: float = Field(24.0, env="FOOD_IMAGE_REUSE_HOURS")  # Reuse recent analyses (0 disables)
+    FOOD_IMAGE_REUSE_MAX_DISTANCE: int = Field(6, env="FOOD_IMAGE_REUSE_MAX_DISTANCE")  # Max differing dHash bits (<8)
+
+    # Food Analysis Job Settings (/food/analyze?async_job=true)
+    FOOD_BATCH_CONCURRENCY: int = Field(2, env="FOOD_BATCH_CONCURRENCY")  # Images of one /analyze-batch in flight
+    FOOD_JOB_DIR: str = Field("data/food_jobs", env="FOOD_JOB_DIR")  # Uploads spooled here until processed
+    FOOD_JOB_CONCURRENCY: int = Field(2, env="FOOD_JOB_CONCURRENCY")  # Jobs processed at once
+    FOOD_JOB_MAX_ATTEMPTS: int = Field(3, env="FOOD_JOB_MAX_ATTEMPTS")  # Attempts before a job is marked failed
+    FOOD_JOB_WEBHOOK_URL: Optional[str] = Field(None, env="FOOD_JOB_WEBHOOK_URL")  # Default completion webhook
 
     # Ollama Settings
     OLLAMA_MODEL: str = Field("llava", env="OLLAMA_MODEL")  # Default to llava if not specified
     OLLAMA_URL: str = Field("http://100.119.144.30:11434", env="OLLAMA_URL")
+    FOOD_ANALYSIS_NUM_PREDICT: int = Field(512, env="FOOD_ANALYSIS_NUM_PREDICT")  # Token cap for one food analysis
+    FOOD_ANALYSIS_TEMPERATURE: float = Field(0.1, env="FOOD_ANALYSIS_TEMPERATURE")  # Low for consistent estimates
 
     # Vector Database Settings
     VECTOR_DB_URL: str = Field("http://localhost:6333", env="VECTOR_DB_URL")
+    VECTOR_DATA_DIR: str = Field("data/vectors", env="VECTOR_DATA_DIR")  # Local vector state (sizes, caches)
+    VECTOR_COLLECTION_CHECK_TTL: int = Field(0, env="VECTOR_COLLECTION_CHECK_TTL")  # Seconds; 0 = once per process
+    VECTOR_STORE_BACKEND: str = Field("qdrant", env="VECTOR_STORE_BACKEND")  # "qdrant" or "local" (embedded)
+    VECTOR_LOCAL_ANN_THRESHOLD: int = Field(20000, env="VECTOR_LOCAL_ANN_THRESHOLD")  # Points before IVF kicks in
+    VECTOR_LOCAL_ANN_NPROBE: int = Field(8, env="VECTOR_LOCAL_ANN_NPROBE")  # IVF lists scanned per search
+    VECTOR_QUANTIZATION: str = Field("none", env="VECTOR_QUANTIZATION")  # "none" or "int8", set at collection creation
+    VECTOR_QUANTIZATION_QUANTILE: float = Field(0.99, env="VECTOR_QUANTIZATION_QUANTILE")
+    VECTOR_QUANTIZATION_RESCORE: bool = Field(True, env="VECTOR_QUANTIZATION_RESCORE")  # Rescore with full vectors
+    VECTOR_QUANTIZATION_OVERSAMPLING: float = Field(2.0, env="VECTOR_QUANTIZATION_OVERSAMPLING")
+    VECTOR_REDUCTION: str = Field("none", env="VECTOR_REDUCTION")  # "none", "truncate" or "pca"
+    VECTOR_DIMENSIONS: int = Field(0, env="VECTOR_DIMENSIONS")  # Stored dimensions for truncate/pca
 
     # Vector Embedding Settings (separate from main Ollama for flexibility)
     VECTOR_EMBEDDING_OLLAMA_MODEL: str = Field("qwen3:32b", env="VECTOR_EMBEDDING_OLLAMA_MODEL")
     VECTOR_EMBEDDING_OLLAMA_URL: str = Field("http://100.119.144.30:11434", env="VECTOR_EMBEDDING_OLLAMA_URL")
+    EMBEDDING_CACHE_MEMORY_SIZE: int = Field(1024, env="EMBEDDING_CACHE_MEMORY_SIZE")  # In-memory LRU entries
+    EMBEDDING_BATCH_SIZE: int = Field(32, env="EMBEDDING_BATCH_SIZE")  # Texts per /api/embed call and upsert
+    VECTOR_OUTBOX_POLL_INTERVAL: float = Field(5.0, env="VECTOR_OUTBOX_POLL_INTERVAL")  # Seconds between idle polls
+    VECTOR_OUTBOX_RETRY_BASE: float = Field(5.0, env="VECTOR_OUTBOX_RETRY_BASE")  # First retry delay in seconds
+    VECTOR_OUTBOX_RETRY_MAX: float = Field(600.0, env="VECTOR_OUTBOX_RETRY_MAX")  # Backoff cap in seconds
 
     # Summary Generation Settings (lightweight model for faster summaries)
     SUMMARY_OLLAMA_MODEL: str = Field("qwen3:7b", env="SUMMARY_OLLAMA_MODEL")
     SUMMARY_OLLAMA_URL: str = Field("http://100.119.144.30:11434", env="SUMMARY_OLLAMA_URL")
+    SUMMARY_PROMPT_TOKEN_BUDGET: int = Field(3000, env="SUMMARY_PROMPT_TOKEN_BUDGET")  # Approximate prompt size cap
+    SUMMARY_DESCRIPTION_MAX_CHARS: int = Field(200, env="SUMMARY_DESCRIPTION_MAX_CHARS")  # Calendar descriptions
+    SUMMARY_ANSWER_CACHE_TTL: int = Field(300, env="SUMMARY_ANSWER_CACHE_TTL")  # Seconds; 0 disables the cache
+    SUMMARY_ANSWER_CACHE_SIZE: int = Field(256, env="SUMMARY_ANSWER_CACHE_SIZE")  # Cached query answers
+    SUMMARY_FALLBACK_ROUTES: str = Field("", env="SUMMARY_FALLBACK_ROUTES")  # "model@url,..." tried after the above
+    SUMMARY_ATTEMPT_TIMEOUT: float = Field(300.0, env="SUMMARY_ATTEMPT_TIMEOUT")  # Seconds per route attempt
+    SUMMARY_HEDGE_DELAY: float = Field(0.0, env="SUMMARY_HEDGE_DELAY")  # Seconds before hedging; 0 = on failure only
+
+    # LLM Gateway Settings (shared by vision, summary and embedding calls to Ollama)
+    LLM_MAX_CONCURRENCY: int = Field(2, env="LLM_MAX_CONCURRENCY")  # Concurrent requests per Ollama endpoint
+    LLM_ENDPOINT_CONCURRENCY: str = Field("", env="LLM_ENDPOINT_CONCURRENCY")  # e.g. "http://gpu:11434=4,..."
+    LLM_QUEUE_TIMEOUT: float = Field(600.0, env="LLM_QUEUE_TIMEOUT")  # Max seconds a request waits for a slot
+    LLM_KEEP_ALIVE: str = Field("30m", env="LLM_KEEP_ALIVE")  # How long Ollama keeps models loaded; "" = default
+    LLM_WARM_UP: bool = Field(True, env="LLM_WARM_UP")  # Load the configured models on startup
 
     # Timezone Settings
     TIMEZONE: str = Field("America/Vancouver", env="TIMEZONE")
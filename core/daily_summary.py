@@ -1,9 +1,9 @@
+import asyncio
 import json
 import logging
-import httpx
 import pytz
 from datetime import datetime, date, timedelta
-from typing import Dict, List, Any, Optional
+from typing import AsyncIterator, Dict, List, Any, Optional, Tuple
 from sqlalchemy.orm import Session
 from sqlalchemy import func, and_
 from core.db import (
@@ -19,20 +19,37 @@ from core.db import (
     HealthData,
     WeatherData,
     LocationTrack,
+    DailySummary,
 )
 from core.config import settings
+from core.llm_gateway import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, PRIORITY_NORMAL, llm_gateway, parse_routes
 from core.qdrant_client import QdrantClient
+from core.answer_cache import AnswerCache
+from core.change_feed import clear_dirty_date, get_dirty_dates
+from core.summary_prompt import build_summary_prompt
+from core.summary_rollups import SummaryRollupService
+from core.summary_store import save_summary
+from core.vector_outbox import VectorOutboxWorker, enqueue_summary
 
 logger = logging.getLogger(__name__)
 
 
+def _require_response(result: Dict[str, Any]):
+    if not result.get("response", "").strip():
+        raise ValueError("Model returned an empty response")
+
+
 class DailySummaryService:
     def __init__(self):
         # Use dedicated summary model settings
         self.summary_model = settings.SUMMARY_OLLAMA_MODEL
         self.summary_url = settings.SUMMARY_OLLAMA_URL
-        self.summary_client = httpx.Client(timeout=300.0)  # 5 minutes timeout for summaries
+        # Tried in order: on failure, after SUMMARY_ATTEMPT_TIMEOUT, or hedged after SUMMARY_HEDGE_DELAY
+        self.summary_routes = [(self.summary_url, self.summary_model), *parse_routes(settings.SUMMARY_FALLBACK_ROUTES)]
         self.qdrant_client = QdrantClient()
+        self.answer_cache = AnswerCache()
+        self.vector_outbox = VectorOutboxWorker(self.qdrant_client)
+        self.rollups = SummaryRollupService(self)
         # Set up timezone
         self.timezone = pytz.timezone(settings.TIMEZONE)
 
@@ -278,170 +295,392 @@ class DailySummaryService:
 
         return data
 
-    def generate_summary(self, daily_data: Dict[str, Any]) -> str:
-        """Generate a comprehensive daily summary using Ollama"""
-
-        # Create a structured prompt for the AI
-        prompt = f"""
-        Analyze the following daily data and create a comprehensive summary for {daily_data['date']}. 
-        Focus on patterns, insights, and notable events. Be concise but informative.
-
-        NOTE: All timestamps in the data below are in local timezone ({settings.TIMEZONE}).
-
-        CRITICAL INSTRUCTIONS:
-        - When data shows null/None values, this means NO DATA WAS COLLECTED for that day
-        - DO NOT treat missing data as health concerns or problems
-        - DO NOT mention missing data as something to be concerned about
-        - Instead, focus ONLY on the data that IS available
-        - If most data is missing, frame it as "a day with limited tracking" rather than problematic
-        - Only mention actual zero values (when data was collected but showed 0) as potential areas of interest
-
-        Examples:
-        - If sleep_data is null: DON'T mention sleep at all, or briefly note "No sleep data was recorded for this day"
-        - If steps is null: DON'T mention steps, or briefly note "Step tracking was not available"
-        - If total_calories is 0 AND food data exists: This might be worth noting
-        - If total_calories is 0 AND no food data exists: This just means no food was tracked
-
-        CALENDAR EVENTS ({len(daily_data['calendar_events'])} events):
-        {json.dumps(daily_data['calendar_events'], indent=2)}
-
-        CALENDAR LOCATIONS:
-        {json.dumps(daily_data['calendar_locations'], indent=2)}
-
-        FOOD INTAKE:
-        Total Calories: {daily_data['food_intake']['total_calories']}
-        Meals: {json.dumps(daily_data['food_intake']['meals_by_type'], indent=2)}
-
-        HEALTH METRICS:
-        {json.dumps(daily_data['health_metrics'], indent=2)}
-
-        EXERCISE DATA:
-        {json.dumps(daily_data['exercise_data'], indent=2)}
-
-        SLEEP DATA:
-        {json.dumps(daily_data['sleep_data'], indent=2)}
-
-        WEATHER DATA:
-        {json.dumps(daily_data['weather_data'], indent=2)}
-
-        LOCATION DATA:
-        {json.dumps(daily_data['location_data'], indent=2)}
-
-        Please provide a summary that includes:
-        1. Overall day assessment based on AVAILABLE data
-        2. Key activities and meetings (if any)
-        3. Weather conditions and how they might have influenced the day
-        4. Locations visited and any travel patterns
-        5. Health and wellness highlights (only actual recorded data)
-        6. Food intake patterns (only if food was tracked)
-        7. Sleep quality assessment (only if sleep data exists)
-        8. Notable patterns based on actual data
-
-        Keep the summary under 500 words, personal, and insightful.
-        Focus on what DID happen rather than what data is missing.
-        Frame days with limited data as "quiet tracking days" rather than problematic.
+    async def generate_routed(self, prompt: str, priority: int = PRIORITY_NORMAL) -> Tuple[str, Dict[str, Any]]:
+        """
+        Run a non-streaming generation over the summary routes (see LLMGateway.hedged_post).
+        Returns the text and the route that served it.
+        """
+        result, route = await llm_gateway.hedged_post(
+            self.summary_routes,
+            "/api/generate",
+            {"prompt": prompt, "stream": False},
+            priority=priority,
+            attempt_timeout=settings.SUMMARY_ATTEMPT_TIMEOUT,
+            hedge_delay=settings.SUMMARY_HEDGE_DELAY,
+            validate=_require_response,
+        )
+        if route["attempts"] > 1:
+            logger.info(f"Generation served by {route['model']} at {route['url']} after {route['attempts']} attempt(s)")
+        return result["response"], route
+
+    async def generate_text(self, prompt: str, priority: int = PRIORITY_NORMAL) -> str:
+        """Run a single non-streaming generation against the summary model through the LLM gateway"""
+        text, _ = await self.generate_routed(prompt, priority)
+        return text
+
+    async def generate_summary(
+        self, daily_data: Dict[str, Any], prompt: Optional[str] = None, priority: int = PRIORITY_NORMAL
+    ) -> Tuple[str, Dict[str, Any]]:
+        """
+        Generate a comprehensive daily summary using Ollama. Returns the summary and the route that served it.
+        Raises if every route failed, so an error message is never stored as the day's summary.
         """
 
+        # Build a compact, token-budgeted prompt unless the caller already did
+        if prompt is None:
+            prompt, _ = build_summary_prompt(daily_data)
+
         try:
-            response = self.summary_client.post(
-                f"{self.summary_url}/api/generate",
-                json={"model": self.summary_model, "prompt": prompt, "stream": False},
-            )
-            response.raise_for_status()
-            result = response.json()
-            return result.get("response", "Unable to generate summary")
+            return await self.generate_routed(prompt, priority)
 
         except Exception as e:
-            logger.error(f"Error generating summary: {e}")
-            return f"Error generating summary for {daily_data['date']}: {str(e)}"
+            logger.error(f"Error generating summary for {daily_data['date']}: {e}")
+            raise
 
-    async def create_daily_summary(self, db: Session, target_date: Optional[date] = None) -> Dict[str, Any]:
-        """Create and store a daily summary"""
+    def build_metadata(
+        self,
+        daily_data: Dict[str, Any],
+        target_date: date,
+        prompt_stats: Dict[str, Any],
+        route: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """Prepare the metadata stored alongside a summary, including the model route that generated it"""
+        metadata = {
+            "total_calories": daily_data["food_intake"]["total_calories"],
+            "event_count": len(daily_data["calendar_events"]),
+            "meal_count": daily_data["food_intake"]["meal_count"],
+            "steps": daily_data["health_metrics"].get("steps"),
+            "exercise_minutes": daily_data["exercise_data"].get("exercise_minutes"),
+            "sleep_hours": (
+                daily_data["sleep_data"]["total_sleep"]
+                if daily_data["sleep_data"] and daily_data["sleep_data"].get("total_sleep") is not None
+                else None
+            ),
+            "day_of_week": target_date.strftime("%A"),
+            "prompt_chars": prompt_stats["prompt_chars"],
+            "prompt_tokens": prompt_stats["prompt_tokens"],
+            "generated_by": route,
+        }
+
+        if metadata["sleep_hours"] == 0:
+            metadata["sleep_hours"] = None
+
+        return metadata
+
+    def store_summary(
+        self, db: Session, target_date: date, summary: str, metadata: Dict[str, Any], started_at: datetime
+    ):
+        """Persist a generated summary, queue it for the vector store and clear the day's dirty flag"""
+        # The relational table is the source of truth for by-date lookups; the outbox entry is committed
+        # with it and embedded in the background, so a slow or failing vector store can't lose the summary
+        enqueue_summary(db, "daily", target_date.isoformat(), summary, metadata)
+        save_summary(db, "daily", target_date.isoformat(), target_date, summary, metadata)
+        self.vector_outbox.notify()
+
+        # The summary now reflects everything ingested before we started collecting data
+        clear_dirty_date(db, target_date, marked_before=started_at)
+
+    async def stream_generate(self, prompt: str) -> AsyncIterator[str]:
+        """Stream response tokens from Ollama as they are generated"""
+        # Ollama streams one JSON object per line
+        async for chunk in llm_gateway.stream(
+            self.summary_url,
+            "/api/generate",
+            {"model": self.summary_model, "prompt": prompt, "stream": True},
+            priority=PRIORITY_INTERACTIVE,
+        ):
+            if chunk.get("error"):
+                raise RuntimeError(chunk["error"])
+            if chunk.get("response"):
+                yield chunk["response"]
+
+    async def create_daily_summary(
+        self,
+        db: Session,
+        target_date: Optional[date] = None,
+        update_rollups: bool = True,
+        priority: int = PRIORITY_NORMAL,
+    ) -> Dict[str, Any]:
+        """
+        Create and store a daily summary.
+        With update_rollups, the weekly and monthly rollups containing the day are marked dirty and rebuilt
+        in the background; callers processing many days should pass False and rebuild the rollups once at the end.
+        Backfills should pass PRIORITY_BACKGROUND so interactive LLM requests are served first.
+        """
         if target_date is None:
             target_date = date.today() - timedelta(days=1)  # Default to yesterday
 
+        started_at = datetime.utcnow()
+
         try:
             # Collect daily data
             daily_data = self.get_daily_data(db, target_date)
 
             # Generate summary
-            summary = self.generate_summary(daily_data)
-
-            # Prepare metadata for vector storage
-            metadata = {
-                "total_calories": daily_data["food_intake"]["total_calories"],
-                "event_count": len(daily_data["calendar_events"]),
-                "meal_count": daily_data["food_intake"]["meal_count"],
-                "steps": daily_data["health_metrics"].get("steps"),
-                "exercise_minutes": daily_data["exercise_data"].get("exercise_minutes"),
-                "sleep_hours": (
-                    daily_data["sleep_data"]["total_sleep"]
-                    if daily_data["sleep_data"] and daily_data["sleep_data"].get("total_sleep") is not None
-                    else None
-                ),
-                "day_of_week": target_date.strftime("%A"),
+            prompt, prompt_stats = build_summary_prompt(daily_data)
+            summary, route = await self.generate_summary(daily_data, prompt, priority)
+
+            metadata = self.build_metadata(daily_data, target_date, prompt_stats, route)
+            self.store_summary(db, target_date, summary, metadata, started_at)
+
+            result = {
+                "date": target_date.isoformat(),
+                "summary": summary,
+                "metadata": metadata,
+                "prompt_stats": prompt_stats,
+                "raw_data": daily_data,
             }
 
-            if metadata["sleep_hours"] == 0:
-                metadata["sleep_hours"] = None
-
-            # Store in vector database
-            self.qdrant_client.store_daily_summary(date=target_date.isoformat(), summary=summary, metadata=metadata)
+            if update_rollups:
+                result["rollups"] = self.rollups.mark_dirty(db, [target_date])
 
-            return {"date": target_date.isoformat(), "summary": summary, "metadata": metadata, "raw_data": daily_data}
+            return result
 
         except Exception as e:
             logger.error(f"Error creating daily summary: {e}")
             raise
 
-    async def query_summaries(self, query: str, limit: int = 5) -> Dict[str, Any]:
-        """Query daily summaries using natural language"""
-        try:
-            # Search vector database
-            search_results = self.qdrant_client.search_summaries(query, limit)
+    async def stream_daily_summary(
+        self, db: Session, target_date: Optional[date] = None
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Create and store a daily summary, yielding (event, data) pairs as it is generated:
+        a "start" event, one "token" event per generated chunk, a "done" event carrying
+        the stored summary and metadata, and finally a "rollups" event listing the weekly and
+        monthly rollups queued for a background rebuild.
+        """
+        if target_date is None:
+            target_date = date.today() - timedelta(days=1)  # Default to yesterday
+
+        started_at = datetime.utcnow()
 
-            # Format results for response
-            results = []
-            for result in search_results:
-                payload = result.get("payload", {})
+        daily_data = self.get_daily_data(db, target_date)
+        prompt, prompt_stats = build_summary_prompt(daily_data)
+        yield "start", {"date": target_date.isoformat(), "prompt_stats": prompt_stats}
+
+        chunks = []
+        async for token in self.stream_generate(prompt):
+            chunks.append(token)
+            yield "token", {"text": token}
+
+        summary = "".join(chunks)
+        # Streams are served by the primary route only; hedging would interleave two token streams
+        route = {"url": self.summary_url, "model": self.summary_model, "route": 0, "attempts": 1, "hedged": False}
+        metadata = self.build_metadata(daily_data, target_date, prompt_stats, route)
+        self.store_summary(db, target_date, summary, metadata, started_at)
+
+        yield "done", {
+            "date": target_date.isoformat(),
+            "summary": summary,
+            "metadata": metadata,
+            "prompt_stats": prompt_stats,
+        }
+
+        yield "rollups", {"rollups": self.rollups.mark_dirty(db, [target_date])}
+
+    async def refresh_dirty_days(
+        self, db: Session, include_today: bool = False, limit: Optional[int] = None
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Regenerate summaries only for days that received new data since their last summary,
+        then rebuild each affected weekly and monthly rollup once.
+        """
+        before = None if include_today else datetime.now(self.timezone).date()
+        dirty_days = get_dirty_dates(db, before=before, limit=limit)
+
+        results = []
+        for dirty_day in dirty_days:
+            day = dirty_day.date
+            change_count = dirty_day.change_count
+            try:
+                result = await self.create_daily_summary(db, day, update_rollups=False, priority=PRIORITY_BACKGROUND)
                 results.append(
                     {
-                        "date": payload.get("date"),
-                        "summary": payload.get("summary"),
-                        "score": result.get("score"),
-                        "metadata": {k: v for k, v in payload.items() if k not in ["date", "summary", "created_at"]},
+                        "date": result["date"],
+                        "status": "success",
+                        "changes_coalesced": change_count,
+                        "summary_length": len(result["summary"]),
                     }
                 )
-
-            # Generate an AI response based on the search results
-            context = "\n\n".join(
-                [f"Date: {r['date']}\nSummary: {r['summary']}" for r in results[:3]]  # Use top 3 results for context
+            except Exception as e:
+                logger.error(f"Error refreshing summary for {day}: {e}")
+                db.rollback()
+                results.append({"date": day.isoformat(), "status": "error", "error": str(e)})
+
+        refreshed = [date.fromisoformat(r["date"]) for r in results if r["status"] == "success"]
+        return {"results": results, "rollups": await self.rollups.rebuild_for_dates(db, refreshed)}
+
+    def sync_from_vector_store(self, db: Session) -> Dict[str, int]:
+        """Copy summaries that only exist in the vector database into the relational table"""
+        counts = {}
+        for point in self.qdrant_client.scroll_summaries():
+            payload = dict(point.get("payload") or {})
+            summary = payload.pop("summary", None)
+            if not summary or not payload.get("date"):
+                continue
+
+            granularity = payload.pop("granularity", "daily")
+            payload.pop("created_at", None)
+            period = payload.get("period", payload["date"])
+            period_date = date.fromisoformat(payload["date"])
+            if granularity == "daily":
+                # Daily metadata does not carry its own date; rollup metadata does
+                payload.pop("date")
+
+            save_summary(db, granularity, period, period_date, summary, payload)
+            counts[granularity] = counts.get(granularity, 0) + 1
+
+        return counts
+
+    def reindex_vector_store(self, db: Session, granularity: Optional[str] = None) -> Dict[str, int]:
+        """Re-embed every summary in the relational table and rewrite its vector point in batches"""
+        query = db.query(DailySummary)
+        if granularity:
+            query = query.filter(DailySummary.granularity == granularity)
+        rows = query.order_by(DailySummary.granularity, DailySummary.date).all()
+
+        items = [
+            {
+                "key": row.period,
+                "summary": row.summary,
+                "metadata": json.loads(row.summary_metadata) if row.summary_metadata else {},
+                "granularity": row.granularity,
+            }
+            for row in rows
+        ]
+        self.qdrant_client.store_summaries(items)
+
+        counts = {}
+        for item in items:
+            counts[item["granularity"]] = counts.get(item["granularity"], 0) + 1
+        return counts
+
+    def format_search_results(self, search_results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Format vector search hits for API responses"""
+        results = []
+        for result in search_results:
+            payload = result.get("payload", {})
+            results.append(
+                {
+                    "date": payload.get("date"),
+                    "summary": payload.get("summary"),
+                    "score": result.get("score"),
+                    "metadata": {
+                        k: v for k, v in payload.items() if k not in ["date", "summary", "created_at", "updated_at"]
+                    },
+                }
             )
+        return results
+
+    def _describe_period(self, result: Dict[str, Any]) -> str:
+        granularity = result["metadata"].get("granularity", "daily")
+        if granularity == "daily":
+            return f"Date: {result['date']}"
+        return f"{granularity.capitalize()} summary {result['metadata'].get('period')} (from {result['date']})"
+
+    def build_query_prompt(self, query: str, results: List[Dict[str, Any]]) -> str:
+        """Build the prompt used to answer a natural language question from summaries"""
+        context = "\n\n".join(
+            [f"{self._describe_period(r)}\nSummary: {r['summary']}" for r in results[:3]]  # Use top 3 for context
+        )
 
-            ai_prompt = f"""
-            Based on the following daily summaries, answer this question: "{query}"
+        return f"""
+            Based on the following summaries, answer this question: "{query}"
             
-            Relevant daily summaries:
+            Relevant summaries:
             {context}
             
             Provide a comprehensive answer based on the patterns and information in these summaries.
             If you can identify trends or patterns, mention them. Be specific and cite dates when relevant.
             """
 
-            ai_response = self.summary_client.post(
-                f"{self.summary_url}/api/generate",
-                json={"model": self.summary_model, "prompt": ai_prompt, "stream": False},
+    async def query_summaries(
+        self,
+        query: str,
+        limit: int = 5,
+        granularity: Optional[str] = "daily",
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Query summaries of the given granularity (daily, weekly, monthly or None for all) using natural language,
+        optionally restricted by structured filters (see QdrantClient.search_summaries).
+        Answers are served from the answer cache until they expire or new summaries are stored.
+        """
+        cache_key = self.answer_cache.key(query, limit, granularity, filters)
+        cached = self.answer_cache.get(cache_key, self.qdrant_client.collection_version)
+        if cached is not None:
+            return {**cached, "query": query, "cached": True}
+
+        try:
+            version = self.qdrant_client.collection_version
+            # Search vector database (the query embedding is a blocking gateway call, so run it off the event loop)
+            search_results = await asyncio.to_thread(
+                self.qdrant_client.search_summaries, query, limit, granularity, filters
             )
-            ai_response.raise_for_status()
-            ai_result = ai_response.json()
+            results = self.format_search_results(search_results)
+
+            # Generate an AI response based on the search results
+            ai_prompt = self.build_query_prompt(query, results)
 
-            return {
+            ai_response = await self.generate_text(ai_prompt, PRIORITY_INTERACTIVE)
+
+            result = {
                 "query": query,
-                "ai_response": ai_result.get("response", "Unable to generate response"),
+                "ai_response": ai_response or "Unable to generate response",
                 "relevant_summaries": results,
                 "total_found": len(search_results),
             }
+            self.answer_cache.put(cache_key, version, result)
+            return {**result, "cached": False}
 
         except Exception as e:
             logger.error(f"Error querying summaries: {e}")
             raise
+
+    async def stream_query_summaries(
+        self,
+        query: str,
+        limit: int = 5,
+        granularity: Optional[str] = "daily",
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Answer a natural language question, yielding (event, data) pairs: a "results" event with the
+        matching summaries, one "token" event per generated chunk, then a "done" event with the full answer.
+        A cached answer is sent as a single token.
+        """
+        cache_key = self.answer_cache.key(query, limit, granularity, filters)
+        version = self.qdrant_client.collection_version
+        cached = self.answer_cache.get(cache_key, version)
+
+        if cached is not None:
+            results, total_found = cached["relevant_summaries"], cached["total_found"]
+        else:
+            search_results = await asyncio.to_thread(
+                self.qdrant_client.search_summaries, query, limit, granularity, filters
+            )
+            results, total_found = self.format_search_results(search_results), len(search_results)
+        yield "results", {"query": query, "relevant_summaries": results, "total_found": total_found}
+
+        if cached is not None:
+            answer = cached["ai_response"]
+            yield "token", {"text": answer}
+        else:
+            chunks = []
+            async for token in self.stream_generate(self.build_query_prompt(query, results)):
+                chunks.append(token)
+                yield "token", {"text": token}
+            answer = "".join(chunks)
+            self.answer_cache.put(
+                cache_key,
+                version,
+                {"query": query, "ai_response": answer, "relevant_summaries": results, "total_found": total_found},
+            )
+
+        yield "done", {
+            "query": query,
+            "answer": answer,
+            "relevant_summaries": results,
+            "total_found": total_found,
+            "cached": cached is not None,
+        }
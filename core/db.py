@@ -1,5 +1,17 @@
 # core/db.py (updated with upsert)
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, ForeignKey, UniqueConstraint, Boolean
+from sqlalchemy import (
+    create_engine,
+    Column,
+    Integer,
+    String,
+    Float,
+    Date,
+    DateTime,
+    ForeignKey,
+    UniqueConstraint,
+    Boolean,
+    Index,
+)
 from sqlalchemy.ext.declarative import declarative_base, declared_attr
 from sqlalchemy.orm import sessionmaker, relationship
 from sqlalchemy.dialects import postgresql, sqlite
@@ -425,14 +437,28 @@ class FoodImage(Base):
     s3_bucket = Column(String, nullable=False)
     s3_region = Column(String, nullable=False)
     s3_key = Column(String, nullable=False)
+    content_type = Column(String, nullable=True)  # Of the original upload
+    web_s3_key = Column(String, nullable=True)  # Downscaled JPEG rendition
+    thumbnail_s3_key = Column(String, nullable=True)
+    phash = Column(String, nullable=True)  # 64-bit dHash as hex, for reusing analyses of near-duplicates
     raw_analysis = Column(String)  # Store the full AI analysis for reference
     created_at = Column(DateTime, default=datetime.utcnow)
 
 
+class FoodImageHashBand(Base):
+    __tablename__ = "food_image_hash_bands"
+    id = Column(Integer, primary_key=True)
+    image_id = Column(Integer, ForeignKey("food_images.id"), nullable=False)
+    band = Column(Integer, nullable=False)  # Byte position within FoodImage.phash (0-7)
+    value = Column(Integer, nullable=False)  # Value of that byte; near-duplicates share at least one band
+
+    __table_args__ = (Index("ix_food_image_hash_bands_band_value", "band", "value"),)
+
+
 class FoodLog(Base):
     __tablename__ = "food_logs"
     id = Column(Integer, primary_key=True)
-    image_id = Column(Integer, ForeignKey("food_images.id"))
+    image_id = Column(Integer, ForeignKey("food_images.id"), index=True)
     food_name = Column(String, nullable=False)
     portion_size = Column(String)  # e.g., "1 cup", "200g"
     calories = Column(Float)
@@ -442,3 +468,82 @@ class FoodLog(Base):
 
     # Relationship to parent image
     image = relationship("FoodImage", backref="food_items")
+
+
+class FoodAnalysisJob(Base):
+    __tablename__ = "food_analysis_jobs"
+    id = Column(String, primary_key=True)  # uuid4 hex returned to the client for polling
+    status = Column(String, nullable=False, default="queued", index=True)  # queued, processing, completed, failed
+    filename = Column(String, nullable=False)
+    image_path = Column(String, nullable=True)  # Spooled upload; removed once the image is safely in S3
+    meal_type = Column(String, nullable=True)
+    uploaded_at = Column(DateTime, nullable=False)  # Becomes the FoodImage timestamp
+    s3_location = Column(String, nullable=True)  # JSON bucket/region/key once uploaded, reused on retries
+    image_id = Column(Integer, ForeignKey("food_images.id"), nullable=True)  # Set when the analysis is committed
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(String, nullable=True)
+    webhook_url = Column(String, nullable=True)
+    webhook_status = Column(String, nullable=True)  # delivered or failed
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    completed_at = Column(DateTime, nullable=True)
+
+
+class DirtyDay(Base):
+    __tablename__ = "dirty_days"
+    id = Column(Integer, primary_key=True)
+    date = Column(Date, unique=True, index=True, nullable=False)  # Local date whose summary is stale
+    change_count = Column(Integer, default=1)  # Number of changes coalesced into this entry
+    last_source = Column(String, nullable=True)  # Ingestion path that last marked the day (health, food, ...)
+    first_marked_at = Column(DateTime, default=datetime.utcnow)
+    last_marked_at = Column(DateTime, default=datetime.utcnow)
+
+
+class DirtyRollup(Base):
+    __tablename__ = "dirty_rollups"
+    id = Column(Integer, primary_key=True)
+    granularity = Column(String, nullable=False)  # weekly or monthly
+    period = Column(String, nullable=False)  # 2025-W10 (weekly) or 2025-03 (monthly)
+    period_start = Column(Date, nullable=False)
+    change_count = Column(Integer, default=1)  # Number of changed days coalesced into this entry
+    first_marked_at = Column(DateTime, default=datetime.utcnow)
+    last_marked_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (UniqueConstraint("granularity", "period", name="uq_dirty_rollup_granularity_period"),)
+
+
+class DailySummary(Base):
+    __tablename__ = "daily_summaries"
+    id = Column(Integer, primary_key=True)
+    granularity = Column(String, nullable=False, default="daily")  # daily, weekly or monthly
+    period = Column(String, nullable=False)  # 2025-03-01 (daily), 2025-W10 (weekly) or 2025-03 (monthly)
+    date = Column(Date, nullable=False)  # The day itself, or the first day of a weekly/monthly period
+    summary = Column(String, nullable=False)
+    summary_metadata = Column(String, nullable=True)  # JSON metadata also stored as the vector payload
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("granularity", "period", name="uq_summary_granularity_period"),
+        Index("ix_daily_summaries_granularity_date", "granularity", "date"),
+    )
+
+
+class VectorOutbox(Base):
+    __tablename__ = "vector_outbox"
+    id = Column(Integer, primary_key=True)
+    granularity = Column(String, nullable=False)  # daily, weekly or monthly
+    period = Column(String, nullable=False)  # Same key as daily_summaries.period
+    summary = Column(String, nullable=False)
+    summary_metadata = Column(String, nullable=True)  # JSON payload fields
+    revision = Column(Integer, nullable=False, default=1)  # Bumped when the entry is re-queued with new text
+    attempts = Column(Integer, nullable=False, default=0)  # Failed write attempts for the current revision
+    last_error = Column(String, nullable=True)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow)  # When the oldest unwritten change was queued
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("granularity", "period", name="uq_vector_outbox_granularity_period"),
+        Index("ix_vector_outbox_next_attempt_at", "next_attempt_at"),
+    )
@@ -0,0 +1,118 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text so trivially different strings (whitespace, unicode forms) share a cache entry"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache keyed by (model, normalized text hash).
+
+    An in-memory LRU sits in front of a persistent SQLite store holding float32 vectors. Entries for
+    any other embedding model are purged when the cache is opened (unless `purge_other_models` is False),
+    so changing VECTOR_EMBEDDING_OLLAMA_MODEL invalidates everything computed with the old one.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        path: Optional[str] = None,
+        memory_size: Optional[int] = None,
+        purge_other_models: bool = True,
+    ):
+        self.model = model
+        self.path = path or os.path.join(settings.VECTOR_DATA_DIR, "embeddings.sqlite3")
+        self.memory_size = memory_size if memory_size is not None else settings.EMBEDDING_CACHE_MEMORY_SIZE
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0}
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, model TEXT NOT NULL, dim INTEGER NOT NULL, vector BLOB NOT NULL, created_at REAL)"
+        )
+        purged = 0
+        if purge_other_models:
+            purged = self._db.execute("DELETE FROM embeddings WHERE model != ?", (model,)).rowcount
+            self._db.commit()
+        if purged:
+            logger.info(f"Purged {purged} cached embeddings from other models (now using {model})")
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model}\0{normalize_text(text)}".encode()).hexdigest()
+
+    def _remember(self, key: str, embedding: List[float]):
+        self._memory[key] = embedding
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get(self, text: str) -> Optional[List[float]]:
+        key = self.key(text)
+        with self._lock:
+            embedding = self._memory.get(key)
+            if embedding is not None:
+                self._memory.move_to_end(key)
+                self._counters["memory_hits"] += 1
+                return embedding
+
+            row = self._db.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._counters["misses"] += 1
+                return None
+
+            vector = array("f")
+            vector.frombytes(row[0])
+            embedding = vector.tolist()
+            self._remember(key, embedding)
+            self._counters["disk_hits"] += 1
+            return embedding
+
+    def put(self, text: str, embedding: List[float]):
+        key = self.key(text)
+        vector = array("f", embedding)
+        with self._lock:
+            # Both tiers hold the same float32 values, whichever one serves the hit
+            self._remember(key, vector.tolist())
+            self._db.execute(
+                "INSERT OR REPLACE INTO embeddings (key, model, dim, vector, created_at) VALUES (?, ?, ?, ?, ?)",
+                (key, self.model, len(vector), vector.tobytes(), time.time()),
+            )
+            self._db.commit()
+            self._counters["writes"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+            disk_entries = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            memory_entries = len(self._memory)
+
+        lookups = counters["memory_hits"] + counters["disk_hits"] + counters["misses"]
+        hits = counters["memory_hits"] + counters["disk_hits"]
+        return {
+            "model": self.model,
+            **counters,
+            "hit_ratio": round(hits / lookups, 3) if lookups else None,
+            "memory_entries": memory_entries,
+            "memory_capacity": self.memory_size,
+            "disk_entries": disk_entries,
+        }
+
+    def close(self):
+        self._db.close()
@@ -0,0 +1,45 @@
+import logging
+from typing import Any, Dict, Iterable, Optional
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ImageStore:
+    """
+    Storage for food images. `upload_renditions` stores the original, web and thumbnail renditions built
+    by preprocess_image and returns their location; the keys it returns are what FoodImage records.
+    """
+
+    backend = "base"
+
+    async def upload_renditions(self, renditions: Dict[str, Any], original_filename: str) -> Dict[str, Any]:
+        """Returns dict with bucket, region, key, content_type, web_key and thumbnail_key"""
+        raise NotImplementedError
+
+    def get_image_url(self, key: str) -> str:
+        raise NotImplementedError
+
+    async def get_image_urls(self, keys: Iterable[str]) -> Dict[str, str]:
+        return {key: self.get_image_url(key) for key in dict.fromkeys(keys)}
+
+    def local_path(self, key: str) -> Optional[str]:
+        """Path of a stored object served by /food/images/{key}, or None if this backend doesn't serve files"""
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.backend}
+
+
+def create_image_store() -> ImageStore:
+    """Instantiate the backend selected by IMAGE_STORE_BACKEND"""
+    backend = settings.IMAGE_STORE_BACKEND
+    if backend == "s3":
+        from core.s3 import S3Handler
+
+        return S3Handler()
+    if backend == "local":
+        from core.local_image_store import LocalImageStore
+
+        return LocalImageStore()
+    raise ValueError(f"Unknown IMAGE_STORE_BACKEND: {backend}")
@@ -0,0 +1,479 @@
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+import httpx
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Lower values are served first when requests queue up for the same endpoint
+PRIORITY_INTERACTIVE = 0  # A user is waiting: photo analysis, query answers, streamed responses
+PRIORITY_NORMAL = 1  # Single summary generation
+PRIORITY_BACKGROUND = 2  # Backfills, rollups, outbox and re-index embeddings, warm-up
+
+# Upper bound for loading one model during warm-up, so an unresponsive host can't hold a slot indefinitely
+WARM_UP_TIMEOUT = 300.0
+
+
+def parse_endpoint_concurrency(value: str) -> Dict[str, int]:
+    """Parse LLM_ENDPOINT_CONCURRENCY, e.g. "http://gpu:11434=2,http://cpu:11434=1" """
+    limits = {}
+    for entry in filter(None, (part.strip() for part in value.split(","))):
+        url, _, limit = entry.rpartition("=")
+        if not url or not limit.isdigit() or int(limit) < 1:
+            raise ValueError(f"Invalid LLM_ENDPOINT_CONCURRENCY entry: {entry}")
+        limits[url.rstrip("/")] = int(limit)
+    return limits
+
+
+def parse_routes(value: str) -> List[Tuple[str, str]]:
+    """Parse a route list such as "qwen3:7b@http://gpu2:11434,qwen3:1.7b@http://gpu1:11434" into (url, model)"""
+    routes = []
+    for entry in filter(None, (part.strip() for part in value.split(","))):
+        model, _, url = entry.partition("@")
+        if not model or not url:
+            raise ValueError(f"Invalid route (expected model@url): {entry}")
+        routes.append((url.rstrip("/"), model))
+    return routes
+
+
+class _Ticket:
+    __slots__ = ("model", "priority", "enqueued_at", "granted", "future", "loop")
+
+    def __init__(self, model: str, priority: int, future=None, loop=None):
+        self.model = model
+        self.priority = priority
+        self.enqueued_at = time.monotonic()
+        self.granted = False
+        self.future = future
+        self.loop = loop
+
+
+class _Endpoint:
+    def __init__(self, url: str, limit: int):
+        self.url = url
+        self.limit = limit
+        self.active = 0
+        # One priority queue per model; a free slot goes to the best (priority, arrival) head across models
+        self.queues: Dict[str, List[Tuple[int, int, _Ticket]]] = {}
+
+
+class LLMGateway:
+    """
+    Single entry point for every Ollama call (vision, summaries, embeddings).
+
+    Each endpoint (base URL) serves at most LLM_MAX_CONCURRENCY requests at once (overridable per endpoint
+    with LLM_ENDPOINT_CONCURRENCY); further requests wait in per-model priority queues, so interactive
+    requests overtake queued backfills instead of everything timing out together. Requests carry
+    keep_alive so models stay loaded between calls, and queue depth, wait time and tokens/s are tracked
+    per model.
+    """
+
+    def __init__(self):
+        self.default_limit = max(settings.LLM_MAX_CONCURRENCY, 1)
+        self.endpoint_limits = parse_endpoint_concurrency(settings.LLM_ENDPOINT_CONCURRENCY)
+        self.keep_alive = settings.LLM_KEEP_ALIVE
+        self.queue_timeout = settings.LLM_QUEUE_TIMEOUT
+        self.client = httpx.Client(timeout=300.0)
+        self._cond = threading.Condition()
+        self._endpoints: Dict[str, _Endpoint] = {}
+        self._sequence = itertools.count()
+        self._metrics: Dict[str, Dict[str, Any]] = {}
+        self._route_metrics: Dict[str, Dict[str, int]] = {}
+
+    def _endpoint(self, url: str) -> _Endpoint:
+        url = url.rstrip("/")
+        if url not in self._endpoints:
+            self._endpoints[url] = _Endpoint(url, self.endpoint_limits.get(url, self.default_limit))
+        return self._endpoints[url]
+
+    def _model_metrics(self, model: str) -> Dict[str, Any]:
+        if model not in self._metrics:
+            self._metrics[model] = {
+                "requests": 0,
+                "errors": 0,
+                "granted": 0,
+                "queued": 0,
+                "max_queued": 0,
+                "wait_ms_total": 0.0,
+                "max_wait_ms": 0.0,
+                "tokens": 0,
+                "token_seconds": 0.0,
+            }
+        return self._metrics[model]
+
+    # --- Slots ---
+
+    def _enqueue(self, endpoint: _Endpoint, ticket: _Ticket):
+        heapq.heappush(endpoint.queues.setdefault(ticket.model, []), (ticket.priority, next(self._sequence), ticket))
+        metrics = self._model_metrics(ticket.model)
+        metrics["queued"] += 1
+        metrics["max_queued"] = max(metrics["max_queued"], metrics["queued"])
+        self._dispatch(endpoint)
+
+    def _dispatch(self, endpoint: _Endpoint):
+        while endpoint.active < endpoint.limit:
+            heads = [queue[0] for queue in endpoint.queues.values() if queue]
+            if not heads:
+                break
+            _, _, ticket = min(heads, key=lambda head: head[:2])
+            heapq.heappop(endpoint.queues[ticket.model])
+            self._grant(endpoint, ticket)
+        self._cond.notify_all()
+
+    def _grant(self, endpoint: _Endpoint, ticket: _Ticket):
+        ticket.granted = True
+        endpoint.active += 1
+        metrics = self._model_metrics(ticket.model)
+        metrics["queued"] -= 1
+        metrics["granted"] += 1
+        wait_ms = (time.monotonic() - ticket.enqueued_at) * 1000
+        metrics["wait_ms_total"] += wait_ms
+        metrics["max_wait_ms"] = max(metrics["max_wait_ms"], wait_ms)
+        if ticket.future is not None:
+            ticket.loop.call_soon_threadsafe(_resolve, ticket.future)
+
+    def _withdraw(self, endpoint: _Endpoint, ticket: _Ticket):
+        """Drop a ticket that gave up waiting; returns its slot if it was granted in the meantime"""
+        if ticket.granted:
+            self._release(endpoint)
+            return
+        queue = endpoint.queues.get(ticket.model, [])
+        queue[:] = [entry for entry in queue if entry[2] is not ticket]
+        heapq.heapify(queue)
+        self._model_metrics(ticket.model)["queued"] -= 1
+
+    def _release(self, endpoint: _Endpoint):
+        endpoint.active -= 1
+        self._dispatch(endpoint)
+
+    @contextmanager
+    def slot(self, url: str, model: str, priority: int = PRIORITY_NORMAL):
+        """Hold one of the endpoint's concurrency slots (blocking; use aslot on the event loop)"""
+        if _on_event_loop():
+            # Waiting here would also stall the async requests holding the slots
+            logger.warning(f"Blocking LLM call for {model} on the event loop thread; run it in a thread pool")
+        ticket = _Ticket(model, priority)
+        deadline = time.monotonic() + self.queue_timeout
+        with self._cond:
+            endpoint = self._endpoint(url)
+            self._enqueue(endpoint, ticket)
+            while not ticket.granted:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._withdraw(endpoint, ticket)
+                    raise TimeoutError(f"Waited more than {self.queue_timeout}s for {model} at {url}")
+                self._cond.wait(remaining)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._release(endpoint)
+
+    @asynccontextmanager
+    async def aslot(self, url: str, model: str, priority: int = PRIORITY_NORMAL):
+        """Hold one of the endpoint's concurrency slots without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        ticket = _Ticket(model, priority, loop.create_future(), loop)
+        with self._cond:
+            endpoint = self._endpoint(url)
+            self._enqueue(endpoint, ticket)
+        try:
+            await asyncio.wait_for(asyncio.shield(ticket.future), self.queue_timeout)
+        except asyncio.TimeoutError:
+            with self._cond:
+                self._withdraw(endpoint, ticket)
+            raise TimeoutError(f"Waited more than {self.queue_timeout}s for {model} at {url}")
+        except asyncio.CancelledError:
+            with self._cond:
+                self._withdraw(endpoint, ticket)
+            raise
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._release(endpoint)
+
+    # --- Requests ---
+
+    def _payload(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return {"keep_alive": self.keep_alive, **payload} if self.keep_alive else payload
+
+    def _record(self, model: str, result: Optional[Dict[str, Any]], error: bool = False):
+        with self._cond:
+            metrics = self._model_metrics(model)
+            metrics["requests"] += 1
+            if error or result is None:
+                metrics["errors"] += int(error)
+                return
+            # Generation reports output tokens; embedding endpoints only report the prompt tokens they read
+            if result.get("eval_count") and result.get("eval_duration"):
+                metrics["tokens"] += result["eval_count"]
+                metrics["token_seconds"] += result["eval_duration"] / 1e9
+            elif result.get("prompt_eval_count") and result.get("total_duration"):
+                metrics["tokens"] += result["prompt_eval_count"]
+                metrics["token_seconds"] += result["total_duration"] / 1e9
+
+    def post(
+        self,
+        url: str,
+        path: str,
+        payload: Dict[str, Any],
+        priority: int = PRIORITY_NORMAL,
+        timeout: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """POST a non-streaming request to an Ollama endpoint and return the decoded response"""
+        model = payload["model"]
+        with self.slot(url, model, priority):
+            try:
+                # httpx treats timeout=None as "no timeout", so only override the client default when given
+                response = self.client.post(
+                    f"{url}{path}",
+                    json=self._payload(payload),
+                    timeout=httpx.USE_CLIENT_DEFAULT if timeout is None else timeout,
+                )
+                response.raise_for_status()
+                result = response.json()
+            except Exception:
+                self._record(model, None, error=True)
+                raise
+        self._record(model, result)
+        return result
+
+    async def apost(
+        self,
+        url: str,
+        path: str,
+        payload: Dict[str, Any],
+        priority: int = PRIORITY_NORMAL,
+        timeout: Optional[float] = None,
+        total_timeout: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """
+        Async variant of post; cancelling the caller aborts the HTTP request and frees the slot.
+        `total_timeout` bounds the whole request once a slot is granted; the queue wait has its own limit.
+        """
+        model = payload["model"]
+        async with self.aslot(url, model, priority):
+            try:
+                async with httpx.AsyncClient(timeout=httpx.Timeout(timeout or 300.0, connect=10.0)) as client:
+                    response = await asyncio.wait_for(
+                        client.post(f"{url}{path}", json=self._payload(payload)), total_timeout
+                    )
+                    response.raise_for_status()
+                    result = response.json()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self._record(model, None, error=True)
+                raise
+        self._record(model, result)
+        return result
+
+    async def stream(
+        self,
+        url: str,
+        path: str,
+        payload: Dict[str, Any],
+        priority: int = PRIORITY_INTERACTIVE,
+        timeout: Optional[float] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream newline-delimited JSON chunks from an Ollama endpoint, holding a slot until the stream ends"""
+        model = payload["model"]
+        async with self.aslot(url, model, priority):
+            final = None
+            try:
+                async with httpx.AsyncClient(timeout=httpx.Timeout(timeout or 300.0, connect=10.0)) as client:
+                    async with client.stream("POST", f"{url}{path}", json=self._payload(payload)) as response:
+                        response.raise_for_status()
+                        async for line in response.aiter_lines():
+                            if not line:
+                                continue
+                            chunk = json.loads(line)
+                            if chunk.get("done"):
+                                final = chunk
+                            yield chunk
+                            if final is not None:
+                                break
+            except (asyncio.CancelledError, GeneratorExit):
+                raise
+            except Exception:
+                self._record(model, None, error=True)
+                raise
+        self._record(model, final)
+
+    async def hedged_post(
+        self,
+        routes: List[Tuple[str, str]],
+        path: str,
+        payload: Dict[str, Any],
+        priority: int = PRIORITY_NORMAL,
+        attempt_timeout: float = 300.0,
+        hedge_delay: float = 0.0,
+        validate: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        Send a request to the first (url, model) route, issuing it to the next route when an attempt fails,
+        exceeds `attempt_timeout` after getting a slot or, with `hedge_delay` > 0, has not answered within
+        `hedge_delay` seconds. The first valid answer wins and the attempts still running are cancelled, which
+        aborts their HTTP requests. `validate` may raise to reject an answer (e.g. an empty response).
+
+        Returns the response and the route that served it; raises RuntimeError if every route failed.
+        """
+        started = time.monotonic()
+        pending: Dict[asyncio.Task, int] = {}
+        errors = []
+        launched = 0
+        hedged = False
+
+        async def attempt(url: str, model: str) -> Dict[str, Any]:
+            # The deadline starts once the slot is granted, so a long queue under load doesn't fail the attempt
+            result = await self.apost(
+                url, path, {**payload, "model": model}, priority, attempt_timeout, total_timeout=attempt_timeout
+            )
+            if validate:
+                validate(result)
+            return result
+
+        def launch():
+            nonlocal launched
+            url, model = routes[launched]
+            pending[asyncio.create_task(attempt(url, model))] = launched
+            self._route_metric(url, model, "attempts")
+            launched += 1
+
+        launch()
+        try:
+            while pending:
+                can_hedge = hedge_delay > 0 and launched < len(routes)
+                done, _ = await asyncio.wait(
+                    pending, timeout=hedge_delay if can_hedge else None, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    url, model = routes[launched]
+                    logger.info(f"No answer after {hedge_delay}s, hedging with {model} at {url}")
+                    self._route_metric(url, model, "hedges")
+                    hedged = True
+                    launch()
+                    continue
+
+                for task in done:
+                    index = pending.pop(task)
+                    url, model = routes[index]
+                    error = task.exception()
+                    if error is None:
+                        self._route_metric(url, model, "wins")
+                        return task.result(), {
+                            "url": url,
+                            "model": model,
+                            "route": index,
+                            "attempts": launched,
+                            "hedged": hedged,
+                            "latency_ms": round((time.monotonic() - started) * 1000, 1),
+                        }
+                    reason = "timed out" if isinstance(error, asyncio.TimeoutError) else str(error)
+                    logger.warning(f"Route {model} at {url} failed: {reason}")
+                    self._route_metric(url, model, "failures")
+                    errors.append(f"{model}@{url}: {reason}")
+                    # A failed attempt is replaced right away rather than after the hedge delay
+                    if launched < len(routes):
+                        launch()
+        finally:
+            for task in pending:
+                task.cancel()
+                url, model = routes[pending[task]]
+                self._route_metric(url, model, "cancelled")
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        raise RuntimeError(f"All {len(routes)} route(s) failed: {'; '.join(errors)}")
+
+    def _route_metric(self, url: str, model: str, counter: str):
+        with self._cond:
+            metrics = self._route_metrics.setdefault(
+                f"{model}@{url}", {"attempts": 0, "hedges": 0, "wins": 0, "failures": 0, "cancelled": 0}
+            )
+            metrics[counter] += 1
+
+    # --- Warm-up and metrics ---
+
+    def configured_models(self) -> List[Tuple[str, str, str]]:
+        """(url, model, kind) for every model the app uses"""
+        return [
+            (settings.OLLAMA_URL, settings.OLLAMA_MODEL, "generate"),
+            (settings.SUMMARY_OLLAMA_URL, settings.SUMMARY_OLLAMA_MODEL, "generate"),
+            *((url, model, "generate") for url, model in parse_routes(settings.SUMMARY_FALLBACK_ROUTES)),
+            (settings.VECTOR_EMBEDDING_OLLAMA_URL, settings.VECTOR_EMBEDDING_OLLAMA_MODEL, "embed"),
+        ]
+
+    def warm_up(self, models: Optional[List[Tuple[str, str, str]]] = None) -> Dict[str, str]:
+        """Load each model into memory (an empty request only loads the model) so first requests are fast"""
+        results = {}
+        for url, model, kind in dict.fromkeys(models or self.configured_models()):
+            payload = {"model": model, "input": []} if kind == "embed" else {"model": model}
+            started = time.monotonic()
+            try:
+                self.post(url, f"/api/{kind}", payload, PRIORITY_BACKGROUND, timeout=WARM_UP_TIMEOUT)
+                results[model] = "ready"
+                logger.info(f"Warmed up {model} at {url} in {time.monotonic() - started:.1f}s")
+            except Exception as e:
+                results[model] = f"error: {e}"
+                logger.warning(f"Could not warm up {model} at {url}: {e}")
+        return results
+
+    def start_warm_up(self):
+        """Warm up the configured models in a background thread so startup is not delayed"""
+        threading.Thread(target=self.warm_up, name="llm-warm-up", daemon=True).start()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            endpoints = {
+                url: {
+                    "limit": endpoint.limit,
+                    "active": endpoint.active,
+                    "queued": sum(len(queue) for queue in endpoint.queues.values()),
+                }
+                for url, endpoint in self._endpoints.items()
+            }
+            models = {}
+            for model, metrics in self._metrics.items():
+                granted = metrics["granted"]
+                models[model] = {
+                    "requests": metrics["requests"],
+                    "errors": metrics["errors"],
+                    "queued": metrics["queued"],
+                    "max_queued": metrics["max_queued"],
+                    "avg_wait_ms": round(metrics["wait_ms_total"] / granted, 1) if granted else None,
+                    "max_wait_ms": round(metrics["max_wait_ms"], 1),
+                    "tokens": metrics["tokens"],
+                    "tokens_per_second": (
+                        round(metrics["tokens"] / metrics["token_seconds"], 1) if metrics["token_seconds"] else None
+                    ),
+                }
+            routes = {route: dict(metrics) for route, metrics in self._route_metrics.items()}
+        return {"keep_alive": self.keep_alive, "endpoints": endpoints, "models": models, "routes": routes}
+
+    def close(self):
+        self.client.close()
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(True)
+
+
+llm_gateway = LLMGateway()
@@ -0,0 +1,111 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+from typing import Any, BinaryIO, Dict, Optional, Union
+from core.config import settings
+from core.image_store import ImageStore
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+
+_HASH_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+# Leading bytes of the formats preprocess_image accepts, for serving objects without stored metadata
+_SIGNATURES = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF8", "image/gif"),
+    (b"BM", "image/bmp"),
+]
+
+
+def sniff_content_type(header: bytes) -> str:
+    for signature, content_type in _SIGNATURES:
+        if header.startswith(signature):
+            return content_type
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "image/webp"
+    if header[4:8] == b"ftyp":
+        return "image/avif" if header[8:12] in (b"avif", b"avis") else "image/heif"
+    return "application/octet-stream"
+
+
+class LocalImageStore(ImageStore):
+    """
+    Content-addressed image store on the local filesystem. Each object is saved once under its sha256
+    (fanned out as ab/cd/abcd...), so identical uploads and renditions share a file, and is served by
+    /food/images/{hash}.
+    """
+
+    backend = "local"
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or settings.IMAGE_STORE_DIR
+        self._tmp_dir = os.path.join(self.root, "tmp")
+        os.makedirs(self._tmp_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._counters = {"written": 0, "deduplicated": 0, "bytes_written": 0}
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def _write(self, source: Union[bytes, BinaryIO]) -> str:
+        """Stream `source` into the store and return its sha256; an existing copy is kept as is"""
+        sha256 = hashlib.sha256()
+        size = 0
+        with tempfile.NamedTemporaryFile(dir=self._tmp_dir, delete=False) as tmp:
+            if isinstance(source, bytes):
+                sha256.update(source)
+                tmp.write(source)
+                size = len(source)
+            else:
+                source.seek(0)
+                while chunk := source.read(CHUNK_SIZE):
+                    sha256.update(chunk)
+                    tmp.write(chunk)
+                    size += len(chunk)
+        digest = sha256.hexdigest()
+        path = self._path(digest)
+        with self._lock:
+            if os.path.exists(path):
+                os.remove(tmp.name)
+                self._counters["deduplicated"] += 1
+                return digest
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp.name, path)
+            self._counters["written"] += 1
+            self._counters["bytes_written"] += size
+        return digest
+
+    async def upload_renditions(self, renditions: Dict[str, Any], original_filename: str) -> Dict[str, Any]:
+        key, web_key, thumbnail_key = await asyncio.gather(
+            asyncio.to_thread(self._write, renditions["original"]),
+            asyncio.to_thread(self._write, renditions["web"]),
+            asyncio.to_thread(self._write, renditions["thumbnail"]),
+        )
+        return {
+            "bucket": self.backend,
+            "region": self.backend,
+            "key": key,
+            "content_type": renditions["content_type"],
+            "web_key": web_key,
+            "thumbnail_key": thumbnail_key,
+        }
+
+    def get_image_url(self, key: str) -> str:
+        return f"/food/images/{key}"
+
+    def local_path(self, key: str) -> Optional[str]:
+        if not _HASH_PATTERN.match(key):
+            return None
+        path = self._path(key)
+        return path if os.path.isfile(path) else None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"backend": self.backend, "root": self.root, **self._counters}
@@ -0,0 +1,475 @@
+import json
+import logging
+import math
+import os
+import shutil
+import threading
+import time
+import numpy as np
+from typing import Any, Dict, Iterator, List, Optional
+from core.config import settings
+from core.vector_store import AliasCutoverError, CollectionNotFoundError, VectorDimensionError, VectorStore
+
+logger = logging.getLogger(__name__)
+
+# k-means iterations and training sample size (per list) when building the IVF index
+IVF_TRAIN_ITERATIONS = 10
+IVF_TRAIN_POINTS_PER_LIST = 64
+
+# Rows per block when scoring int8 codes, so each block's float32 copy stays cache-resident
+INT8_SCORE_BLOCK_ROWS = 4096
+
+
+def _values(value: Any) -> List[Any]:
+    # Like Qdrant, a condition on an array field matches if any element matches
+    return value if isinstance(value, list) else [value]
+
+
+def _in_range(value: Any, bounds: Dict[str, Any]) -> bool:
+    try:
+        return (
+            ("gt" not in bounds or bounds["gt"] is None or value > bounds["gt"])
+            and ("gte" not in bounds or bounds["gte"] is None or value >= bounds["gte"])
+            and ("lt" not in bounds or bounds["lt"] is None or value < bounds["lt"])
+            and ("lte" not in bounds or bounds["lte"] is None or value <= bounds["lte"])
+        )
+    except TypeError:
+        return False
+
+
+def matches_condition(payload: Dict[str, Any], condition: Dict[str, Any]) -> bool:
+    """Evaluate a single Qdrant filter condition (or nested filter) against a payload"""
+    if any(clause in condition for clause in ("must", "must_not", "should")):
+        return matches_filter(payload, condition)
+
+    key = condition["key"]
+    value = payload.get(key)
+
+    if "is_empty" in condition:
+        return value in (None, []) if condition["is_empty"] else value not in (None, [])
+    if value is None:
+        return False
+
+    if "match" in condition:
+        match = condition["match"]
+        if "value" in match:
+            return match["value"] in _values(value)
+        if "any" in match:
+            return any(v in match["any"] for v in _values(value))
+        if "except" in match:
+            return not any(v in match["except"] for v in _values(value))
+    if "range" in condition:
+        return any(_in_range(v, condition["range"]) for v in _values(value))
+
+    raise ValueError(f"Unsupported filter condition: {condition}")
+
+
+def matches_filter(payload: Dict[str, Any], query_filter: Optional[Dict[str, Any]]) -> bool:
+    """Evaluate a Qdrant-style filter (must / must_not / should) against a payload"""
+    if not query_filter:
+        return True
+    if not all(matches_condition(payload, c) for c in query_filter.get("must") or []):
+        return False
+    if any(matches_condition(payload, c) for c in query_filter.get("must_not") or []):
+        return False
+    should = query_filter.get("should") or []
+    return not should or any(matches_condition(payload, c) for c in should)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def _top_k(scores: np.ndarray, limit: int) -> np.ndarray:
+    """Positions of the `limit` highest scores, best first"""
+    if len(scores) > limit:
+        top = np.argpartition(-scores, limit - 1)[:limit]
+    else:
+        top = np.arange(len(scores))
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+class IVFIndex:
+    """
+    Inverted-file approximate index: rows are assigned to the nearest of ~sqrt(n) spherical k-means
+    centroids, and a search only scores the rows in the `nprobe` lists closest to the query.
+    """
+
+    def __init__(self, vectors: np.ndarray, seed: int = 0):
+        count = len(vectors)
+        n_lists = min(max(int(math.sqrt(count)), 1), count)
+        rng = np.random.default_rng(seed)
+
+        sample = vectors[rng.choice(count, size=min(count, n_lists * IVF_TRAIN_POINTS_PER_LIST), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+        for _ in range(IVF_TRAIN_ITERATIONS):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for list_id in range(n_lists):
+                members = sample[assignment == list_id]
+                if len(members):
+                    centroids[list_id] = members.mean(axis=0)
+            centroids = _normalize(centroids).astype(np.float32)
+
+        self.centroids = centroids
+        self.assignment = np.empty(0, dtype=np.int32)
+        self.built_for = count
+        self.assign(0, vectors)
+
+    def assign(self, start_row: int, vectors: np.ndarray):
+        """(Re)assign rows start_row .. start_row + len(vectors) to their nearest list"""
+        end_row = start_row + len(vectors)
+        if end_row > len(self.assignment):
+            self.assignment = np.concatenate([self.assignment, np.zeros(end_row - len(self.assignment), np.int32)])
+        self.assignment[start_row:end_row] = np.argmax(vectors @ self.centroids.T, axis=1)
+
+    def candidates(self, query: np.ndarray, nprobe: int, count: int) -> np.ndarray:
+        probed = np.argsort(-(self.centroids @ query))[:nprobe]
+        return np.nonzero(np.isin(self.assignment[:count], probed))[0]
+
+
+class LocalCollection:
+    """
+    One collection on disk: a float32 matrix of unit-normalized vectors memory-mapped from vectors.f32
+    (row i belongs to the i-th id), with ids and payloads in points.json and the vector size in meta.json.
+
+    With int8 scalar quantization, a quarter-size int8 copy of the matrix (vectors.i8) is scanned first and
+    the best `limit * oversampling` candidates are rescored against the float32 vectors.
+    """
+
+    def __init__(
+        self, path: str, vector_size: Optional[int] = None, quantization_config: Optional[Dict[str, Any]] = None
+    ):
+        self.path = path
+        meta_path = os.path.join(path, "meta.json")
+
+        if vector_size is not None:
+            scalar = (quantization_config or {}).get("scalar") or {}
+            if scalar and scalar.get("type") != "int8":
+                raise ValueError(f"Unsupported quantization: {quantization_config}")
+            os.makedirs(path, exist_ok=True)
+            self._write_json(
+                "meta.json",
+                {"vector_size": vector_size, "quantization": scalar or None, "int8_scale": None},
+            )
+            self._write_json("points.json", {"ids": [], "payloads": []})
+            open(os.path.join(path, "vectors.f32"), "wb").close()
+            if scalar:
+                open(os.path.join(path, "vectors.i8"), "wb").close()
+        elif not os.path.exists(meta_path):
+            raise CollectionNotFoundError(f"No local collection at {path}")
+
+        with open(meta_path) as f:
+            self.meta = json.load(f)
+        self.vector_size = self.meta["vector_size"]
+        self.quantization = self.meta.get("quantization")
+        with open(os.path.join(path, "points.json")) as f:
+            points = json.load(f)
+
+        self.ids: List[Any] = points["ids"]
+        self.payloads: List[Dict[str, Any]] = points["payloads"]
+        self.rows = {point_id: row for row, point_id in enumerate(self.ids)}
+        self.index: Optional[IVFIndex] = None
+        self._open_matrix()
+
+    def _write_json(self, name: str, data: Dict[str, Any]):
+        tmp_path = os.path.join(self.path, f"{name}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, os.path.join(self.path, name))
+
+    def _map(self, name: str, dtype) -> np.ndarray:
+        path = os.path.join(self.path, name)
+        capacity = os.path.getsize(path) // (np.dtype(dtype).itemsize * self.vector_size)
+        # np.memmap cannot map an empty file
+        if not capacity:
+            return np.empty((0, self.vector_size), dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode="r+", shape=(capacity, self.vector_size))
+
+    def _open_matrix(self):
+        self.matrix = self._map("vectors.f32", np.float32)
+        self.codes = self._map("vectors.i8", np.int8) if self.quantization else None
+        self.capacity = len(self.matrix)
+
+    def flush(self):
+        for mapped in (self.matrix, self.codes):
+            if isinstance(mapped, np.memmap):
+                mapped.flush()
+
+    def _grow(self, min_capacity: int):
+        capacity = max(min_capacity, self.capacity * 2, 64)
+        self.flush()
+        self.matrix = self.codes = None
+        os.truncate(os.path.join(self.path, "vectors.f32"), capacity * 4 * self.vector_size)
+        if self.quantization:
+            os.truncate(os.path.join(self.path, "vectors.i8"), capacity * self.vector_size)
+        self._open_matrix()
+
+    def _quantize(self, vectors: np.ndarray) -> np.ndarray:
+        if self.meta.get("int8_scale") is None:
+            # Like Qdrant, the int8 range covers the given quantile of component magnitudes and clips the rest
+            quantile = self.quantization.get("quantile") or 1.0
+            self.meta["int8_scale"] = max(float(np.quantile(np.abs(vectors), quantile)), 1e-6)
+            self._write_json("meta.json", self.meta)
+        return np.clip(np.rint(vectors * (127 / self.meta["int8_scale"])), -127, 127).astype(np.int8)
+
+    @property
+    def count(self) -> int:
+        return len(self.ids)
+
+    def upsert(self, points: List[Dict[str, Any]]):
+        if not points:
+            return
+        vectors = np.asarray([point["vector"] for point in points], dtype=np.float32)
+        if vectors.ndim != 2 or vectors.shape[1] != self.vector_size:
+            raise VectorDimensionError(
+                f"Wrong input: Vector dimension error: expected dim: {self.vector_size}, "
+                f"got {vectors.shape[-1] if vectors.ndim else 0}"
+            )
+        vectors = _normalize(vectors)
+
+        codes = self._quantize(vectors) if self.quantization else None
+
+        new_ids = [point["id"] for point in points if point["id"] not in self.rows]
+        if self.count + len(new_ids) > self.capacity:
+            self._grow(self.count + len(new_ids))
+
+        for position, (point, vector) in enumerate(zip(points, vectors)):
+            row = self.rows.get(point["id"])
+            if row is None:
+                row = self.rows[point["id"]] = len(self.ids)
+                self.ids.append(point["id"])
+                self.payloads.append(point.get("payload") or {})
+            else:
+                self.payloads[row] = point.get("payload") or {}
+            self.matrix[row] = vector
+            if codes is not None:
+                self.codes[row] = codes[position]
+            if self.index is not None:
+                self.index.assign(row, vector[np.newaxis])
+
+        # Vectors hit the disk before the ids that make them visible
+        self.flush()
+        self._write_json("points.json", {"ids": self.ids, "payloads": self.payloads})
+
+    def _ann_index(self) -> Optional[IVFIndex]:
+        if self.count < settings.VECTOR_LOCAL_ANN_THRESHOLD:
+            self.index = None
+        elif self.index is None or self.count > 2 * self.index.built_for:
+            started = time.perf_counter()
+            self.index = IVFIndex(np.asarray(self.matrix[: self.count]))
+            logger.info(
+                f"Built IVF index over {self.count} points with {len(self.index.centroids)} lists "
+                f"in {time.perf_counter() - started:.2f}s"
+            )
+        return self.index
+
+    def _rows(self, source: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        # A full scan reads a contiguous slice instead of gathering every row into a copy
+        return source[: self.count] if rows is None else source[rows]
+
+    def _score_int8(self, rows: Optional[np.ndarray], query: np.ndarray) -> np.ndarray:
+        count = self.count if rows is None else len(rows)
+        scores = np.empty(count, dtype=np.float32)
+        for start in range(0, count, INT8_SCORE_BLOCK_ROWS):
+            end = min(start + INT8_SCORE_BLOCK_ROWS, count)
+            block = self.codes[start:end] if rows is None else self.codes[rows[start:end]]
+            scores[start:end] = block.astype(np.float32) @ query
+        return scores * (self.meta["int8_scale"] / 127)
+
+    def _score(self, rows: Optional[np.ndarray], query: np.ndarray, limit: int, params: Optional[Dict[str, Any]]):
+        """
+        Score candidate rows (None for all rows), using the int8 codes (plus float32 rescoring) when the
+        collection is quantized. Returns the scored rows and their scores.
+        """
+        quantization = (params or {}).get("quantization") or {}
+        scored_rows = np.arange(self.count) if rows is None else rows
+
+        if self.codes is None or quantization.get("ignore"):
+            return scored_rows, self._rows(self.matrix, rows) @ query
+
+        approx = self._score_int8(rows, query)
+        if not quantization.get("rescore", True):
+            return scored_rows, approx
+
+        shortlist = scored_rows[_top_k(approx, math.ceil(limit * (quantization.get("oversampling") or 1.0)))]
+        return shortlist, self.matrix[shortlist] @ query
+
+    def search(
+        self,
+        vector: List[float],
+        limit: int,
+        query_filter: Optional[Dict[str, Any]] = None,
+        params: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        query = np.asarray(vector, dtype=np.float32)
+        if query.shape != (self.vector_size,):
+            raise VectorDimensionError(
+                f"Wrong input: Vector dimension error: expected dim: {self.vector_size}, got {query.shape[-1]}"
+            )
+        query = _normalize(query)
+
+        allowed = None
+        if query_filter:
+            allowed = np.fromiter(
+                (matches_filter(payload, query_filter) for payload in self.payloads), dtype=bool, count=self.count
+            )
+
+        rows = None
+        index = self._ann_index()
+        if index is not None:
+            rows = index.candidates(query, settings.VECTOR_LOCAL_ANN_NPROBE, self.count)
+            if allowed is not None:
+                rows = rows[allowed[rows]]
+            # Too few candidates survived the probe (or the filter); fall back to an exact scan
+            if len(rows) < limit:
+                rows = None
+
+        if rows is None and allowed is not None:
+            rows = np.nonzero(allowed)[0]
+
+        rows, scores = self._score(rows, query, limit, params)
+        top = _top_k(scores, limit)
+        return [
+            {"id": self.ids[rows[i]], "score": float(scores[i]), "payload": self.payloads[rows[i]]} for i in top
+        ]
+
+
+class LocalVectorStore(VectorStore):
+    """
+    Embedded vector store for machines without a Qdrant server. Each collection is a memory-mapped
+    float32 matrix searched by exact cosine similarity, switching to an IVF approximate index once it
+    holds VECTOR_LOCAL_ANN_THRESHOLD points. Payload filters use the same syntax as Qdrant.
+    """
+
+    backend = "local"
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or os.path.join(settings.VECTOR_DATA_DIR, "local")
+        self._collections: Dict[str, LocalCollection] = {}
+        self._lock = threading.RLock()
+        self._searches = 0
+        self._search_seconds = 0.0
+        self._last_search_ms = None
+
+    def _aliases_path(self) -> str:
+        return os.path.join(self.root, "aliases.json")
+
+    def get_aliases(self) -> Dict[str, str]:
+        try:
+            with open(self._aliases_path()) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def list_collections(self) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            name for name in os.listdir(self.root) if os.path.exists(os.path.join(self.root, name, "meta.json"))
+        )
+
+    def switch_alias(self, alias: str, collection: str, writers_paused: bool = False):
+        with self._lock:
+            if not os.path.exists(os.path.join(self.root, collection, "meta.json")):
+                raise CollectionNotFoundError(f"No local collection {collection}")
+            if alias in self.list_collections():
+                # The lock only covers this process; the API may be writing to the same directory
+                if not writers_paused:
+                    raise AliasCutoverError(f"Collection {alias} must be replaced by an alias; pause writers first")
+                logger.warning(f"Deleting collection {alias} so the name can be used as an alias for {collection}")
+                self.delete_collection(alias)
+
+            aliases = self.get_aliases()
+            aliases[alias] = collection
+            os.makedirs(self.root, exist_ok=True)
+            tmp_path = f"{self._aliases_path()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(aliases, f)
+            os.replace(tmp_path, self._aliases_path())
+
+    def _collection(self, name: str) -> LocalCollection:
+        name = self.get_aliases().get(name, name)
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections[name] = LocalCollection(os.path.join(self.root, name))
+        return collection
+
+    def get_collection(self, name: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            try:
+                collection = self._collection(name)
+            except CollectionNotFoundError:
+                return None
+            return {
+                "vector_size": collection.vector_size,
+                "points_count": collection.count,
+                "indexed_fields": [],
+                "quantization": collection.quantization,
+            }
+
+    def create_collection(self, name: str, vector_size: int, quantization_config: Optional[Dict[str, Any]] = None):
+        with self._lock:
+            self._collections.pop(name, None)
+            self._collections[name] = LocalCollection(
+                os.path.join(self.root, name), vector_size=vector_size, quantization_config=quantization_config
+            )
+            logger.info(f"Created local collection {name} with vector size {vector_size}")
+
+    def delete_collection(self, name: str):
+        with self._lock:
+            self._collections.pop(name, None)
+            shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+
+    def upsert(self, name: str, points: List[Dict[str, Any]]):
+        with self._lock:
+            self._collection(name).upsert(points)
+
+    def search(
+        self,
+        name: str,
+        vector: List[float],
+        limit: int,
+        query_filter: Optional[Dict[str, Any]] = None,
+        params: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        with self._lock:
+            started = time.perf_counter()
+            results = self._collection(name).search(vector, limit, query_filter, params)
+            elapsed = time.perf_counter() - started
+            self._searches += 1
+            self._search_seconds += elapsed
+            self._last_search_ms = round(elapsed * 1000, 3)
+        return results
+
+    def scroll(self, name: str, page_size: int = 256) -> Iterator[Dict[str, Any]]:
+        with self._lock:
+            collection = self._collection(name)
+            points = [
+                {"id": point_id, "payload": payload} for point_id, payload in zip(collection.ids, collection.payloads)
+            ]
+        yield from points
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": self.backend,
+                "collections": {
+                    name: {
+                        "points": collection.count,
+                        "vector_size": collection.vector_size,
+                        "index": "ivf" if collection.index is not None else "flat",
+                        "quantization": (collection.quantization or {}).get("type"),
+                    }
+                    for name, collection in self._collections.items()
+                },
+                "searches": self._searches,
+                "avg_search_ms": round(self._search_seconds * 1000 / self._searches, 3) if self._searches else None,
+                "last_search_ms": self._last_search_ms,
+            }
+
+    def close(self):
+        with self._lock:
+            for collection in self._collections.values():
+                collection.flush()
+            self._collections.clear()
@@ -1,22 +1,81 @@
-import httpx
 import json
 import logging
 import hashlib
-from typing import Dict, List, Optional, Any
+import os
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Any
 from datetime import datetime
 from core.config import settings
+from core.embedding_cache import EmbeddingCache
+from core.llm_gateway import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, llm_gateway
+from core.vector_reduction import VectorProjection, load_projection
+from core.vector_store import CollectionNotFoundError, VectorDimensionError, create_vector_store
 
 logger = logging.getLogger(__name__)
 
+# Payload fields indexed at collection bootstrap so structured filters don't scan every point
+PAYLOAD_INDEXES = {
+    "date": "datetime",
+    "day_of_week": "keyword",
+    "granularity": "keyword",
+    "steps": "float",
+    "sleep_hours": "float",
+    "event_count": "integer",
+}
+
+# Numeric payload fields that accept min/max search filters
+RANGE_FILTER_FIELDS = ("steps", "sleep_hours", "event_count")
+
+
+def _collection_state_path() -> str:
+    return os.path.join(settings.VECTOR_DATA_DIR, "collections.json")
+
+
+def load_collection_state() -> Dict[str, Any]:
+    """Read the persisted per-collection state (embedding model and vector size)"""
+    try:
+        with open(_collection_state_path()) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable vector collection state: {e}")
+        return {}
+
+
+def save_collection_state(collection_name: str, state: Optional[Dict[str, Any]]):
+    """Persist (or with None, forget) the state for one collection"""
+    all_state = load_collection_state()
+    if state is None:
+        all_state.pop(collection_name, None)
+    else:
+        all_state[collection_name] = state
+
+    path = _collection_state_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(all_state, f, indent=2)
+    os.replace(tmp_path, path)
+
 
 class QdrantClient:
-    def __init__(self):
-        self.base_url = settings.VECTOR_DB_URL
-        self.client = httpx.Client(timeout=30.0)
+    def __init__(self, purge_embedding_cache: bool = True):
+        # Point storage: a Qdrant server or the embedded local store (VECTOR_STORE_BACKEND)
+        self.store = create_vector_store()
         self.embedding_model = settings.VECTOR_EMBEDDING_OLLAMA_MODEL
         self.embedding_url = settings.VECTOR_EMBEDDING_OLLAMA_URL
         self.collection_name = "daily_summaries"
+        # Purging is skipped while a migration embeds with a new model next to the running API
+        self.embedding_cache = EmbeddingCache(self.embedding_model, purge_other_models=purge_embedding_cache)
         self._vector_size = None  # Cache the vector size
+        self._projection: Optional[VectorProjection] = None
+        self._projection_loaded = False
+        self._collection_verified_at = None  # Monotonic time of the last successful collection check
+        self._collection_lock = threading.Lock()
+        # Bumped on every write so caches of search-derived results know they are stale
+        self.collection_version = 0
 
     def _generate_point_id(self, date: str) -> int:
         """Generate a consistent integer ID from a date string"""
@@ -26,17 +85,23 @@ class QdrantClient:
         return int.from_bytes(hash_object.digest()[:8], byteorder="big")
 
     def get_vector_size(self) -> int:
-        """Get the vector size for the embedding model by making a test call"""
+        """
+        Get the vector size for the embedding model.
+        Uses the size persisted for this collection and model if there is one, otherwise makes a test call.
+        """
         if self._vector_size is not None:
             return self._vector_size
 
+        state = load_collection_state().get(self.collection_name, {})
+        if state.get("embedding_model") == self.embedding_model and state.get("vector_size"):
+            self._vector_size = state["vector_size"]
+            return self._vector_size
+
         try:
             logger.info(f"Determining vector size for model: {self.embedding_model}")
-            response = self.client.post(
-                f"{self.embedding_url}/api/embeddings", json={"model": self.embedding_model, "prompt": "test"}
+            result = llm_gateway.post(
+                self.embedding_url, "/api/embeddings", {"model": self.embedding_model, "prompt": "test"}, timeout=30.0
             )
-            response.raise_for_status()
-            result = response.json()
             embedding = result.get("embedding", [])
 
             if not embedding:
@@ -45,6 +110,15 @@ class QdrantClient:
             else:
                 self._vector_size = len(embedding)
                 logger.info(f"Detected vector size: {self._vector_size} for model {self.embedding_model}")
+                # Only probed sizes are persisted; fallbacks are retried on the next start
+                save_collection_state(
+                    self.collection_name,
+                    {
+                        "embedding_model": self.embedding_model,
+                        "vector_size": self._vector_size,
+                        "detected_at": datetime.utcnow().isoformat(),
+                    },
+                )
 
             return self._vector_size
 
@@ -54,47 +128,148 @@ class QdrantClient:
             self._vector_size = 1024
             return self._vector_size
 
+    @property
+    def projection(self) -> Optional[VectorProjection]:
+        """Dimension reduction applied to every stored and query embedding (None for full vectors)"""
+        if not self._projection_loaded:
+            self._projection = load_projection(self.collection_name)
+            self._projection_loaded = True
+        return self._projection
+
+    def _project(self, embedding: List[float]) -> List[float]:
+        return self.projection.apply(embedding) if self.projection else embedding
+
+    def collection_vector_size(self) -> int:
+        """Vector size of the collection: the embedding size, or the reduced size with a projection"""
+        vector_size = self.get_vector_size()
+        return min(self.projection.dimensions, vector_size) if self.projection else vector_size
+
+    def quantization_config(self) -> Optional[Dict[str, Any]]:
+        if settings.VECTOR_QUANTIZATION == "none":
+            return None
+        if settings.VECTOR_QUANTIZATION != "int8":
+            raise ValueError(f"Unknown VECTOR_QUANTIZATION: {settings.VECTOR_QUANTIZATION}")
+        return {"scalar": {"type": "int8", "quantile": settings.VECTOR_QUANTIZATION_QUANTILE, "always_ram": True}}
+
+    def search_params(self) -> Optional[Dict[str, Any]]:
+        if settings.VECTOR_QUANTIZATION == "none":
+            return None
+        return {
+            "quantization": {
+                "rescore": settings.VECTOR_QUANTIZATION_RESCORE,
+                "oversampling": settings.VECTOR_QUANTIZATION_OVERSAMPLING,
+            }
+        }
+
+    def _collection_check_is_fresh(self) -> bool:
+        if self._collection_verified_at is None:
+            return False
+        ttl = settings.VECTOR_COLLECTION_CHECK_TTL
+        return ttl <= 0 or time.monotonic() - self._collection_verified_at < ttl
+
+    def invalidate_collection_cache(self, forget_vector_size: bool = False):
+        """Force the next operation to re-verify the collection (and optionally re-probe the vector size)"""
+        self._collection_verified_at = None
+        if forget_vector_size:
+            self._vector_size = None
+            save_collection_state(self.collection_name, None)
+
     def ensure_collection_exists(self):
-        """Ensure the daily_summaries collection exists in Qdrant"""
+        """
+        Ensure the daily_summaries collection exists in Qdrant.
+        The check runs once per process (or once per VECTOR_COLLECTION_CHECK_TTL seconds);
+        later calls are free until a 404 or dimension error invalidates it.
+        """
+        if self._collection_check_is_fresh():
+            return
+
+        with self._collection_lock:
+            if self._collection_check_is_fresh():
+                return
+            self._verify_collection()
+            self._collection_verified_at = time.monotonic()
+
+    def _verify_collection(self):
         try:
             # Check if collection exists
-            response = self.client.get(f"{self.base_url}/collections/{self.collection_name}")
-            if response.status_code == 404:
+            collection_info = self.store.get_collection(self.collection_name)
+            if collection_info is None:
                 # Create collection with dynamic vector size
-                vector_size = self.get_vector_size()
-                collection_config = {"vectors": {"size": vector_size, "distance": "Cosine"}}
-                response = self.client.put(
-                    f"{self.base_url}/collections/{self.collection_name}", json=collection_config
-                )
-                response.raise_for_status()
+                vector_size = self.collection_vector_size()
+                self.store.create_collection(self.collection_name, vector_size, self.quantization_config())
+                self.collection_version += 1
                 logger.info(f"Created collection: {self.collection_name} with vector size: {vector_size}")
+                self.ensure_payload_indexes(self.collection_name, [])
             else:
-                response.raise_for_status()
                 # Verify the existing collection has the right vector size
-                collection_info = response.json()
-                existing_size = collection_info["result"]["config"]["params"]["vectors"]["size"]
-                expected_size = self.get_vector_size()
+                existing_size = collection_info["vector_size"]
+                expected_size = self.collection_vector_size()
 
                 if existing_size != expected_size:
                     logger.warning(
                         f"Collection vector size mismatch! Expected: {expected_size}, Found: {existing_size}"
                     )
-                    logger.warning("Consider recreating the collection or changing the embedding model")
+                    logger.warning(
+                        "Run `python -m core.vector_migration` to re-embed into a new collection, "
+                        "or change the embedding model back"
+                    )
                 else:
                     logger.info(f"Collection {self.collection_name} exists with correct vector size: {existing_size}")
 
+                configured = (self.quantization_config() or {}).get("scalar")
+                existing = collection_info.get("quantization")
+                if (configured or {}).get("type") != (existing or {}).get("type"):
+                    logger.warning(
+                        f"Collection {self.collection_name} quantization is {existing}, configured {configured}; "
+                        "quantization only applies when the collection is created"
+                    )
+
+                self.ensure_payload_indexes(self.collection_name, collection_info.get("indexed_fields", []))
+
         except Exception as e:
             logger.error(f"Error ensuring collection exists: {e}")
             raise
 
+    def ensure_payload_indexes(self, collection_name: str, indexed_fields: List[str]):
+        for field, schema in PAYLOAD_INDEXES.items():
+            if field not in indexed_fields:
+                self.store.create_payload_index(collection_name, field, schema)
+                logger.info(f"Created {schema} payload index on {collection_name}.{field}")
+
+    def _with_collection(self, operation):
+        """
+        Run a collection operation, re-verifying the collection if the store reports it missing
+        (retrying once after re-creating it) or rejects the vector dimension.
+        """
+        self.ensure_collection_exists()
+        try:
+            return operation()
+        except CollectionNotFoundError:
+            logger.warning(f"Collection {self.collection_name} not found, re-verifying and retrying")
+            self.invalidate_collection_cache()
+            self.ensure_collection_exists()
+            return operation()
+        except VectorDimensionError as e:
+            logger.warning(f"Vector dimension error from {self.collection_name}: {e}")
+            # The embedding model may have changed size; re-probe it and re-check the collection next time
+            self.invalidate_collection_cache(forget_vector_size=True)
+            raise
+
     def generate_embedding(self, text: str) -> List[float]:
-        """Generate embedding for text using the configured embedding model"""
+        """Generate embedding for text using the configured embedding model, served from cache when possible"""
+        cached = self.embedding_cache.get(text)
+        if cached is not None:
+            return cached
+
         try:
-            response = self.client.post(
-                f"{self.embedding_url}/api/embeddings", json={"model": self.embedding_model, "prompt": text}
+            # Single embeddings embed search queries, so they overtake queued bulk work
+            result = llm_gateway.post(
+                self.embedding_url,
+                "/api/embeddings",
+                {"model": self.embedding_model, "prompt": text},
+                priority=PRIORITY_INTERACTIVE,
+                timeout=30.0,
             )
-            response.raise_for_status()
-            result = response.json()
             embedding = result.get("embedding", [])
 
             if not embedding:
@@ -103,6 +278,8 @@ class QdrantClient:
                 vector_size = self.get_vector_size()
                 return [0.0] * vector_size
 
+            # Only real embeddings are cached; the zero-vector fallbacks below are not
+            self.embedding_cache.put(text, embedding)
             return embedding
 
         except Exception as e:
@@ -111,55 +288,189 @@ class QdrantClient:
             vector_size = self.get_vector_size()
             return [0.0] * vector_size
 
+    def generate_embeddings(self, texts: List[str], batch_size: Optional[int] = None) -> List[List[float]]:
+        """
+        Generate embeddings for many texts, sending up to `batch_size` uncached texts per request
+        through Ollama's batch-capable /api/embed endpoint. Unlike generate_embedding, failures raise
+        instead of returning zero vectors, since callers use this to (re)write stored vectors.
+        """
+        batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE
+        embeddings: List[Optional[List[float]]] = [self.embedding_cache.get(text) for text in texts]
+
+        # Embed each distinct uncached text once
+        missing = list(dict.fromkeys(text for text, embedding in zip(texts, embeddings) if embedding is None))
+        computed: Dict[str, List[float]] = {}
+
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start : start + batch_size]
+            result = llm_gateway.post(
+                self.embedding_url,
+                "/api/embed",
+                {"model": self.embedding_model, "input": batch},
+                priority=PRIORITY_BACKGROUND,
+                timeout=120.0,
+            )
+            batch_embeddings = result.get("embeddings", [])
+
+            if len(batch_embeddings) != len(batch) or not all(batch_embeddings):
+                raise ValueError(
+                    f"Model {self.embedding_model} returned {len(batch_embeddings)} embeddings for {len(batch)} texts"
+                )
+
+            for text, embedding in zip(batch, batch_embeddings):
+                self.embedding_cache.put(text, embedding)
+                computed[text] = embedding
+
+            logger.info(f"Embedded batch of {len(batch)} texts ({start + len(batch)}/{len(missing)})")
+
+        return [embedding if embedding is not None else computed[text] for text, embedding in zip(texts, embeddings)]
+
+    def summary_point(
+        self, key: str, summary: str, metadata: Dict[str, Any], granularity: str, embedding: List[float]
+    ) -> Dict[str, Any]:
+        """Build the point for a summary from an already computed embedding, projected if reduction is on"""
+        payload = {"date": key, **metadata, "summary": summary, "granularity": granularity}
+        payload["created_at"] = datetime.utcnow().isoformat()
+        return {"id": self._summary_point_id(key, granularity), "vector": self._project(embedding), "payload": payload}
+
+    def _upsert_points(self, points: List[Dict[str, Any]]):
+        self._with_collection(lambda: self.store.upsert(self.collection_name, points))
+        self.collection_version += 1
+
+    def store_summaries(self, items: List[Dict[str, Any]], batch_size: Optional[int] = None) -> int:
+        """
+        Embed and store many summaries: each batch is embedded in one request and written
+        as a single multi-point upsert.
+
+        Args:
+            items: Dicts with key, summary, metadata and optional granularity (see store_summary)
+            batch_size: Summaries per embedding request / upsert (defaults to EMBEDDING_BATCH_SIZE)
+
+        Returns:
+            Number of points written
+        """
+        batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE
+        written = 0
+
+        for start in range(0, len(items), batch_size):
+            batch = items[start : start + batch_size]
+            embeddings = self.generate_embeddings([item["summary"] for item in batch], batch_size)
+            points = [
+                self.summary_point(
+                    item["key"], item["summary"], item["metadata"], item.get("granularity", "daily"), embedding
+                )
+                for item, embedding in zip(batch, embeddings)
+            ]
+            self._upsert_points(points)
+            written += len(points)
+            logger.info(f"Stored {written}/{len(items)} summaries")
+
+        return written
+
     def store_daily_summary(self, date: str, summary: str, metadata: Dict[str, Any]):
         """Store a daily summary in Qdrant"""
-        try:
-            self.ensure_collection_exists()
+        self.store_summary(date, summary, metadata, granularity="daily")
+
+    def store_summary(self, key: str, summary: str, metadata: Dict[str, Any], granularity: str = "daily"):
+        """
+        Store a summary in Qdrant.
 
+        Args:
+            key: Date (daily) or period key such as 2025-W10 (weekly) or 2025-03 (monthly)
+            summary: Summary text
+            metadata: Extra payload fields; rollups must include a "date" with the period start
+            granularity: daily, weekly or monthly
+        """
+        try:
             # Generate embedding for the summary
             embedding = self.generate_embedding(summary)
 
-            # Create point for Qdrant
-            point = {
-                "id": self._generate_point_id(date),
-                "vector": embedding,
-                "payload": {"date": date, "summary": summary, "created_at": datetime.utcnow().isoformat(), **metadata},
-            }
-
-            # Store in Qdrant
-            response = self.client.put(
-                f"{self.base_url}/collections/{self.collection_name}/points", json={"points": [point]}
-            )
-            response.raise_for_status()
-            logger.info(f"Stored daily summary for {date}")
+            # Create point for Qdrant and store it
+            point = self.summary_point(key, summary, metadata, granularity, embedding)
+            self._upsert_points([point])
+            logger.info(f"Stored {granularity} summary for {key}")
 
         except Exception as e:
-            logger.error(f"Error storing daily summary: {e}")
+            logger.error(f"Error storing {granularity} summary: {e}")
             raise
 
-    def search_summaries(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
-        """Search daily summaries using semantic search"""
+    def _summary_point_id(self, key: str, granularity: str) -> int:
+        # Daily points keep their original IDs so existing collections stay addressable
+        return self._generate_point_id(key if granularity == "daily" else f"{granularity}_{key}")
+
+    def scroll_summaries(self, page_size: int = 256) -> Iterator[Dict[str, Any]]:
+        """Iterate over every stored point (payload only)"""
+        self.ensure_collection_exists()
         try:
+            yield from self.store.scroll(self.collection_name, page_size)
+        except CollectionNotFoundError:
+            # Nothing to iterate; re-create the collection for later writes
+            self.invalidate_collection_cache()
             self.ensure_collection_exists()
 
+    def _granularity_filter(self, granularity: Optional[str]) -> Optional[Dict[str, Any]]:
+        if granularity is None:
+            return None
+        if granularity == "daily":
+            # Points stored before rollups existed have no granularity field and are all daily
+            return {"must_not": [{"key": "granularity", "match": {"any": ["weekly", "monthly"]}}]}
+        return {"must": [{"key": "granularity", "match": {"value": granularity}}]}
+
+    def _search_filter(
+        self, granularity: Optional[str], filters: Optional[Dict[str, Any]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Combine the granularity filter with structured filters into one Qdrant filter.
+
+        Supported filters: start_date / end_date (YYYY-MM-DD, matched against the summary's date or period start),
+        weekdays (list of day names) and min_<field> / max_<field> for each of RANGE_FILTER_FIELDS.
+        """
+        search_filter = self._granularity_filter(granularity) or {}
+        must = list(search_filter.get("must", []))
+        filters = filters or {}
+
+        def bounds(lower, upper):
+            return {op: bound for op, bound in (("gte", lower), ("lte", upper)) if bound is not None}
+
+        date_range = bounds(filters.get("start_date"), filters.get("end_date"))
+        if date_range:
+            must.append({"key": "date", "range": date_range})
+        if filters.get("weekdays"):
+            must.append({"key": "day_of_week", "match": {"any": list(filters["weekdays"])}})
+        for field in RANGE_FILTER_FIELDS:
+            field_range = bounds(filters.get(f"min_{field}"), filters.get(f"max_{field}"))
+            if field_range:
+                must.append({"key": field, "range": field_range})
+
+        if must:
+            search_filter["must"] = must
+        return search_filter or None
+
+    def search_summaries(
+        self, query: str, limit: int = 5, granularity: Optional[str] = "daily", filters: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Search summaries of the given granularity (or all of them if None) using semantic search,
+        restricted to points matching the structured `filters` (see _search_filter)
+        """
+        try:
             # Generate embedding for the query
             query_embedding = self.generate_embedding(query)
 
-            # Search in Qdrant
-            search_request = {"vector": query_embedding, "limit": limit, "with_payload": True}
-
-            response = self.client.post(
-                f"{self.base_url}/collections/{self.collection_name}/points/search", json=search_request
+            # Search the vector store
+            search_filter = self._search_filter(granularity, filters)
+            query_vector = self._project(query_embedding)
+            return self._with_collection(
+                lambda: self.store.search(
+                    self.collection_name, query_vector, limit, search_filter, self.search_params()
+                )
             )
-            response.raise_for_status()
-
-            results = response.json()
-            return results.get("result", [])
 
         except Exception as e:
             logger.error(f"Error searching summaries: {e}")
             raise
 
     def close(self):
-        """Close the HTTP client"""
-        self.client.close()
+        """Close the vector store and the embedding cache"""
+        self.store.close()
+        self.embedding_cache.close()
@@ -1,56 +1,170 @@
+import asyncio
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, BinaryIO, Dict, Iterable, Optional
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError
 from core.config import settings
+from core.image_store import ImageStore
 import logging
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
 
-class S3Handler:
+class PresignedUrlCache:
+    """
+    Presigned GET URLs per S3 key. A cached URL is only handed out while it stays valid for at least
+    S3_PRESIGNED_URL_MARGIN more seconds, so clients never receive a link that is about to expire.
+
+    All URLs are signed with the same lifetime, so insertion order is expiry order: stale entries are
+    evicted from the front, followed by the oldest ones once the cache is full.
+    """
+
+    def __init__(
+        self, expires_in: Optional[int] = None, margin: Optional[int] = None, max_entries: Optional[int] = None
+    ):
+        self.expires_in = expires_in if expires_in is not None else settings.S3_PRESIGNED_URL_EXPIRY
+        self.margin = min(margin if margin is not None else settings.S3_PRESIGNED_URL_MARGIN, self.expires_in)
+        self.max_entries = max_entries if max_entries is not None else settings.S3_PRESIGNED_URL_CACHE_SIZE
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] - self.margin <= time.monotonic():
+                self._counters["misses"] += 1
+                return None
+            self._counters["hits"] += 1
+            return entry[1]
+
+    def put(self, key: str, url: str, signed_at: float):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (signed_at + self.expires_in, url)
+            now = time.monotonic()
+            while self._entries:
+                oldest_expiry = next(iter(self._entries.values()))[0]
+                if oldest_expiry - self.margin > now and len(self._entries) <= self.max_entries:
+                    break
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+            entries = len(self._entries)
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            **counters,
+            "hit_ratio": round(counters["hits"] / lookups, 3) if lookups else None,
+            "entries": entries,
+            "expires_in_seconds": self.expires_in,
+            "margin_seconds": self.margin,
+        }
+
+
+class S3Handler(ImageStore):
+    backend = "s3"
+
     def __init__(self):
         self.s3_client = boto3.client(
             "s3",
             aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
             aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
             region_name=settings.AWS_REGION,
+            endpoint_url=settings.S3_ENDPOINT_URL,  # An S3-compatible server such as MinIO when set
         )
         self.bucket = settings.AWS_BUCKET_NAME
         self.region = settings.AWS_REGION
+        self.url_cache = PresignedUrlCache()
+        # Large originals are sent as a multipart upload, part by part from their (spooled) file
+        self.transfer_config = TransferConfig(
+            multipart_threshold=settings.S3_MULTIPART_CHUNK_SIZE,
+            multipart_chunksize=settings.S3_MULTIPART_CHUNK_SIZE,
+            max_concurrency=settings.S3_MULTIPART_CONCURRENCY,
+        )
 
-    async def upload_image(self, image_data: bytes, original_filename: str) -> dict:
+    @staticmethod
+    def _key_prefix() -> str:
+        """Date path plus a random id, so concurrent uploads of the same filename never share a key"""
+        return f"{datetime.utcnow().strftime('%Y/%m/%d/%H%M%S')}_{uuid.uuid4().hex}"
+
+    async def upload_image(self, image_data: bytes, original_filename: str, content_type: str = "image/jpeg") -> dict:
         """
         Upload an image to S3 and return its location details.
+        The blocking boto3 call runs in a worker thread so the upload can overlap other work.
 
         Args:
             image_data: Raw image bytes
             original_filename: Original filename from upload
+            content_type: MIME type of the image
 
         Returns:
             dict with bucket, region, and key information
         """
-        try:
-            # Generate a unique key for the image
-            timestamp = datetime.utcnow().strftime("%Y/%m/%d/%H%M%S")
-            key = f"food_images/{timestamp}_{original_filename}"
-
-            # Upload to S3
-            self.s3_client.put_object(
-                Bucket=self.bucket,
-                Key=key,
-                Body=image_data,
-                ContentType="image/jpeg",  # Assuming JPEG, adjust if needed
+        key = f"food_images/{self._key_prefix()}_{original_filename}"
+        await self._put(key, image_data, content_type)
+        return {"bucket": self.bucket, "region": self.region, "key": key}
+
+    async def upload_renditions(self, renditions: dict, original_filename: str) -> dict:
+        """
+        Upload the original, web and thumbnail renditions built by preprocess_image concurrently.
+        The original is streamed from its file rather than read into memory.
+
+        Returns:
+            dict with bucket, region, key, content_type, web_key and thumbnail_key
+        """
+        prefix = self._key_prefix()
+        stem = os.path.splitext(original_filename)[0]
+        location = {
+            "bucket": self.bucket,
+            "region": self.region,
+            "key": f"food_images/{prefix}_{original_filename}",
+            "content_type": renditions["content_type"],
+            "web_key": f"food_images/web/{prefix}_{stem}.jpg",
+            "thumbnail_key": f"food_images/thumbnails/{prefix}_{stem}.jpg",
+        }
+        await asyncio.gather(
+            self._upload_file(location["key"], renditions["original"], renditions["content_type"]),
+            self._put(location["web_key"], renditions["web"], "image/jpeg"),
+            self._put(location["thumbnail_key"], renditions["thumbnail"], "image/jpeg"),
+        )
+        return location
+
+    async def _upload_file(self, key: str, image_file: BinaryIO, content_type: str):
+        def upload():
+            image_file.seek(0)
+            self.s3_client.upload_fileobj(
+                image_file, self.bucket, key, ExtraArgs={"ContentType": content_type}, Config=self.transfer_config
             )
 
-            return {"bucket": self.bucket, "region": self.region, "key": key}
+        try:
+            await asyncio.to_thread(upload)
+        except ClientError as e:
+            logger.error(f"Error uploading to S3: {e}")
+            raise
 
+    async def _put(self, key: str, data: bytes, content_type: str):
+        try:
+            await asyncio.to_thread(
+                self.s3_client.put_object, Bucket=self.bucket, Key=key, Body=data, ContentType=content_type
+            )
         except ClientError as e:
             logger.error(f"Error uploading to S3: {e}")
             raise
 
     def get_image_url(self, key: str) -> str:
         """
-        Generate a presigned URL for accessing the image.
+        Get a presigned URL for accessing the image, reusing a cached one while it is still valid.
 
         Args:
             key: S3 object key
@@ -58,11 +172,33 @@ class S3Handler:
         Returns:
             Presigned URL for the image
         """
+        return self.url_cache.get(key) or self._sign(key)
+
+    async def get_image_urls(self, keys: Iterable[str]) -> Dict[str, str]:
+        """Presigned URLs for several keys; keys missing from the cache are signed in a worker thread"""
+        urls = {}
+        missing = []
+        for key in dict.fromkeys(keys):
+            url = self.url_cache.get(key)
+            if url is None:
+                missing.append(key)
+            else:
+                urls[key] = url
+        if missing:
+            urls.update(await asyncio.to_thread(lambda: {key: self._sign(key) for key in missing}))
+        return urls
+
+    def _sign(self, key: str) -> str:
+        signed_at = time.monotonic()
         try:
             url = self.s3_client.generate_presigned_url(
-                "get_object", Params={"Bucket": self.bucket, "Key": key}, ExpiresIn=3600  # URL valid for 1 hour
+                "get_object", Params={"Bucket": self.bucket, "Key": key}, ExpiresIn=self.url_cache.expires_in
             )
-            return url
         except ClientError as e:
             logger.error(f"Error generating presigned URL: {e}")
             raise
+        self.url_cache.put(key, url, signed_at)
+        return url
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.backend, "presigned_url_cache": self.url_cache.stats()}
@@ -0,0 +1,229 @@
+import json
+import logging
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Rough average for English text with Llama/Qwen style tokenizers
+CHARS_PER_TOKEN = 4
+
+# Sections are admitted into the prompt in this order until the token budget runs out.
+# The most decision-relevant data goes first, redundant or bulky context last.
+SECTION_PRIORITY = [
+    "health_metrics",
+    "sleep_data",
+    "exercise_data",
+    "calendar_events",
+    "food_intake",
+    "location_data",
+    "weather_data",
+    "calendar_locations",
+]
+
+# Tokens held back for each lower-priority section when a list section has to be cut down,
+# so one long section (e.g. a packed calendar) cannot starve everything after it
+SECTION_RESERVE_TOKENS = 60
+
+# Order in which admitted sections are presented to the model
+SECTION_ORDER = [
+    "calendar_events",
+    "calendar_locations",
+    "food_intake",
+    "health_metrics",
+    "exercise_data",
+    "sleep_data",
+    "weather_data",
+    "location_data",
+]
+
+PROMPT_HEADER = """Analyze the following daily data and create a comprehensive summary for {date}.
+Focus on patterns, insights, and notable events. Be concise but informative.
+All timestamps are in local timezone ({timezone}). Data is compact JSON, one record per line.
+
+CRITICAL INSTRUCTIONS:
+- null/None values mean NO DATA WAS COLLECTED for that day; do not treat missing data as a health concern
+- Focus ONLY on the data that IS available; if most data is missing, call it "a day with limited tracking"
+- Only mention actual zero values (data collected but showing 0) as potential areas of interest
+- If sleep_data is null, don't mention sleep or briefly note that no sleep data was recorded
+- If total_calories is 0 and no meals were tracked, this just means no food was tracked
+"""
+
+PROMPT_FOOTER = """
+Please provide a summary that includes:
+1. Overall day assessment based on AVAILABLE data
+2. Key activities and meetings (if any)
+3. Weather conditions and how they might have influenced the day
+4. Locations visited and any travel patterns
+5. Health and wellness highlights (only actual recorded data)
+6. Food intake patterns (only if food was tracked)
+7. Sleep quality assessment (only if sleep data exists)
+8. Notable patterns based on actual data
+
+Keep the summary under 500 words, personal, and insightful.
+Focus on what DID happen rather than what data is missing.
+Frame days with limited data as "quiet tracking days" rather than problematic.
+"""
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate; good enough for budgeting without loading a tokenizer"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def compact_json(value: Any) -> str:
+    """Serialize without indentation or padding whitespace"""
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def truncate_text(text: Optional[str], max_chars: int) -> Optional[str]:
+    if not text or len(text) <= max_chars:
+        return text
+    return text[: max_chars - 1].rstrip() + "…"
+
+
+def _without_empty(record: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in record.items() if v not in (None, "", [], {})}
+
+
+def aggregate_weather(weather_records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Collapse hourly weather records into one daily record per location"""
+    by_location: Dict[str, List[Dict[str, Any]]] = {}
+    for record in weather_records:
+        by_location.setdefault(record.get("location") or "Unknown", []).append(record)
+
+    aggregated = []
+    for location, records in by_location.items():
+        temps = [r["temperature_c"] for r in records if r.get("temperature_c") is not None]
+        humidity = [r["humidity"] for r in records if r.get("humidity") is not None]
+        wind = [r["wind_kph"] for r in records if r.get("wind_kph") is not None]
+        uv = [r["uv_index"] for r in records if r.get("uv_index") is not None]
+        conditions = Counter(r["condition"] for r in records if r.get("condition"))
+
+        aggregated.append(
+            _without_empty(
+                {
+                    "location": location,
+                    "temp_min_c": min(temps) if temps else None,
+                    "temp_max_c": max(temps) if temps else None,
+                    "conditions": [condition for condition, _ in conditions.most_common(3)],
+                    "humidity_avg": round(sum(humidity) / len(humidity)) if humidity else None,
+                    "wind_max_kph": max(wind) if wind else None,
+                    "uv_max": max(uv) if uv else None,
+                    "readings": len(records),
+                }
+            )
+        )
+    return aggregated
+
+
+def _render_sections(daily_data: Dict[str, Any], description_max_chars: int) -> Dict[str, Tuple[str, List[str]]]:
+    """Render each section as a title line plus one compact line per record"""
+    events = [
+        _without_empty({**event, "description": truncate_text(event.get("description"), description_max_chars)})
+        for event in daily_data.get("calendar_events") or []
+    ]
+
+    food_intake = daily_data.get("food_intake") or {}
+    meal_lines = [
+        compact_json({"meal_type": meal_type, **_without_empty(item)})
+        for meal_type, items in (food_intake.get("meals_by_type") or {}).items()
+        for item in items
+    ]
+
+    weather = aggregate_weather(daily_data.get("weather_data") or [])
+
+    return {
+        "calendar_events": (f"CALENDAR EVENTS ({len(events)} events):", [compact_json(e) for e in events]),
+        "calendar_locations": (
+            "CALENDAR LOCATIONS:",
+            [compact_json(_without_empty(loc)) for loc in daily_data.get("calendar_locations") or []],
+        ),
+        "food_intake": (
+            f"FOOD INTAKE (total calories: {food_intake.get('total_calories', 0)}, "
+            f"meals: {food_intake.get('meal_count', 0)}):",
+            meal_lines,
+        ),
+        "health_metrics": ("HEALTH METRICS:", [compact_json(daily_data.get("health_metrics") or None)]),
+        "exercise_data": ("EXERCISE DATA:", [compact_json(daily_data.get("exercise_data") or None)]),
+        "sleep_data": ("SLEEP DATA:", [compact_json(daily_data.get("sleep_data"))]),
+        "weather_data": ("WEATHER DATA (daily aggregate):", [compact_json(w) for w in weather]),
+        "location_data": (
+            "LOCATION DATA:",
+            [compact_json(_without_empty(loc)) for loc in daily_data.get("location_data") or []],
+        ),
+    }
+
+
+def build_summary_prompt(
+    daily_data: Dict[str, Any], token_budget: Optional[int] = None, description_max_chars: Optional[int] = None
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    Build a compact daily summary prompt that fits within a token budget.
+
+    Sections are admitted in SECTION_PRIORITY order. A list section that does not fit is cut down to the
+    records that do (with a note saying how many were left out); a section none of whose records fit is
+    omitted entirely.
+
+    Returns:
+        Tuple of (prompt, stats) where stats describes the prompt size and any truncation
+    """
+    token_budget = token_budget or settings.SUMMARY_PROMPT_TOKEN_BUDGET
+    description_max_chars = description_max_chars or settings.SUMMARY_DESCRIPTION_MAX_CHARS
+
+    header = PROMPT_HEADER.format(date=daily_data["date"], timezone=settings.TIMEZONE)
+    remaining = token_budget - estimate_tokens(header) - estimate_tokens(PROMPT_FOOTER)
+
+    rendered = _render_sections(daily_data, description_max_chars)
+    bodies = {name: "\n".join([title] + (lines or ["none"])) for name, (title, lines) in rendered.items()}
+    costs = {name: estimate_tokens(body) + 1 for name, body in bodies.items()}
+    admitted: Dict[str, str] = {}
+    truncated: List[str] = []
+    omitted: List[str] = []
+
+    for position, name in enumerate(SECTION_PRIORITY):
+        title, lines = rendered[name]
+
+        if costs[name] <= remaining:
+            admitted[name] = bodies[name]
+            remaining -= costs[name]
+            continue
+
+        # Keep as many records as fit, leaving room for the omission note and the sections after this one
+        reserve = sum(min(costs[later], SECTION_RESERVE_TOKENS) for later in SECTION_PRIORITY[position + 1 :])
+        kept = [title]
+        used = estimate_tokens(title) + 1
+        for line in lines:
+            line_cost = estimate_tokens(line) + 1
+            if used + line_cost + 10 > remaining - reserve:
+                break
+            kept.append(line)
+            used += line_cost
+
+        if len(kept) > 1:
+            kept.append(f"... ({len(lines) - len(kept) + 1} more records omitted)")
+            admitted[name] = "\n".join(kept)
+            remaining -= estimate_tokens(admitted[name]) + 1
+            truncated.append(name)
+        else:
+            omitted.append(name)
+
+    sections = [admitted[name] for name in SECTION_ORDER if name in admitted]
+    prompt = "\n".join([header] + sections + [PROMPT_FOOTER])
+
+    stats = {
+        "prompt_chars": len(prompt),
+        "prompt_tokens": estimate_tokens(prompt),
+        "token_budget": token_budget,
+        "sections_truncated": truncated,
+        "sections_omitted": omitted,
+    }
+
+    if truncated or omitted:
+        logger.info(
+            f"Summary prompt for {daily_data['date']} hit the {token_budget} token budget "
+            f"(truncated: {truncated}, omitted: {omitted})"
+        )
+
+    return prompt, stats
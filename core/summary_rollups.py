@@ -0,0 +1,257 @@
+import asyncio
+import logging
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from core.change_feed import clear_dirty_rollup, get_dirty_rollups, mark_rollups_dirty
+from core.db import DirtyRollup, SessionLocal
+from core.llm_gateway import PRIORITY_BACKGROUND
+from core.summary_prompt import truncate_text
+from core.summary_store import get_summaries_by_period, save_summary
+from core.vector_outbox import enqueue_summary
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = ("daily", "weekly", "monthly")
+
+# Cap on each constituent summary pasted into a rollup prompt
+ROLLUP_CONSTITUENT_MAX_CHARS = 1500
+
+
+def week_bounds(day: date) -> Tuple[date, date]:
+    """Monday-to-Sunday week containing `day`"""
+    start = day - timedelta(days=day.weekday())
+    return start, start + timedelta(days=6)
+
+
+def week_key(day: date) -> str:
+    iso_year, iso_week, _ = day.isocalendar()
+    return f"{iso_year}-W{iso_week:02d}"
+
+
+def month_bounds(year: int, month: int) -> Tuple[date, date]:
+    start = date(year, month, 1)
+    next_month = (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start, next_month - timedelta(days=1)
+
+
+def month_key(year: int, month: int) -> str:
+    return f"{year}-{month:02d}"
+
+
+def _days(start: date, end: date) -> List[date]:
+    return [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+
+
+def _average(values: List[float]) -> Optional[float]:
+    return round(sum(values) / len(values), 1) if values else None
+
+
+def aggregate_daily_metrics(daily_payloads: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Roll daily metadata up into period totals and per-day averages"""
+
+    def present(field):
+        return [p[field] for p in daily_payloads if p.get(field) is not None]
+
+    return {
+        "days_covered": len(daily_payloads),
+        "total_calories": sum(present("total_calories")),
+        "event_count": sum(present("event_count")),
+        "meal_count": sum(present("meal_count")),
+        "exercise_minutes": sum(present("exercise_minutes")),
+        # Averages are per tracked day so rollups stay comparable with daily points
+        "steps": _average(present("steps")),
+        "sleep_hours": _average(present("sleep_hours")),
+    }
+
+
+class SummaryRollupService:
+    """
+    Builds weekly summaries from stored daily summaries and monthly summaries from weeklies. Rollups affected
+    by a new daily summary are marked in the dirty_rollups table and rebuilt by a background task.
+    """
+
+    def __init__(self, summary_service):
+        self.summary_service = summary_service
+        self.qdrant_client = summary_service.qdrant_client
+        self._task: Optional[asyncio.Task] = None
+        self._rerun = False
+
+    def _store(self, db: Session, granularity: str, key: str, summary: str, metadata: Dict[str, Any]):
+        enqueue_summary(db, granularity, key, summary, metadata)
+        save_summary(db, granularity, key, date.fromisoformat(metadata["date"]), summary, metadata)
+        self.summary_service.vector_outbox.notify()
+
+    async def build_weekly_summary(self, db: Session, day: date) -> Optional[Dict[str, Any]]:
+        """(Re)build the weekly rollup for the week containing `day`. Returns None if no day was summarized."""
+        start, end = week_bounds(day)
+        key = week_key(start)
+
+        dailies = get_summaries_by_period(db, "daily", [d.isoformat() for d in _days(start, end)])
+        if not dailies:
+            logger.info(f"No daily summaries for week {key}, skipping weekly rollup")
+            return None
+
+        constituents = "\n\n".join(
+            f"Date: {p['date']} ({p.get('day_of_week', '')})\n"
+            f"{truncate_text(p['summary'], ROLLUP_CONSTITUENT_MAX_CHARS)}"
+            for p in dailies
+        )
+        metrics = aggregate_daily_metrics(dailies)
+        prompt = f"""Below are the daily summaries for the week of {start.isoformat()} to {end.isoformat()}
+({metrics['days_covered']} of 7 days summarized). Weekly metrics: {metrics}
+
+Write a weekly summary (under 400 words) covering the overall character of the week, key activities
+and meetings, health and activity trends (steps, exercise, sleep), food patterns and the days that stood out.
+Cite dates or weekdays when relevant. Only describe what the daily summaries actually report.
+
+DAILY SUMMARIES:
+{constituents}
+"""
+        summary, route = await self.summary_service.generate_routed(prompt, PRIORITY_BACKGROUND)
+        metadata = {
+            "date": start.isoformat(),
+            "period": key,
+            "period_start": start.isoformat(),
+            "period_end": end.isoformat(),
+            **metrics,
+            "generated_by": route,
+        }
+        self._store(db, "weekly", key, summary, metadata)
+        return {"granularity": "weekly", "period": key, "summary": summary, "metadata": metadata}
+
+    async def build_monthly_summary(self, db: Session, year: int, month: int) -> Optional[Dict[str, Any]]:
+        """(Re)build the monthly rollup from the weekly rollups of every week overlapping the month"""
+        start, end = month_bounds(year, month)
+        key = month_key(year, month)
+
+        week_keys = sorted({week_key(week_bounds(d)[0]) for d in _days(start, end)})
+        weeklies = get_summaries_by_period(db, "weekly", week_keys)
+        if not weeklies:
+            logger.info(f"No weekly summaries for {key}, skipping monthly rollup")
+            return None
+
+        # Metrics come from the month's own days; weeks straddling the month boundary would skew them
+        dailies = get_summaries_by_period(db, "daily", [d.isoformat() for d in _days(start, end)])
+        metrics = aggregate_daily_metrics(dailies)
+
+        constituents = "\n\n".join(
+            f"Week {p.get('period')} ({p.get('period_start')} to {p.get('period_end')})\n"
+            f"{truncate_text(p['summary'], ROLLUP_CONSTITUENT_MAX_CHARS)}"
+            for p in weeklies
+        )
+        prompt = f"""Below are the weekly summaries covering {start.strftime('%B %Y')}.
+Weeks at the edges may include a few days from the neighbouring months; focus on {start.strftime('%B')}.
+Monthly metrics: {metrics}
+
+Write a monthly summary (under 400 words) covering the overall character of the month, recurring
+activities, health and activity trends, notable weeks and how the month evolved from start to end.
+Only describe what the weekly summaries actually report.
+
+WEEKLY SUMMARIES:
+{constituents}
+"""
+        summary, route = await self.summary_service.generate_routed(prompt, PRIORITY_BACKGROUND)
+        metadata = {
+            "date": start.isoformat(),
+            "period": key,
+            "period_start": start.isoformat(),
+            "period_end": end.isoformat(),
+            **metrics,
+            "generated_by": route,
+        }
+        self._store(db, "monthly", key, summary, metadata)
+        return {"granularity": "monthly", "period": key, "summary": summary, "metadata": metadata}
+
+    @staticmethod
+    def rollup_periods(days: Iterable[date]) -> List[Tuple[str, str, date]]:
+        """(granularity, period, period_start) of every rollup containing the days, weeks first"""
+        week_starts = sorted({week_bounds(d)[0] for d in days})
+        # A changed week feeds every month it overlaps
+        months = sorted({(d.year, d.month) for start in week_starts for d in (start, start + timedelta(days=6))})
+        return [("weekly", week_key(start), start) for start in week_starts] + [
+            ("monthly", month_key(year, month), date(year, month, 1)) for year, month in months
+        ]
+
+    def _build(self, db: Session, granularity: str, period_start: date):
+        if granularity == "weekly":
+            return self.build_weekly_summary(db, period_start)
+        return self.build_monthly_summary(db, period_start.year, period_start.month)
+
+    async def _rebuild_periods(self, db: Session, periods: List[Tuple[str, str, date]]) -> List[Dict[str, Any]]:
+        results = []
+        for granularity, period, period_start in periods:
+            started_at = datetime.utcnow()
+            result = await self._rebuild(db, granularity, period, self._build(db, granularity, period_start))
+            if result["status"] != "error":
+                # Stays dirty if one of its days changed again while it was being rebuilt
+                clear_dirty_rollup(db, granularity, period, marked_before=started_at)
+            results.append(result)
+        return results
+
+    async def rebuild_for_dates(self, db: Session, days: Iterable[date]) -> List[Dict[str, Any]]:
+        """
+        Rebuild only the rollups that contain the given days. Each affected week and month is rebuilt once,
+        weeks first so the monthly rollups see the fresh weeklies.
+        """
+        return await self._rebuild_periods(db, self.rollup_periods(days))
+
+    def mark_dirty(self, db: Session, days: Iterable[date]) -> List[Dict[str, Any]]:
+        """Queue the rollups containing the days for a background rebuild and commit the session"""
+        periods = self.rollup_periods(days)
+        mark_rollups_dirty(db, periods)
+        db.commit()
+        self.schedule()
+        return [
+            {"granularity": granularity, "period": period, "status": "queued"} for granularity, period, _ in periods
+        ]
+
+    async def rebuild_dirty(self, db: Session) -> List[Dict[str, Any]]:
+        """Rebuild every dirty rollup; failed ones stay dirty for the next pass"""
+        periods = [(rollup.granularity, rollup.period, rollup.period_start) for rollup in get_dirty_rollups(db)]
+        return await self._rebuild_periods(db, periods)
+
+    def schedule(self):
+        """Start the background rebuild on the running event loop, or make the running one pass again"""
+        if self._task is not None and not self._task.done():
+            self._rerun = True
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        self._rerun = True
+        while self._rerun:
+            self._rerun = False
+            db = SessionLocal()
+            try:
+                results = await self.rebuild_dirty(db)
+                if results:
+                    logger.info(f"Rebuilt {len(results)} dirty rollup(s): {results}")
+            except Exception as e:
+                logger.error(f"Error rebuilding dirty rollups: {e}")
+            finally:
+                db.close()
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def stats(self, db: Session) -> Dict[str, Any]:
+        return {"dirty": db.query(DirtyRollup).count(), "rebuilding": self._task is not None and not self._task.done()}
+
+    async def _rebuild(self, db: Session, granularity: str, period: str, build) -> Dict[str, Any]:
+        try:
+            result = await build
+            if result is None:
+                return {"granularity": granularity, "period": period, "status": "skipped"}
+            return {
+                "granularity": granularity,
+                "period": period,
+                "status": "success",
+                "days_covered": result["metadata"]["days_covered"],
+            }
+        except Exception as e:
+            logger.error(f"Error rebuilding {granularity} summary for {period}: {e}")
+            db.rollback()
+            return {"granularity": granularity, "period": period, "status": "error", "error": str(e)}
@@ -0,0 +1,84 @@
+import json
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
+from sqlalchemy.orm import Session
+from core.db import DailySummary, upsert_model
+
+
+def save_summary(
+    db: Session, granularity: str, period: str, period_date: date, summary: str, metadata: Dict[str, Any]
+):
+    """Insert or update a summary row keyed by (granularity, period) and commit"""
+    now = datetime.utcnow()
+    data = {
+        "granularity": granularity,
+        "period": period,
+        "date": period_date,
+        "summary": summary,
+        "summary_metadata": json.dumps(metadata, default=str),
+        "created_at": now,
+        "updated_at": now,
+    }
+    upsert_model(
+        db,
+        model_class=DailySummary,
+        data=data,
+        conflict_keys=["granularity", "period"],
+        update_keys=["date", "summary", "summary_metadata", "updated_at"],
+    )
+    db.commit()
+
+
+def to_payload(row: DailySummary) -> Dict[str, Any]:
+    """Shape a row like the vector payload stored for the same summary"""
+    metadata = json.loads(row.summary_metadata) if row.summary_metadata else {}
+    return {
+        "date": row.date.isoformat(),
+        **metadata,
+        "summary": row.summary,
+        "granularity": row.granularity,
+        "created_at": row.created_at.isoformat() if row.created_at else None,
+        "updated_at": row.updated_at.isoformat() if row.updated_at else None,
+    }
+
+
+def get_summaries_by_period(db: Session, granularity: str, periods: List[str]) -> List[Dict[str, Any]]:
+    """Fetch summaries by period key (dates for daily summaries), ordered by date"""
+    if not periods:
+        return []
+    rows = (
+        db.query(DailySummary)
+        .filter(DailySummary.granularity == granularity, DailySummary.period.in_(periods))
+        .order_by(DailySummary.date)
+        .all()
+    )
+    return [to_payload(row) for row in rows]
+
+
+def get_summary(db: Session, granularity: str, period: str) -> Optional[Dict[str, Any]]:
+    row = db.query(DailySummary).filter_by(granularity=granularity, period=period).first()
+    return to_payload(row) if row else None
+
+
+def get_summaries_in_range(
+    db: Session, start: date, end: date, granularity: str = "daily"
+) -> List[Dict[str, Any]]:
+    rows = (
+        db.query(DailySummary)
+        .filter(DailySummary.granularity == granularity, DailySummary.date >= start, DailySummary.date <= end)
+        .order_by(DailySummary.date)
+        .all()
+    )
+    return [to_payload(row) for row in rows]
+
+
+def get_recent_summaries(db: Session, limit: int, granularity: str = "daily") -> List[Dict[str, Any]]:
+    """Most recent summaries first, served straight from the (granularity, date) index"""
+    rows = (
+        db.query(DailySummary)
+        .filter(DailySummary.granularity == granularity)
+        .order_by(DailySummary.date.desc())
+        .limit(limit)
+        .all()
+    )
+    return [to_payload(row) for row in rows]
@@ -0,0 +1,309 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+from core.config import settings
+from core.db import DailySummary, SessionLocal
+from core.qdrant_client import QdrantClient, save_collection_state
+from core.vector_reduction import VectorProjection
+
+logger = logging.getLogger(__name__)
+
+# Passes over the summary table; later passes pick up summaries written while the migration ran
+MAX_CATCH_UP_PASSES = 3
+
+# Summaries read per IN (...) query, below SQLite's bound-parameter limit
+READ_CHUNK_SIZE = 500
+
+
+def target_collection_name(
+    alias: str,
+    embedding_model: str,
+    quantization_config: Optional[Dict[str, Any]],
+    projection: Optional[VectorProjection] = None,
+) -> str:
+    """Versioned collection name, stable for a given embedding configuration so interrupted runs resume into it"""
+    configuration = [embedding_model, settings.VECTOR_REDUCTION, settings.VECTOR_DIMENSIONS, quantization_config]
+    if projection is not None and projection.fingerprint:
+        configuration.append(projection.fingerprint)
+    fingerprint = json.dumps(configuration, sort_keys=True)
+    model_slug = re.sub(r"[^a-z0-9]+", "_", embedding_model.lower()).strip("_")
+    return f"{alias}_{model_slug}_{hashlib.sha1(fingerprint.encode()).hexdigest()[:6]}"
+
+
+class ReembeddingMigration:
+    """
+    Re-embeds every stored summary into a new versioned collection and then atomically points the
+    collection alias at it. Searches keep using the alias (and so the old collection) until the switch.
+
+    Progress is checkpointed per summary (keyed by granularity, period and updated_at) after every batch,
+    so an interrupted run resumes where it stopped and summaries changed in the meantime are re-embedded.
+    """
+
+    def __init__(self, client: QdrantClient, batch_size: Optional[int] = None, concurrency: int = 2):
+        self.client = client
+        self.store = client.store
+        self.alias = client.collection_name
+        self.batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE
+        self.concurrency = max(concurrency, 1)
+        self.target = target_collection_name(
+            self.alias, client.embedding_model, client.quantization_config(), client.projection
+        )
+        self.checkpoint_path = os.path.join(settings.VECTOR_DATA_DIR, "migrations", f"{self.target}.json")
+        self._lock = threading.Lock()
+        self.checkpoint = self._load_checkpoint()
+
+    def _load_checkpoint(self) -> Dict[str, Any]:
+        try:
+            with open(self.checkpoint_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {
+                "alias": self.alias,
+                "target": self.target,
+                "embedding_model": self.client.embedding_model,
+                "started_at": datetime.utcnow().isoformat(),
+                "done": {},
+            }
+
+    def _save_checkpoint(self):
+        os.makedirs(os.path.dirname(self.checkpoint_path), exist_ok=True)
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.checkpoint, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def current_collection(self) -> Optional[str]:
+        """The collection the alias currently serves (the alias name itself for a pre-alias collection)"""
+        target = self.store.get_aliases().get(self.alias)
+        if target:
+            return target
+        return self.alias if self.alias in self.store.list_collections() else None
+
+    @staticmethod
+    def _row_key(row: Row) -> str:
+        return f"{row.granularity}:{row.period}"
+
+    @staticmethod
+    def _row_version(row: Row) -> str:
+        return (row.updated_at or row.created_at or datetime.min).isoformat()
+
+    def pending_rows(self, db: Session) -> List[Row]:
+        """
+        Keys and versions of the summaries not copied at their current version. Only columns are selected:
+        mapped objects would keep the values the session loaded first, hiding summaries regenerated by other
+        sessions between passes.
+        """
+        done = self.checkpoint["done"]
+        rows = (
+            db.query(
+                DailySummary.id,
+                DailySummary.granularity,
+                DailySummary.period,
+                DailySummary.updated_at,
+                DailySummary.created_at,
+            )
+            .filter(DailySummary.summary.isnot(None), DailySummary.summary != "")
+            .order_by(DailySummary.granularity, DailySummary.date)
+            .all()
+        )
+        return [row for row in rows if done.get(self._row_key(row)) != self._row_version(row)]
+
+    def _read_items(self, db: Session, rows: List[Row]) -> List[Dict[str, Any]]:
+        """Read the text of pending rows now, with the version it belongs to, so the checkpoint matches it"""
+        ids = [row.id for row in rows]
+        fresh = {}
+        for start in range(0, len(ids), READ_CHUNK_SIZE):
+            fresh.update(
+                (row.id, row)
+                for row in db.query(
+                    DailySummary.id,
+                    DailySummary.granularity,
+                    DailySummary.period,
+                    DailySummary.summary,
+                    DailySummary.summary_metadata,
+                    DailySummary.updated_at,
+                    DailySummary.created_at,
+                ).filter(DailySummary.id.in_(ids[start : start + READ_CHUNK_SIZE]))
+            )
+        # Rows deleted or emptied since pending_rows are skipped
+        return [
+            {
+                "key": row.period,
+                "summary": row.summary,
+                "metadata": json.loads(row.summary_metadata) if row.summary_metadata else {},
+                "granularity": row.granularity,
+                "row_key": self._row_key(row),
+                "row_version": self._row_version(row),
+            }
+            for row in (fresh.get(row_id) for row_id in ids)
+            if row is not None and row.summary
+        ]
+
+    def _prepare_target(self) -> int:
+        # Probe with the new model directly; a fallback size would silently create a broken collection
+        embedding_size = len(self.client.generate_embeddings(["dimension probe"])[0])
+        vector_size = (
+            min(self.client.projection.dimensions, embedding_size) if self.client.projection else embedding_size
+        )
+
+        existing = self.store.get_collection(self.target)
+        if existing is None:
+            self.store.create_collection(self.target, vector_size, self.client.quantization_config())
+            self.client.ensure_payload_indexes(self.target, [])
+            # A checkpoint without its collection describes points that no longer exist
+            self.checkpoint["done"] = {}
+            logger.info(f"Created collection {self.target} with vector size {vector_size}")
+        elif existing["vector_size"] != vector_size:
+            raise ValueError(
+                f"Collection {self.target} has vector size {existing['vector_size']}, expected {vector_size}; "
+                "delete it and its checkpoint to start over"
+            )
+        else:
+            logger.info(f"Resuming into collection {self.target} ({len(self.checkpoint['done'])} summaries done)")
+        return embedding_size
+
+    def _embed_batch(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        embeddings = self.client.generate_embeddings([item["summary"] for item in batch], self.batch_size)
+        points = [
+            self.client.summary_point(item["key"], item["summary"], item["metadata"], item["granularity"], embedding)
+            for item, embedding in zip(batch, embeddings)
+        ]
+        self.store.upsert(self.target, points)
+        return batch
+
+    def _copy(self, db: Session, rows: List[Row]) -> int:
+        items = self._read_items(db, rows)
+        batches = [items[start : start + self.batch_size] for start in range(0, len(items), self.batch_size)]
+        copied = 0
+
+        # At most `concurrency` batches are in flight; each completed batch is checkpointed immediately
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            pending = set()
+            for batch in batches:
+                if len(pending) >= self.concurrency:
+                    completed, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    copied += self._record(completed)
+                pending.add(executor.submit(self._embed_batch, batch))
+            completed, _ = wait(pending)
+            copied += self._record(completed)
+
+        return copied
+
+    def _record(self, futures) -> int:
+        recorded = 0
+        error = None
+        with self._lock:
+            for future in futures:
+                if future.exception() is not None:
+                    error = error or future.exception()
+                    continue
+                for item in future.result():
+                    self.checkpoint["done"][item["row_key"]] = item["row_version"]
+                    recorded += 1
+            self._save_checkpoint()
+        logger.info(f"Migrated {len(self.checkpoint['done'])} summaries into {self.target}")
+        if error is not None:
+            # Completed batches stay checkpointed, so a rerun only redoes the failed ones
+            raise error
+        return recorded
+
+    def run(
+        self,
+        db: Session,
+        switch: bool = True,
+        drop_old: bool = False,
+        force: bool = False,
+        writers_paused: bool = False,
+    ) -> Dict[str, Any]:
+        previous = self.current_collection()
+        if previous == self.target and not force:
+            return {"status": "up_to_date", "collection": self.target}
+
+        embedding_size = self._prepare_target()
+
+        copied = 0
+        for _ in range(MAX_CATCH_UP_PASSES):
+            rows = self.pending_rows(db)
+            if not rows:
+                break
+            copied += self._copy(db, rows)
+
+        remaining = len(self.pending_rows(db))
+        result = {
+            "status": "copied",
+            "alias": self.alias,
+            "previous_collection": previous,
+            "collection": self.target,
+            "migrated": copied,
+            "total": len(self.checkpoint["done"]),
+            "remaining": remaining,
+        }
+        if not switch:
+            return result
+        if remaining:
+            raise RuntimeError(f"{remaining} summaries are still pending; rerun the migration before switching")
+
+        self.store.switch_alias(self.alias, self.target, writers_paused=writers_paused)
+        save_collection_state(
+            self.alias,
+            {
+                "embedding_model": self.client.embedding_model,
+                "vector_size": embedding_size,
+                "detected_at": datetime.utcnow().isoformat(),
+            },
+        )
+        self.checkpoint["switched_at"] = datetime.utcnow().isoformat()
+        self._save_checkpoint()
+        logger.info(f"Alias {self.alias} now points at {self.target} (was {previous})")
+        result["status"] = "switched"
+
+        if drop_old and previous and previous not in (self.alias, self.target):
+            self.store.delete_collection(previous)
+            result["dropped"] = previous
+
+        return result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Re-embed all summaries into a new versioned collection with the configured embedding "
+        "model (VECTOR_EMBEDDING_OLLAMA_MODEL), then switch the collection alias to it"
+    )
+    parser.add_argument("--batch-size", type=int, default=settings.EMBEDDING_BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=2, help="Embedding batches in flight at once")
+    parser.add_argument("--no-switch", action="store_true", help="Copy only; leave the alias where it is")
+    parser.add_argument("--drop-old", action="store_true", help="Delete the previous collection after switching")
+    parser.add_argument("--force", action="store_true", help="Run even if the alias already serves the target")
+    parser.add_argument(
+        "--writers-paused",
+        action="store_true",
+        help="Confirm the API and outbox worker are stopped, so the original collection can be replaced by the alias",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    db = SessionLocal()
+    # The running API still uses the old model's cached embeddings until the switch
+    client = QdrantClient(purge_embedding_cache=False)
+    try:
+        migration = ReembeddingMigration(client, args.batch_size, args.concurrency)
+        result = migration.run(
+            db, switch=not args.no_switch, drop_old=args.drop_old, force=args.force, writers_paused=args.writers_paused
+        )
+        print(json.dumps(result, indent=2))
+    finally:
+        client.close()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
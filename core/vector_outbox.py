@@ -0,0 +1,199 @@
+import json
+import logging
+import random
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from core.change_feed import _insert
+from core.config import settings
+from core.db import SessionLocal, VectorOutbox
+
+logger = logging.getLogger(__name__)
+
+
+def _outbox_upsert(granularity: str, period: str, summary: str, metadata: Dict[str, Any], now: datetime):
+    insert_stmt = _insert(VectorOutbox).values(
+        granularity=granularity,
+        period=period,
+        summary=summary,
+        summary_metadata=json.dumps(metadata, default=str),
+        revision=1,
+        attempts=0,
+        next_attempt_at=now,
+        created_at=now,
+        updated_at=now,
+    )
+    # A newer version of a queued summary replaces the pending text but keeps the original queue time,
+    # so lag reflects the oldest change that has not reached the vector store
+    return insert_stmt.on_conflict_do_update(
+        index_elements=["granularity", "period"],
+        set_={
+            "summary": insert_stmt.excluded.summary,
+            "summary_metadata": insert_stmt.excluded.summary_metadata,
+            "revision": VectorOutbox.revision + 1,
+            "attempts": 0,
+            "last_error": None,
+            "next_attempt_at": insert_stmt.excluded.next_attempt_at,
+            "updated_at": insert_stmt.excluded.updated_at,
+        },
+    )
+
+
+def enqueue_summary(db: Session, granularity: str, period: str, summary: str, metadata: Dict[str, Any]):
+    """
+    Queue a summary for embedding and upsert into the vector store.
+    The caller is responsible for committing the session, so the outbox entry lands in the same
+    transaction as the summary row itself.
+    """
+    db.execute(_outbox_upsert(granularity, period, summary, metadata, datetime.utcnow()))
+
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff with jitter, capped at VECTOR_OUTBOX_RETRY_MAX"""
+    delay = min(settings.VECTOR_OUTBOX_RETRY_BASE * 2 ** (attempts - 1), settings.VECTOR_OUTBOX_RETRY_MAX)
+    return delay * random.uniform(0.5, 1.0)
+
+
+class VectorOutboxWorker:
+    """
+    Background thread that drains the vector outbox: due entries are embedded and upserted in batches
+    of EMBEDDING_BATCH_SIZE. A failed batch is retried with exponential backoff; entries are only
+    deleted once written, and only if they were not re-queued with newer text in the meantime.
+    """
+
+    def __init__(self, qdrant_client, batch_size: Optional[int] = None, poll_interval: Optional[float] = None):
+        self.qdrant_client = qdrant_client
+        self.batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE
+        self.poll_interval = poll_interval if poll_interval is not None else settings.VECTOR_OUTBOX_POLL_INTERVAL
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._counters = {"written": 0, "batches": 0, "failed_batches": 0}
+        self._last_written_at: Optional[datetime] = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="vector-outbox", daemon=True)
+        self._thread.start()
+        logger.info("Started vector outbox worker")
+
+    def stop(self, timeout: float = 10.0):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def notify(self):
+        """Wake the worker so a freshly queued summary is written without waiting for the next poll"""
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            db = SessionLocal()
+            try:
+                written = self.process_batch(db)
+            except Exception as e:
+                logger.error(f"Vector outbox worker error: {e}")
+                written = 0
+            finally:
+                db.close()
+
+            if not written:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def process_batch(self, db: Session) -> int:
+        """Write one batch of due entries. Returns the number of summaries written."""
+        now = datetime.utcnow()
+        entries = (
+            db.query(VectorOutbox)
+            .filter(VectorOutbox.next_attempt_at <= now)
+            .order_by(VectorOutbox.next_attempt_at, VectorOutbox.id)
+            .limit(self.batch_size)
+            .all()
+        )
+        if not entries:
+            return 0
+
+        claimed = [(entry.id, entry.revision) for entry in entries]
+        items = [
+            {
+                "key": entry.period,
+                "summary": entry.summary,
+                "metadata": json.loads(entry.summary_metadata) if entry.summary_metadata else {},
+                "granularity": entry.granularity,
+            }
+            for entry in entries
+        ]
+        # Release the read transaction while the (slow) embedding calls run
+        db.commit()
+
+        self._counters["batches"] += 1
+        try:
+            self.qdrant_client.store_summaries(items, self.batch_size)
+        except Exception as e:
+            self._counters["failed_batches"] += 1
+            self._record_failure(db, claimed, e)
+            return 0
+
+        for entry_id, revision in claimed:
+            db.query(VectorOutbox).filter(VectorOutbox.id == entry_id, VectorOutbox.revision == revision).delete(
+                synchronize_session=False
+            )
+        db.commit()
+        self._counters["written"] += len(items)
+        self._last_written_at = datetime.utcnow()
+        logger.info(f"Wrote {len(items)} queued summaries to the vector store")
+        return len(items)
+
+    def _record_failure(self, db: Session, claimed, error: Exception):
+        now = datetime.utcnow()
+        for entry_id, revision in claimed:
+            entry = db.query(VectorOutbox).filter_by(id=entry_id, revision=revision).first()
+            if entry is None:
+                continue  # Re-queued with newer text, which is due immediately
+            entry.attempts += 1
+            entry.last_error = str(error)[:1000]
+            entry.next_attempt_at = now + timedelta(seconds=retry_delay(entry.attempts))
+        db.commit()
+        logger.warning(f"Vector write failed for {len(claimed)} queued summaries, will retry: {error}")
+
+    def drain(self, db: Session) -> int:
+        """Write every due entry synchronously (for scripts running without the background thread)"""
+        written = 0
+        while True:
+            batch = self.process_batch(db)
+            if not batch:
+                return written
+            written += batch
+
+    def stats(self, db: Session) -> Dict[str, Any]:
+        pending, retrying, oldest, max_attempts = db.query(
+            func.count(VectorOutbox.id),
+            func.count(VectorOutbox.id).filter(VectorOutbox.attempts > 0),
+            func.min(VectorOutbox.created_at),
+            func.max(VectorOutbox.attempts),
+        ).one()
+        last_error = (
+            db.query(VectorOutbox.last_error)
+            .filter(VectorOutbox.last_error.isnot(None))
+            .order_by(VectorOutbox.next_attempt_at.desc())
+            .limit(1)
+            .scalar()
+        )
+        return {
+            **self._counters,
+            "running": bool(self._thread and self._thread.is_alive()),
+            "pending": pending,
+            "retrying": retrying,
+            "max_attempts": max_attempts or 0,
+            "lag_seconds": round((datetime.utcnow() - oldest).total_seconds(), 1) if oldest else 0.0,
+            "oldest_pending_at": oldest.isoformat() if oldest else None,
+            "last_written_at": self._last_written_at.isoformat() if self._last_written_at else None,
+            "last_error": last_error,
+        }
@@ -0,0 +1,175 @@
+import argparse
+import hashlib
+import logging
+import os
+import numpy as np
+from typing import List, Optional
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+REDUCTION_METHODS = ("none", "truncate", "pca")
+
+
+def projection_path(collection_name: str) -> str:
+    return os.path.join(settings.VECTOR_DATA_DIR, "projections", f"{collection_name}.npz")
+
+
+class VectorProjection:
+    """
+    Maps full embeddings to `dimensions` components, either by keeping the leading dimensions (for models
+    trained with Matryoshka-style embeddings) or by a PCA projection fitted on the stored corpus.
+    Outputs are unit-normalized so cosine scores stay comparable.
+    """
+
+    def __init__(
+        self,
+        method: str,
+        dimensions: int,
+        mean: Optional[np.ndarray] = None,
+        components: Optional[np.ndarray] = None,
+        embedding_model: Optional[str] = None,
+    ):
+        if method not in ("truncate", "pca"):
+            raise ValueError(f"Unknown vector reduction method: {method}")
+        self.method = method
+        self.dimensions = dimensions
+        self.mean = mean
+        self.components = components
+        self.embedding_model = embedding_model
+
+    def apply_many(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.method == "truncate":
+            reduced = vectors[..., : self.dimensions]
+        else:
+            if vectors.shape[-1] != self.components.shape[1]:
+                raise ValueError(
+                    f"PCA projection expects {self.components.shape[1]}-dimensional embeddings, "
+                    f"got {vectors.shape[-1]}; refit it for the current embedding model"
+                )
+            reduced = (vectors - self.mean) @ self.components.T
+        norms = np.linalg.norm(reduced, axis=-1, keepdims=True)
+        return reduced / np.where(norms == 0, 1, norms)
+
+    @property
+    def fingerprint(self) -> Optional[str]:
+        """Digest of a fitted PCA projection, so a refit maps to a new versioned collection; None for truncation"""
+        if self.method != "pca":
+            return None
+        return hashlib.sha1(self.mean.tobytes() + self.components.tobytes()).hexdigest()
+
+    def apply(self, vector: List[float]) -> List[float]:
+        return self.apply_many(np.asarray(vector, dtype=np.float32)).tolist()
+
+    @classmethod
+    def fit_pca(cls, embeddings: np.ndarray, dimensions: int, embedding_model: Optional[str] = None):
+        """Fit a PCA projection onto the top `dimensions` principal components of the corpus"""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if dimensions > min(embeddings.shape):
+            raise ValueError(
+                f"Cannot fit {dimensions} components from {embeddings.shape[0]} embeddings of size "
+                f"{embeddings.shape[1]}; use fewer dimensions or more summaries"
+            )
+        mean = embeddings.mean(axis=0)
+        _, singular_values, vt = np.linalg.svd(embeddings - mean, full_matrices=False)
+        projection = cls("pca", dimensions, mean, vt[:dimensions].astype(np.float32), embedding_model)
+        variance = singular_values**2
+        projection.explained_variance = float(variance[:dimensions].sum() / variance.sum()) if variance.sum() else 1.0
+        return projection
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(
+            tmp_path,
+            mean=self.mean,
+            components=self.components,
+            embedding_model=np.array(self.embedding_model or ""),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path) as data:
+            components = data["components"]
+            return cls("pca", len(components), data["mean"], components, str(data["embedding_model"]) or None)
+
+
+def load_projection(collection_name: str) -> Optional[VectorProjection]:
+    """The projection configured by VECTOR_REDUCTION / VECTOR_DIMENSIONS, or None to store full vectors"""
+    method = settings.VECTOR_REDUCTION
+    if method not in REDUCTION_METHODS:
+        raise ValueError(f"Unknown VECTOR_REDUCTION: {method}")
+    if method == "none" or settings.VECTOR_DIMENSIONS <= 0:
+        return None
+    if method == "truncate":
+        return VectorProjection("truncate", settings.VECTOR_DIMENSIONS)
+
+    path = projection_path(collection_name)
+    if not os.path.exists(path):
+        raise ValueError(f"No PCA projection at {path}; fit one with `python -m core.vector_reduction fit`")
+    projection = VectorProjection.load(path)
+    if projection.dimensions != settings.VECTOR_DIMENSIONS:
+        raise ValueError(
+            f"PCA projection at {path} has {projection.dimensions} dimensions but VECTOR_DIMENSIONS is "
+            f"{settings.VECTOR_DIMENSIONS}; refit it"
+        )
+    return projection
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit a PCA projection for summary vectors on the stored summaries")
+    parser.add_argument("command", choices=["fit"])
+    parser.add_argument("--dimensions", type=int, default=settings.VECTOR_DIMENSIONS, help="Components to keep")
+    parser.add_argument(
+        "--reindex",
+        action="store_true",
+        help="Re-embed every summary into a new reduced collection afterwards and switch the alias to it",
+    )
+    parser.add_argument(
+        "--writers-paused",
+        action="store_true",
+        help="With --reindex: confirm the API is stopped, for the one-time cutover of a pre-alias collection",
+    )
+    args = parser.parse_args()
+
+    if args.dimensions <= 0:
+        parser.error("Set --dimensions or VECTOR_DIMENSIONS")
+    if args.reindex and (settings.VECTOR_REDUCTION != "pca" or settings.VECTOR_DIMENSIONS != args.dimensions):
+        parser.error(f"--reindex needs VECTOR_REDUCTION=pca and VECTOR_DIMENSIONS={args.dimensions}")
+
+    from core.db import DailySummary, SessionLocal
+    from core.qdrant_client import QdrantClient
+    from core.vector_migration import ReembeddingMigration
+
+    db = SessionLocal()
+    client = QdrantClient()
+    try:
+        texts = [row.summary for row in db.query(DailySummary.summary).all()]
+        embeddings = np.asarray(client.generate_embeddings(texts), dtype=np.float32)
+        projection = VectorProjection.fit_pca(embeddings, args.dimensions, client.embedding_model)
+        path = projection_path(client.collection_name)
+        projection.save(path)
+        print(
+            f"Fitted {args.dimensions}-component PCA on {len(texts)} summaries "
+            f"({projection.explained_variance:.1%} of variance retained), saved to {path}"
+        )
+    finally:
+        client.close()
+
+    if args.reindex:
+        # The live collection has the old vector size, so the reduced vectors go into a new versioned
+        # collection and the alias is switched once it is complete; a fresh client picks up the projection
+        client = QdrantClient(purge_embedding_cache=False)
+        try:
+            migration = ReembeddingMigration(client)
+            result = migration.run(db, writers_paused=args.writers_paused)
+            print(f"Re-indexed summaries: {result}")
+        finally:
+            client.close()
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
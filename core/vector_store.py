@@ -0,0 +1,206 @@
+import logging
+import httpx
+from typing import Any, Dict, Iterator, List, Optional
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class CollectionNotFoundError(Exception):
+    """The collection does not exist in the vector store"""
+
+
+class VectorDimensionError(ValueError):
+    """A vector's size does not match the collection's vector size"""
+
+
+class AliasCutoverError(RuntimeError):
+    """Replacing a collection with an alias of the same name needs writers paused first"""
+
+
+class VectorStore:
+    """
+    Point storage behind QdrantClient. Points are dicts with id, vector and payload; filters use
+    Qdrant's filter syntax (must / must_not / should with match and range conditions) for every backend.
+    """
+
+    backend = "base"
+
+    def get_collection(self, name: str) -> Optional[Dict[str, Any]]:
+        """
+        Return {"vector_size", "points_count", "indexed_fields", "quantization"} for a collection,
+        or None if it does not exist
+        """
+        raise NotImplementedError
+
+    def create_collection(self, name: str, vector_size: int, quantization_config: Optional[Dict[str, Any]] = None):
+        """Create a cosine collection, optionally with a Qdrant quantization_config such as {"scalar": {...}}"""
+        raise NotImplementedError
+
+    def delete_collection(self, name: str):
+        raise NotImplementedError
+
+    def create_payload_index(self, name: str, field: str, schema: str):
+        """Index a payload field for filtering; a no-op for backends that filter without indexes"""
+
+    def list_collections(self) -> List[str]:
+        raise NotImplementedError
+
+    def get_aliases(self) -> Dict[str, str]:
+        """Map of alias name to the collection it points at"""
+        raise NotImplementedError
+
+    def switch_alias(self, alias: str, collection: str, writers_paused: bool = False):
+        """
+        Atomically point `alias` at `collection`. A collection that itself carries the alias name (one created
+        before aliases were used) has to be deleted first, since an alias cannot shadow a collection. That
+        delete can't be made atomic with the alias creation, and a live writer could re-create the collection
+        in between, so it raises AliasCutoverError unless `writers_paused` confirms the API is stopped.
+        """
+        raise NotImplementedError
+
+    def upsert(self, name: str, points: List[Dict[str, Any]]):
+        raise NotImplementedError
+
+    def search(
+        self,
+        name: str,
+        vector: List[float],
+        limit: int,
+        query_filter: Optional[Dict[str, Any]] = None,
+        params: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Return the `limit` most similar points as {"id", "score", "payload"}, best first.
+        `params` are Qdrant search params, e.g. {"quantization": {"rescore": True, "oversampling": 2.0}}
+        """
+        raise NotImplementedError
+
+    def scroll(self, name: str, page_size: int = 256) -> Iterator[Dict[str, Any]]:
+        """Iterate over every point in a collection as {"id", "payload"}"""
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.backend}
+
+    def close(self):
+        pass
+
+
+class QdrantHTTPStore(VectorStore):
+    """Vector store backed by a Qdrant server's REST API"""
+
+    backend = "qdrant"
+
+    def __init__(self, base_url: Optional[str] = None):
+        self.base_url = base_url or settings.VECTOR_DB_URL
+        self.client = httpx.Client(timeout=30.0)
+
+    def _request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        response = self.client.request(method, f"{self.base_url}{path}", **kwargs)
+        if response.status_code == 404:
+            raise CollectionNotFoundError(response.text)
+        if response.status_code == 400 and "dimension" in response.text.lower():
+            raise VectorDimensionError(response.text)
+        response.raise_for_status()
+        return response
+
+    def get_collection(self, name: str) -> Optional[Dict[str, Any]]:
+        try:
+            result = self._request("GET", f"/collections/{name}").json()["result"]
+        except CollectionNotFoundError:
+            target = self.get_aliases().get(name)
+            if target is None:
+                return None
+            return self.get_collection(target)
+        return {
+            "vector_size": result["config"]["params"]["vectors"]["size"],
+            "points_count": result.get("points_count"),
+            "indexed_fields": sorted((result.get("payload_schema") or {}).keys()),
+            "quantization": (result["config"].get("quantization_config") or {}).get("scalar"),
+        }
+
+    def create_collection(self, name: str, vector_size: int, quantization_config: Optional[Dict[str, Any]] = None):
+        config = {"vectors": {"size": vector_size, "distance": "Cosine"}}
+        if quantization_config:
+            config["quantization_config"] = quantization_config
+        self._request("PUT", f"/collections/{name}", json=config)
+
+    def delete_collection(self, name: str):
+        try:
+            self._request("DELETE", f"/collections/{name}")
+        except CollectionNotFoundError:
+            pass
+
+    def create_payload_index(self, name: str, field: str, schema: str):
+        self._request("PUT", f"/collections/{name}/index", json={"field_name": field, "field_schema": schema})
+
+    def list_collections(self) -> List[str]:
+        collections = self._request("GET", "/collections").json()["result"]["collections"]
+        return [collection["name"] for collection in collections]
+
+    def get_aliases(self) -> Dict[str, str]:
+        aliases = self._request("GET", "/aliases").json()["result"]["aliases"]
+        return {alias["alias_name"]: alias["collection_name"] for alias in aliases}
+
+    def switch_alias(self, alias: str, collection: str, writers_paused: bool = False):
+        # Qdrant's alias actions can't delete a collection, so replacing one is a separate request
+        if alias in self.list_collections():
+            if not writers_paused:
+                raise AliasCutoverError(f"Collection {alias} must be replaced by an alias; pause writers first")
+            logger.warning(f"Deleting collection {alias} so the name can be used as an alias for {collection}")
+            self.delete_collection(alias)
+
+        actions = [{"create_alias": {"collection_name": collection, "alias_name": alias}}]
+        if alias in self.get_aliases():
+            actions.insert(0, {"delete_alias": {"alias_name": alias}})
+        # Both actions are applied in one request, so readers never see the alias missing
+        self._request("POST", "/collections/aliases", json={"actions": actions})
+
+    def upsert(self, name: str, points: List[Dict[str, Any]]):
+        self._request("PUT", f"/collections/{name}/points", json={"points": points})
+
+    def search(
+        self,
+        name: str,
+        vector: List[float],
+        limit: int,
+        query_filter: Optional[Dict[str, Any]] = None,
+        params: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        search_request = {"vector": vector, "limit": limit, "with_payload": True}
+        if query_filter:
+            search_request["filter"] = query_filter
+        if params:
+            search_request["params"] = params
+        return self._request("POST", f"/collections/{name}/points/search", json=search_request).json().get("result", [])
+
+    def scroll(self, name: str, page_size: int = 256) -> Iterator[Dict[str, Any]]:
+        offset = None
+        while True:
+            request = {"limit": page_size, "with_payload": True, "with_vector": False}
+            if offset is not None:
+                request["offset"] = offset
+
+            result = self._request("POST", f"/collections/{name}/points/scroll", json=request).json().get("result", {})
+            yield from result.get("points", [])
+
+            offset = result.get("next_page_offset")
+            if offset is None:
+                break
+
+    def close(self):
+        self.client.close()
+
+
+def create_vector_store() -> VectorStore:
+    """Instantiate the backend selected by VECTOR_STORE_BACKEND"""
+    backend = settings.VECTOR_STORE_BACKEND
+    if backend == "qdrant":
+        return QdrantHTTPStore()
+    if backend == "local":
+        # Imported lazily; only deployments without a Qdrant server need the embedded store
+        from core.local_vector_store import LocalVectorStore
+
+        return LocalVectorStore()
+    raise ValueError(f"Unknown VECTOR_STORE_BACKEND: {backend}")
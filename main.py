@@ -5,9 +5,11 @@ from apis.locations.routes import router as locations_router
 from apis.health.routes import router as health_router
 from apis.calendar import routes as calendar_routes
 from apis.sheets.routes import router as sheets_router
-from apis.food.routes import router as food_router
-from apis.summaries.routes import router as summaries_router
+from apis.food.routes import router as food_router, food_jobs
+from apis.summaries.routes import router as summaries_router, summary_service
 from core.db import Base, engine
+from core.llm_gateway import llm_gateway
+from core.config import settings
 from core.security import get_api_key
 
 
@@ -35,6 +37,27 @@ app.include_router(food_router, prefix="/food", tags=["food"], dependencies=[Dep
 app.include_router(summaries_router, prefix="/summaries", tags=["Summaries"], dependencies=[Depends(get_api_key)])
 
 
+@app.on_event("startup")
+async def start_background_workers():
+    # Summaries are queued in the vector outbox and embedded in the background
+    summary_service.vector_outbox.start()
+    # Rebuild weekly/monthly rollups left dirty by the previous run
+    summary_service.rollups.schedule()
+    # Resume food analysis jobs left unfinished by the previous run
+    await food_jobs.start()
+    # Load the Ollama models in the background so the first requests don't pay the load time
+    if settings.LLM_WARM_UP:
+        llm_gateway.start_warm_up()
+
+
+@app.on_event("shutdown")
+async def stop_background_workers():
+    summary_service.vector_outbox.stop()
+    await summary_service.rollups.stop()
+    await food_jobs.stop()
+    llm_gateway.close()
+
+
 @app.get("/")
 async def read_root():
     return {
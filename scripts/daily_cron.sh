@@ -49,4 +49,7 @@ make_api_call "/sheets/sync-reflections" "" "POST"
 # Generate daily summary
 make_api_call "/summaries/create?target_date=$(date +%Y-%m-%d)" "" "POST"
 
+# Regenerate summaries for earlier days that received late data
+make_api_call "/summaries/refresh-dirty" "" "POST"
+
 echo "[$CURRENT_DATE] Daily sync completed" 
\ No newline at end of file
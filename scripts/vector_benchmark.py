@@ -0,0 +1,152 @@
+"""
+Compare recall@k and search latency of reduced-footprint vector configurations against full float32 vectors.
+
+Every configuration is loaded into a temporary embedded (local) vector store, so quantization, truncation and
+PCA go through the same code paths the API uses. Ground truth is an exact cosine search over the full vectors.
+
+    python -m scripts.vector_benchmark                      # embeddings of the stored summaries
+    python -m scripts.vector_benchmark --synthetic 20000x1024 --dimensions 256
+"""
+
+import argparse
+import tempfile
+import time
+import numpy as np
+from typing import Any, Dict, List, Optional, Tuple
+from core.config import settings
+from core.local_vector_store import LocalVectorStore
+from core.vector_reduction import VectorProjection
+
+INT8 = {"scalar": {"type": "int8", "quantile": 0.99, "always_ram": True}}
+
+
+def synthetic_corpus(size: int, dimensions: int, seed: int = 0) -> np.ndarray:
+    """
+    Clustered vectors whose variance is concentrated in a low-dimensional subspace, roughly mimicking
+    the topical structure of real embeddings
+    """
+    rng = np.random.default_rng(seed)
+    latent_dimensions = max(dimensions // 16, 2)
+    basis = rng.normal(size=(latent_dimensions, dimensions))
+    centers = rng.normal(size=(max(size // 200, 1), latent_dimensions))
+    latent = centers[rng.integers(0, len(centers), size)] + 0.5 * rng.normal(size=(size, latent_dimensions))
+    return (latent @ basis + 0.5 * rng.normal(size=(size, dimensions))).astype(np.float32)
+
+
+def summary_corpus() -> np.ndarray:
+    from core.db import DailySummary, SessionLocal
+    from core.qdrant_client import QdrantClient
+
+    db = SessionLocal()
+    client = QdrantClient()
+    try:
+        texts = [row.summary for row in db.query(DailySummary.summary).all()]
+        return np.asarray(client.generate_embeddings(texts), dtype=np.float32)
+    finally:
+        client.close()
+        db.close()
+
+
+def exact_top_k(corpus: np.ndarray, queries: np.ndarray, k: int) -> List[set]:
+    corpus = corpus / np.linalg.norm(corpus, axis=1, keepdims=True)
+    scores = (queries / np.linalg.norm(queries, axis=1, keepdims=True)) @ corpus.T
+    return [set(np.argsort(-row)[:k].tolist()) for row in scores]
+
+
+def run_configuration(
+    corpus: np.ndarray,
+    queries: np.ndarray,
+    truth: List[set],
+    k: int,
+    projection: Optional[VectorProjection],
+    quantization_config: Optional[Dict[str, Any]],
+    params: Optional[Dict[str, Any]],
+) -> Dict[str, Any]:
+    vectors = projection.apply_many(corpus) if projection else corpus
+    query_vectors = projection.apply_many(queries) if projection else queries
+
+    with tempfile.TemporaryDirectory() as root:
+        store = LocalVectorStore(root)
+        store.create_collection("benchmark", vectors.shape[1], quantization_config)
+        for start in range(0, len(vectors), 1000):
+            batch = vectors[start : start + 1000]
+            store.upsert(
+                "benchmark", [{"id": start + i, "vector": vector, "payload": {}} for i, vector in enumerate(batch)]
+            )
+
+        recalls, latencies = [], []
+        for query, expected in zip(query_vectors, truth):
+            started = time.perf_counter()
+            results = store.search("benchmark", query, k, params=params)
+            latencies.append((time.perf_counter() - started) * 1000)
+            recalls.append(len({r["id"] for r in results} & expected) / k)
+        store.close()
+
+    dimensions = vectors.shape[1]
+    scanned_bytes = dimensions if quantization_config else dimensions * 4
+    return {
+        "dimensions": dimensions,
+        "bytes_per_vector": scanned_bytes,
+        "recall": float(np.mean(recalls)),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+    }
+
+
+def configurations(corpus: np.ndarray, dimensions: int, oversampling: float) -> List[Tuple[str, tuple]]:
+    rescore = {"quantization": {"rescore": True, "oversampling": oversampling}}
+    no_rescore = {"quantization": {"rescore": False}}
+    configs = [
+        ("float32 (full)", (None, None, None)),
+        ("int8 + rescore", (None, INT8, rescore)),
+        ("int8, no rescore", (None, INT8, no_rescore)),
+    ]
+    if 0 < dimensions < corpus.shape[1]:
+        truncate = VectorProjection("truncate", dimensions)
+        configs.append((f"truncate {dimensions}", (truncate, None, None)))
+        if dimensions <= len(corpus):
+            pca = VectorProjection.fit_pca(corpus, dimensions)
+            configs.append((f"pca {dimensions} ({pca.explained_variance:.0%} var)", (pca, None, None)))
+            configs.append((f"pca {dimensions} + int8 + rescore", (pca, INT8, rescore)))
+    return configs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--synthetic", help="Use a synthetic corpus instead, e.g. 20000x1024")
+    parser.add_argument("--dimensions", type=int, default=settings.VECTOR_DIMENSIONS or 256)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--oversampling", type=float, default=settings.VECTOR_QUANTIZATION_OVERSAMPLING)
+    parser.add_argument("--ann", action="store_true", help="Keep the IVF index enabled (default: exact search)")
+    args = parser.parse_args()
+
+    if not args.ann:
+        settings.VECTOR_LOCAL_ANN_THRESHOLD = 2**62
+
+    if args.synthetic:
+        size, dimensions = (int(part) for part in args.synthetic.lower().split("x"))
+        corpus = synthetic_corpus(size, dimensions)
+    else:
+        corpus = summary_corpus()
+    if len(corpus) < args.k:
+        parser.error(f"Need at least {args.k} vectors, found {len(corpus)}")
+
+    # Queries are perturbed corpus vectors, so each has a realistic neighbourhood
+    rng = np.random.default_rng(1)
+    queries = corpus[rng.integers(0, len(corpus), args.queries)]
+    queries = queries + 0.1 * queries.std() * rng.normal(size=queries.shape).astype(np.float32)
+    truth = exact_top_k(corpus, queries, args.k)
+
+    print(f"Corpus: {corpus.shape[0]} vectors x {corpus.shape[1]} dims, {args.queries} queries, k={args.k}\n")
+    print(f"{'configuration':<36} {'dims':>6} {'bytes':>7} {'recall@k':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    for label, (projection, quantization_config, params) in configurations(corpus, args.dimensions, args.oversampling):
+        result = run_configuration(corpus, queries, truth, args.k, projection, quantization_config, params)
+        print(
+            f"{label:<36} {result['dimensions']:>6} {result['bytes_per_vector']:>7} {result['recall']:>9.3f} "
+            f"{result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
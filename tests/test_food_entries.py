@@ -0,0 +1,104 @@
+from datetime import datetime, timedelta
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from apis.food import routes
+from core.db import Base, FoodImage, FoodLog, get_db
+from core.local_image_store import LocalImageStore
+
+IMAGES = 30
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def client(engine, tmp_path, monkeypatch):
+    Session = sessionmaker(bind=engine)
+    session = Session()
+    started = datetime(2025, 3, 1, 8)
+    for index in range(IMAGES):
+        image = FoodImage(
+            timestamp=started + timedelta(hours=index),
+            s3_bucket="local",
+            s3_region="local",
+            s3_key=f"{index:064x}",
+            thumbnail_s3_key=f"{index + 1000:064x}",
+        )
+        # Three lunch items on every third image, so an unfiltered join would repeat it
+        meal_type = "lunch" if index % 3 == 0 else "dinner"
+        image.food_items = [
+            FoodLog(food_name=f"food {index}-{item}", calories=100 + item, meal_type=meal_type) for item in range(3)
+        ]
+        session.add(image)
+    session.commit()
+    session.close()
+
+    def get_test_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    monkeypatch.setattr(routes, "image_store", LocalImageStore(root=str(tmp_path)))
+    app = FastAPI()
+    app.include_router(routes.router, prefix="/food")
+    app.dependency_overrides[get_db] = get_test_db
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def queries(engine):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    yield statements
+    event.remove(engine, "before_cursor_execute", record)
+
+
+def list_entries(client, **params):
+    response = client.get("/food/entries", params=params)
+    assert response.status_code == 200
+    return response.json()
+
+
+@pytest.mark.parametrize("meal_type", [None, "lunch"])
+@pytest.mark.parametrize("limit", [1, 5, 10, IMAGES])
+def test_entries_take_two_queries_at_any_page_size(client, queries, limit, meal_type):
+    entries = list_entries(client, limit=limit, **({"meal_type": meal_type} if meal_type else {}))
+
+    # A join on food_logs would let LIMIT count food rows and return short pages
+    assert len(entries) == min(limit, IMAGES // 3 if meal_type else IMAGES)
+    assert len(queries) == 2
+    assert all(len(entry["foods"]) == 3 for entry in entries)
+    assert all(entry["total_calories"] == 303 for entry in entries)
+
+
+def test_meal_type_filter_returns_each_image_once(client):
+    entries = list_entries(client, limit=IMAGES, meal_type="lunch")
+
+    ids = [entry["id"] for entry in entries]
+    assert len(ids) == len(set(ids)) == IMAGES // 3
+    assert all(food["meal_type"] == "lunch" for entry in entries for food in entry["foods"])
+    assert entries[0]["thumbnail_url"] == f"/food/images/{27 + 1000:064x}"
+
+
+def test_single_entry_takes_two_queries(client, queries):
+    response = client.get("/food/entries/1")
+
+    assert response.status_code == 200
+    assert len(response.json()["foods"]) == 3
+    assert len(queries) == 2
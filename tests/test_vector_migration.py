@@ -0,0 +1,115 @@
+import zlib
+from datetime import date, datetime, timedelta
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from core.config import settings
+from core.db import Base, DailySummary
+from core.local_vector_store import LocalVectorStore
+from core.vector_migration import ReembeddingMigration
+
+
+class StubClient:
+    """The parts of QdrantClient the migration uses, with deterministic embeddings"""
+
+    collection_name = "daily_summaries"
+    embedding_model = "stub-embed"
+    projection = None
+
+    def __init__(self, store):
+        self.store = store
+
+    def quantization_config(self):
+        return None
+
+    def generate_embeddings(self, texts, batch_size=None):
+        return [[float(len(text)), 1.0, 0.0, 0.0] for text in texts]
+
+    def ensure_payload_indexes(self, name, fields):
+        pass
+
+    def summary_point(self, key, summary, metadata, granularity, embedding):
+        point_id = zlib.crc32(f"{granularity}:{key}".encode())
+        return {"id": point_id, "vector": embedding, "payload": {"date": key, "summary": summary}}
+
+
+@pytest.fixture
+def sessions(tmp_path):
+    # A file database, so the two sessions use separate connections like the API and the migration CLI
+    engine = create_engine(f"sqlite:///{tmp_path / 'journal.db'}")
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def migration(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_DATA_DIR", str(tmp_path / "vectors"))
+    store = LocalVectorStore(str(tmp_path / "vectors" / "local"))
+    yield ReembeddingMigration(StubClient(store), batch_size=2, concurrency=1)
+    store.close()
+
+
+def add_summaries(db, count):
+    created = datetime(2025, 3, 1)
+    for offset in range(count):
+        day = date(2025, 3, 1) + timedelta(days=offset)
+        db.add(
+            DailySummary(
+                granularity="daily",
+                period=day.isoformat(),
+                date=day,
+                summary=f"original summary {offset}",
+                created_at=created,
+                updated_at=created,
+            )
+        )
+    db.commit()
+
+
+def stored_summaries(migration):
+    return {point["payload"]["date"]: point["payload"]["summary"] for point in migration.store.scroll(migration.target)}
+
+
+def test_summary_regenerated_between_passes_is_copied_again(sessions, migration):
+    db, writer = sessions(), sessions()
+    add_summaries(writer, 3)
+    copy = migration._copy
+    passes = []
+
+    def copy_then_regenerate(session, rows):
+        copied = copy(session, rows)
+        if not passes:
+            # Another session regenerates a summary that the first pass already copied
+            writer.query(DailySummary).filter(DailySummary.period == "2025-03-02").update(
+                {"summary": "regenerated summary", "updated_at": datetime(2025, 3, 5)}
+            )
+            writer.commit()
+        passes.append(len(rows))
+        return copied
+
+    migration._copy = copy_then_regenerate
+    result = migration.run(db, switch=False)
+
+    assert passes == [3, 1]
+    assert result["remaining"] == 0
+    assert stored_summaries(migration)["2025-03-02"] == "regenerated summary"
+    db.close()
+    writer.close()
+
+
+def test_pending_rows_sees_updates_committed_by_other_sessions(sessions, migration):
+    db, writer = sessions(), sessions()
+    add_summaries(writer, 2)
+    migration._prepare_target()
+    migration._copy(db, migration.pending_rows(db))
+    assert migration.pending_rows(db) == []
+
+    writer.query(DailySummary).filter(DailySummary.period == "2025-03-01").update(
+        {"summary": "regenerated summary", "updated_at": datetime(2025, 3, 5)}
+    )
+    writer.commit()
+
+    assert [row.period for row in migration.pending_rows(db)] == ["2025-03-01"]
+    db.close()
+    writer.close()